@@ -0,0 +1,94 @@
+"""Concurrent writer benchmark for the task file.
+
+Starts several writer processes against one task file at the same time.
+Each adds its share of tasks and then marks each of its tasks complete
+with a read-modify-write. The script checks that no task was lost,
+duplicated or left incomplete, and reports throughput for each number of
+writers.
+
+    python benchmarks/contention.py [--writers 1,2,4,8] [--tasks 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from todo import storage  # noqa: E402
+from todo.task import Task  # noqa: E402
+
+
+def writer(path, name, tasks, barrier):
+    barrier.wait()
+    task_ids = [storage.append_task(Task(f"{name} task {i}", category=name), path) for i in range(tasks)]
+
+    def complete(task_id):
+        def change(index):
+            task = index[task_id]
+            task.done = True
+            return [task], (), None
+        return change
+
+    barrier.wait()
+    for task_id in task_ids:
+        storage.update(complete(task_id), path)
+
+
+def run(writers, tasks):
+    """Run one round and return (add seconds, update seconds, problems)."""
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, storage.TODO_FILE)
+        barrier = multiprocessing.Barrier(writers + 1)
+        processes = [
+            multiprocessing.Process(target=writer, args=(path, f"w{n}", tasks, barrier))
+            for n in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        barrier.wait()
+        added = time.perf_counter()
+        for process in processes:
+            process.join()
+        updated = time.perf_counter()
+
+        problems = [f"writer exited with {p.exitcode}" for p in processes if p.exitcode]
+        loaded = storage.load_tasks(path)
+        expected = {f"w{n} task {i}" for n in range(writers) for i in range(tasks)}
+        descriptions = [task.description for task in loaded]
+        if len(descriptions) != len(set(descriptions)) or len({task.id for task in loaded}) != len(loaded):
+            problems.append("duplicate tasks or IDs")
+        lost = expected - set(descriptions)
+        if lost:
+            problems.append(f"{len(lost)} tasks lost")
+        undone = sum(not task.done for task in loaded)
+        if undone:
+            problems.append(f"{undone} completions lost")
+        return added - start, updated - added, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', default='1,2,4,8', help='Comma-separated numbers of writer processes to try.')
+    parser.add_argument('--tasks', type=int, default=200, help='Tasks added and completed by each writer.')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'writers':>7} {'adds/s':>9} {'updates/s':>10}")
+    for writers in (int(n) for n in args.writers.split(',')):
+        add_s, update_s, problems = run(writers, args.tasks)
+        total = writers * args.tasks
+        print(f"{writers:>7} {total / add_s:>9.0f} {total / update_s:>10.0f}")
+        for problem in problems:
+            failed = True
+            print(f"FAIL ({writers} writers): {problem}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
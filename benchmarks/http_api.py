@@ -0,0 +1,120 @@
+"""Load benchmark for the HTTP API (`todo serve`).
+
+Starts the server on a generated task list in a temporary directory, then
+opens many concurrent keep-alive connections that page through the list,
+search it and complete tasks, and reports throughput and latency. Fails
+if any request errors.
+
+    python benchmarks/http_api.py [--tasks 10000] [--clients 100,300] [--requests 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from todo.storage import save_tasks  # noqa: E402
+from todo.task import Priority, Task  # noqa: E402
+
+SERVER = "from todo.server import run; run('text', '127.0.0.1', {port})"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _request(reader, writer, method, target, body=None):
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(port, requests, tasks, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for _ in range(requests):
+            roll = random.random()
+            if roll < 0.7:
+                request = ('GET', f"/tasks?limit=50&cursor={random.randrange(tasks)}")
+            elif roll < 0.9:
+                request = ('GET', f"/search?q=task+{random.randrange(100)}&limit=20")
+            else:
+                request = ('POST', f"/tasks/{random.randrange(1, tasks + 1)}/complete")
+            start = time.perf_counter()
+            status = await _request(reader, writer, *request)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(f"{request[0]} {request[1]}: {status}")
+    finally:
+        writer.close()
+
+
+async def _round(port, clients, requests, tasks):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, requests, tasks, latencies, errors) for _ in range(clients)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=10000, help='Number of tasks in the generated list.')
+    parser.add_argument('--clients', default='100,300', help='Comma-separated numbers of concurrent clients.')
+    parser.add_argument('--requests', type=int, default=20, help='Requests sent by each client.')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        save_tasks((Task(f"task {i}", Priority(i % 3 + 1), f"cat{i % 10}") for i in range(args.tasks)),
+                   os.path.join(workdir, 'todo.txt'))
+        port = _free_port()
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        server = subprocess.Popen([sys.executable, '-c', SERVER.format(port=port)], cwd=workdir, env=env)
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port)).close()
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            print(f"{'clients':>7} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}")
+            for clients in (int(n) for n in args.clients.split(',')):
+                elapsed, latencies, errors = asyncio.run(_round(port, clients, args.requests, args.tasks))
+                latencies.sort()
+                p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                print(f"{clients:>7} {len(latencies) / elapsed:>8.0f} "
+                      f"{statistics.median(latencies) * 1000:>7.1f} {p99:>7.1f}")
+                for error in errors[:5]:
+                    print(f"FAIL: {error}")
+                failed = failed or bool(errors)
+        finally:
+            server.terminate()
+            server.wait()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Cross-list search benchmark.
+
+Creates many named lists of generated tasks in a temporary TODO_HOME and
+times searching all of them (as `todo search --all-lists` does) with
+each number of worker processes, to check that it scales with cores.
+
+    python benchmarks/lists.py [--lists 200] [--tasks 1000] [--workers 1,2,4] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.scale import KEYWORD, make_list  # noqa: E402
+from todo import lists  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lists', type=int, default=200, help='Number of lists.')
+    parser.add_argument('--tasks', type=int, default=1000, help='Tasks in each list.')
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help='Comma-separated numbers of worker processes.')
+    parser.add_argument('--runs', type=int, default=3, help='Times each measurement is repeated.')
+    parser.add_argument('--backend', choices=['text', 'sqlite'], default='text', help='The storage backend to use.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ['TODO_HOME'] = home
+        os.environ['TODO_BACKEND'] = args.backend
+        for i in range(args.lists):
+            make_list(lists.register(f"list{i:04d}"), args.backend, args.tasks)
+        jobs = [(directory, KEYWORD) for directory in lists.load_registry().values()]
+
+        print(f"{args.lists} lists of {args.tasks} tasks, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'median ms':>10} {'speedup':>8}")
+        serial = None
+        for workers in [int(n) for n in args.workers.split(',')]:
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                lists.fan_out(lists._list_search, jobs, workers)
+                timings.append((time.perf_counter() - start) * 1000)
+            median = statistics.median(timings)
+            serial = serial or median
+            print(f"{workers:>8} {median:>10.1f} {serial / median:>7.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
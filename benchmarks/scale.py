@@ -0,0 +1,274 @@
+"""Scaling benchmark for the command paths of both front ends.
+
+Generates synthetic task lists of increasing size (varied categories,
+priorities and completion, with some duplicate descriptions) and times:
+
+- the library calls behind every command (``load_tasks``, ``sort_tasks``,
+  ``search_tasks``) in this process, with their peak Python memory use;
+- `todo` commands (todo/cli.py) and the matching todo-script.py functions,
+  each in a fresh interpreter on a fresh copy of the list, with the
+  process's peak RSS.
+
+Results can be written as JSON and compared with an earlier run, failing
+if anything got slower or bigger by more than the tolerance.
+
+    python benchmarks/scale.py [--sizes 1000,10000,100000] [--runs 3]
+        [--backend text|sqlite] [--commands view,search,...]
+        [--json results.json] [--compare baseline.json] [--tolerance 25]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from todo import backends  # noqa: E402
+from todo.api import sort_tasks  # noqa: E402
+from todo.task import Priority, Task  # noqa: E402
+
+SCRIPT = os.path.join(ROOT, 'todo-script.py')
+
+WORDS = ('write', 'review', 'fix', 'plan', 'call', 'email', 'report', 'deploy', 'budget', 'meeting',
+         'invoice', 'draft', 'release', 'backup', 'update', 'docs', 'server', 'groceries', 'garden', 'taxes')
+CATEGORIES = ('work', 'home', 'ops', 'Errands', 'health', 'finance', None)
+
+# The word searched for; it occurs in roughly one task in seven.
+KEYWORD = 'report'
+
+# Timing differences smaller than this are noise, whatever the percentage.
+NOISE_MS = 5
+
+# Command name -> (arguments to `todo`, todo-script.py function and arguments).
+COMMANDS = {
+    'view': (['view'], ['view_tasks']),
+    'add': (['add', '--task', 'benchmark task', '--category', 'bench'], ['add_task', 'benchmark task', 'bench']),
+    'search': (['search', '--keyword', KEYWORD], ['search_task', KEYWORD]),
+    'complete': (['complete', '1'], ['complete_task', 1]),
+    'delete': (['delete', '1'], ['delete_task', 1]),
+    'prioritize': (['prioritize', '1', '--priority', 'high'], ['prioritize_task', 1, 'high']),
+    'export-pdf': (['export', '--filename', 'out.pdf'], ['export_to_pdf', 'out.pdf']),
+}
+
+# Run first in every timed process: on exit, writes the process's peak RSS in KB
+# to the file named by BENCH_PEAK_FILE. /proc/self/status is used where it exists,
+# as ru_maxrss also counts the memory of the benchmark process that forked it.
+REPORT_PEAK = """
+import atexit, os, sys
+
+def _report_peak():
+    try:
+        with open('/proc/self/status') as status:
+            peak = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak //= 1024
+    with open(os.environ['BENCH_PEAK_FILE'], 'w') as file:
+        file.write(str(peak))
+
+atexit.register(_report_peak)
+"""
+
+RUN_CLI = REPORT_PEAK + "sys.argv[0] = 'todo'\nfrom todo.cli import cli\ncli()\n"
+
+RUN_SCRIPT = REPORT_PEAK + """
+import importlib.util, json
+spec = importlib.util.spec_from_file_location('todo_script', sys.argv[1])
+script = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(script)
+name, *args = json.loads(sys.argv[2])
+result = getattr(script, name)(*args)
+if isinstance(result, str):
+    print(result)
+"""
+
+
+def generate_tasks(count, seed=0):
+    """Yield ``count`` synthetic tasks; about one in ten repeats an earlier description."""
+    rng = random.Random(seed)
+    descriptions = []
+    for i in range(count):
+        if descriptions and rng.random() < 0.1:
+            description = rng.choice(descriptions)
+        else:
+            description = " ".join(rng.sample(WORDS, rng.randint(2, 5))) + f" #{i}"
+            if len(descriptions) < 1000:
+                descriptions.append(description)
+        priority = rng.choice([Priority.HIGH, Priority.MEDIUM, Priority.MEDIUM, Priority.LOW, None])
+        yield Task(description, priority, rng.choice(CATEGORIES), rng.random() < 0.3)
+
+
+def make_list(workdir, backend, count):
+    """Write a generated list of ``count`` tasks into ``workdir``, with its search index built."""
+    store = backends.get_backend(backend)
+    path = os.path.join(workdir, backends.FILES[backend])
+    store.save_tasks(generate_tasks(count), path)
+    store.search_tasks(KEYWORD, path)
+    return path
+
+
+def _env(backend):
+    # Archiving would make `complete` move a third of the list, hiding its own cost.
+    env = dict(os.environ, TODO_BACKEND=backend, TODO_DAEMON='0', TODO_ARCHIVE_AFTER='0')
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def _run_process(argv, cwd, env):
+    """Run a command to completion; return (wall ms, peak RSS in KB)."""
+    peak_file = os.path.join(cwd, '.bench-peak')
+    start = time.perf_counter()
+    subprocess.run(argv, cwd=cwd, env=dict(env, BENCH_PEAK_FILE=peak_file),
+                   stdout=subprocess.DEVNULL, stdin=subprocess.DEVNULL, check=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    with open(peak_file) as file:
+        return elapsed, int(file.read())
+
+
+def time_command(template, backend, argv, runs):
+    """Time a command over ``runs`` fresh copies of the list in ``template``."""
+    timings, peaks = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            shutil.copytree(template, workdir, dirs_exist_ok=True)
+            elapsed, peak = _run_process(argv, workdir, _env(backend))
+        timings.append(elapsed)
+        peaks.append(peak)
+    return timings, max(peaks)
+
+
+def time_call(function, runs):
+    """Time an in-process call, then repeat it once under tracemalloc for its peak memory."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+
+def library_calls(backend, path):
+    store = backends.get_backend(backend)
+    tasks = store.load_tasks(path)
+    return {
+        'load_tasks': lambda: store.load_tasks(path),
+        'sort_tasks': lambda: sort_tasks(list(tasks)),
+        'search_tasks': lambda: store.search_tasks(KEYWORD, path),
+    }
+
+
+def run(sizes, runs, backend, commands):
+    results = []
+
+    def record(frontend, command, size, timings, peak):
+        result = {
+            'frontend': frontend, 'command': command, 'tasks': size,
+            'median_ms': round(statistics.median(timings), 2), 'min_ms': round(min(timings), 2),
+            'peak_kb': peak,
+        }
+        results.append(result)
+        print(f"{size:>8} {frontend:<7} {command:<13} {result['median_ms']:>10.1f} {result['min_ms']:>10.1f} {peak:>10}",
+              flush=True)
+
+    print(f"{'tasks':>8} {'front':<7} {'command':<13} {'median ms':>10} {'min ms':>10} {'peak KB':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as template:
+            path = make_list(template, backend, size)
+            for name, function in library_calls(backend, path).items():
+                record('library', name, size, *time_call(function, runs))
+            for command in commands:
+                cli_args, script_call = COMMANDS[command]
+                record('cli', command, size,
+                       *time_command(template, backend, [sys.executable, '-c', RUN_CLI, *cli_args], runs))
+                record('script', command, size,
+                       *time_command(template, backend,
+                                     [sys.executable, '-c', RUN_SCRIPT, SCRIPT, json.dumps(script_call)], runs))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Return a message for every result more than ``tolerance`` percent worse than the baseline."""
+    def key(result):
+        return result['frontend'], result['command'], result['tasks']
+
+    previous = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for field in ('median_ms', 'peak_kb'):
+            if not old[field] or (field == 'median_ms' and result[field] - old[field] < NOISE_MS):
+                continue
+            change = (result[field] - old[field]) / old[field] * 100
+            if change > tolerance:
+                regressions.append(f"{result['frontend']} {result['command']} ({result['tasks']} tasks): "
+                                   f"{field} {old[field]} -> {result[field]} (+{change:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated list sizes (up to 1000000).')
+    parser.add_argument('--runs', type=int, default=3, help='Times each measurement is repeated.')
+    parser.add_argument('--backend', choices=list(backends.BACKENDS), default='text', help='The storage backend to use.')
+    parser.add_argument('--commands', default=','.join(COMMANDS), help='Comma-separated commands to time.')
+    parser.add_argument('--json', dest='output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Compare with the JSON results of an earlier run.')
+    parser.add_argument('--tolerance', type=float, default=25, help='Allowed slowdown or growth in percent.')
+    args = parser.parse_args()
+
+    commands = args.commands.split(',')
+    unknown = set(commands) - set(COMMANDS)
+    if unknown:
+        parser.error(f"unknown commands: {', '.join(sorted(unknown))}")
+    results = run([int(n) for n in args.sizes.split(',')], args.runs, args.backend, commands)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'backend': args.backend,
+                'runs': args.runs,
+                'results': results,
+            }, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"FAIL: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
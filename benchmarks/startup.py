@@ -0,0 +1,91 @@
+"""Cold-start benchmark for the `todo` command.
+
+Measures how long importing ``todo.cli`` takes (using ``python -X importtime``)
+and how long a full ``todo view`` takes in a fresh interpreter, and fails if
+either goes over its budget or if a heavyweight dependency is imported just
+to start the CLI.
+
+    python benchmarks/startup.py [--runs 10] [--import-budget 80] [--command-budget 150]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only specific commands need; importing them at startup is a regression.
+LAZY_MODULES = ('reportlab', 'sqlite3')
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def import_profile():
+    """Return the cumulative import time of todo.cli in ms and the modules it imported."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import todo.cli'],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    total_us = None
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if not cumulative.isdigit():
+            continue
+        modules.append(name)
+        if name == 'todo.cli':
+            total_us = int(cumulative)
+    return total_us / 1000, modules
+
+
+def command_time(args, runs):
+    """Return the median wall-clock time in ms of running `todo <args>` in a new interpreter."""
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, '-c', 'from todo.cli import cli; cli()', *args],
+                cwd=workdir, env=_env(), stdout=subprocess.DEVNULL, check=True,
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Number of cold starts to time.')
+    parser.add_argument('--import-budget', type=float, default=80, help='Maximum import time of todo.cli in ms.')
+    parser.add_argument('--command-budget', type=float, default=150, help='Maximum median time of `todo view` in ms.')
+    args = parser.parse_args()
+
+    failures = []
+    import_ms, modules = import_profile()
+    print(f"import todo.cli: {import_ms:.1f} ms (budget {args.import_budget:.0f} ms)")
+    if import_ms > args.import_budget:
+        failures.append("import time over budget")
+    eager = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+    if eager:
+        failures.append("imported at startup: " + ", ".join(eager))
+
+    view_ms = command_time(['view'], args.runs)
+    print(f"todo view: {view_ms:.1f} ms median of {args.runs} (budget {args.command_budget:.0f} ms)")
+    if view_ms > args.command_budget:
+        failures.append("`todo view` over budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,6 @@ setup(
     ],
     entry_points='''
         [console_scripts]
-        todo=todo.cli:cli
+        todo=todo.client:main
     ''',
 )
\ No newline at end of file
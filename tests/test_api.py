@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+
+from todo.api import TodoStore
+
+
+@pytest.fixture(params=[('text', False), ('sqlite', False), ('text', True)])
+def todos(request, tmp_path):
+    backend, cached = request.param
+    with TodoStore(str(tmp_path), backend, cached) as todos:
+        yield todos
+
+
+def test_due_orders_by_date_then_priority_and_limits(todos):
+    day = datetime.date(2024, 6, 1)
+    todos.add("later", 'high', due=day + datetime.timedelta(days=1))
+    todos.add("no priority", None, due=day)
+    todos.add("low", 'low', due=day)
+    todos.add("high", 'high', due=day)
+    todos.add("undated", 'high')
+    assert [task.description for task in todos.due()] == ["high", "low", "no priority", "later"]
+    assert [task.description for task in todos.due(limit=2)] == ["high", "low"]
+    assert [task.description for task in todos.due(before=day + datetime.timedelta(days=1), limit=5)] == [
+        "high", "low", "no priority"]
+
+
+def test_line_breaks_become_spaces(todos):
+    task = todos.add("first\nsecond", 'high', "home\r\nwork")
+    todos.edit(task.id, description="third\n\nfourth")
+    with pytest.raises(ValueError):
+        todos.edit(task.id, description="\n")
+    [task] = todos.tasks()
+    assert (task.description, task.category) == ("third fourth", "home work")
+
+
+def test_transaction_writes_nothing_if_any_change_fails(todos):
+    kept = todos.add("kept", 'low')
+    with pytest.raises(KeyError):
+        with todos.transaction() as transaction:
+            transaction.add("new")
+            transaction.complete(kept.id)
+            transaction.delete(999)
+    with pytest.raises(RuntimeError):
+        with todos.transaction() as transaction:
+            transaction.add("new")
+            raise RuntimeError
+    with pytest.raises(ValueError):
+        with todos.transaction() as transaction:
+            transaction.complete(kept.id)
+            transaction.edit(kept.id, priority='urgent')
+    assert [(task.description, task.done) for task in todos.tasks()] == [("kept", False)]
+
+
+def test_imported_tasks_do_not_reuse_deleted_ids(todos):
+    from todo.task import Task
+
+    for description in ("one", "two", "three"):
+        todos.add(description)
+    todos.delete(2)
+    assert todos.add_many([Task("imported", id=2), Task("new id", id=10), Task("clash", id=10)]) == 3
+    ids = {task.description: task.id for task in todos.tasks()}
+    assert ids["imported"] not in (1, 2, 3)
+    assert ids["new id"] == 10
+    assert ids["clash"] not in (1, 2, 3, 10, ids["imported"])
@@ -0,0 +1,31 @@
+import pytest
+
+from todo import archive, backends, storage
+from todo.daemon import CachedStore
+from todo.task import Task
+
+
+@pytest.fixture(params=['text', 'sqlite'])
+def backend(request):
+    return request.param
+
+
+def add_tasks(store, path):
+    for i in range(4):
+        store.append_task(Task(f"task {i}", done=i % 2 == 0), path)
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_archive_moves_done_tasks_and_compacts(tmp_path, backend, cached):
+    path = str(tmp_path / backends.FILES[backend])
+    module = backends.get_backend(backend)
+    store = CachedStore(backend, path) if cached else module
+    add_tasks(store, path)
+    assert archive.archive_tasks(store, str(tmp_path / 'archive'), path) == 2
+    assert sorted(task.description for task in module.load_tasks(path)) == ["task 1", "task 3"]
+    assert sorted(task.description for task in archive.iter_archive(str(tmp_path / 'archive'))) == ["task 0", "task 2"]
+    if backend == 'text':
+        # The removals were folded into the snapshot, through the cache too.
+        header, records = storage.read_journal(path)
+        assert records == []
+
@@ -0,0 +1,146 @@
+import warnings
+
+import pytest
+from click.testing import CliRunner
+
+from todo.cli import cli
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('TODO_BACKEND', raising=False)
+
+    def run(*args):
+        result = CliRunner().invoke(cli, args, catch_exceptions=False)
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    return run
+
+
+def test_view_prints_without_deprecation_warnings(run):
+    run('add', '--task', 'one', '--priority', 'high')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        assert "1. [ ] 🔥 one" in run('view')
+
+
+def test_complete_survives_a_conflicting_auto_archive(run, monkeypatch):
+    from todo import archive, storage
+    from todo.api import TodoStore
+
+    def conflict(self):
+        raise storage.ConflictError("todo.txt kept changing")
+
+    monkeypatch.setattr(archive, 'AUTO_ARCHIVE_AFTER', 1)
+    monkeypatch.setattr(TodoStore, 'archive', conflict)
+    run('add', '--task', 'one', '--priority', 'high')
+    run('add', '--task', 'two', '--priority', 'high')
+    output = run('complete', '1', '2')
+    assert "Could not archive completed tasks" in output
+    assert [task.done for task in storage.load_tasks()] == [True, True]
+
+
+@pytest.fixture
+def listed(run):
+    # Numbered by priority: 1-3 are high, 4-5 low.
+    for description, priority in [("a", 'high'), ("b", 'low'), ("c", 'high'), ("d", 'low'), ("e", 'high')]:
+        run('add', '--task', description, '--priority', priority, '--category', 'ops' if description in "bd" else 'home')
+    return run
+
+
+def done(run):
+    from todo import storage
+
+    return sorted(task.description for task in storage.load_tasks() if task.done)
+
+
+def test_complete_takes_numbers_ranges_ids_and_where(listed):
+    assert "3 tasks marked as complete" in listed('complete', '2-3', 'id:2')
+    assert done(listed) == ["b", "c", "e"]
+    assert "1 tasks marked as complete (1 already completed)" in listed('complete', '--where', 'category:ops')
+    assert done(listed) == ["b", "c", "d", "e"]
+
+
+@pytest.mark.parametrize('refs', [['3-1'], ['2-'], ['0-2'], ['4-9'], ['id:99'], ['1', 'x']])
+def test_invalid_selections_change_nothing(listed, refs):
+    assert f"Invalid task number: {refs[-1]}." in listed('complete', *refs)
+    assert done(listed) == []
+
+
+def test_selection_messages_are_shown_once_however_often_the_change_runs(listed, monkeypatch):
+    from todo.api import TodoStore
+
+    update = TodoStore.update
+
+    def retried(self, change):
+        # As if the first attempt had conflicted with another writer.
+        change(self._store.load_index(self.path))
+        return update(self, change)
+
+    monkeypatch.setattr(TodoStore, 'update', retried)
+    assert listed('delete', 'id:99').count("Invalid task number") == 1
+    assert listed('prioritize', '--where', 'nothing-like-this', '--priority', 'low').count("No tasks matched") == 1
+    assert listed('edit', '9', '--new_task', 'x').count("Invalid task number") == 1
+
+
+@pytest.fixture(params=['text', 'sqlite'])
+def counted(run, monkeypatch, request):
+    monkeypatch.setenv('TODO_BACKEND', request.param)
+    for description, priority, category in [("a", 'high', 'Home'), ("b", 'high', 'home'),
+                                            ("c", 'low', 'ops'), ("d", 'low', None)]:
+        run('add', '--task', description, '--priority', priority, *(['--category', category] if category else []))
+    run('complete', '1', '3')
+    run('delete', '4')
+    return request.param
+
+
+def stats_json(run, *args):
+    import json
+
+    output = run('stats', '--json', *args)
+    return json.loads(output[output.index('{'):])
+
+
+def test_stats_counts_by_priority_and_category(run, counted):
+    summary = stats_json(run)
+    assert summary['total'] == {'open': 1, 'done': 2, 'completion': 0.6667}
+    assert summary['priority'] == {'high': {'open': 1, 'done': 1, 'completion': 0.5},
+                                   'low': {'open': 0, 'done': 1, 'completion': 1.0}}
+    assert summary['category'] == {'home': {'open': 1, 'done': 1, 'completion': 0.5},
+                                   'ops': {'open': 0, 'done': 1, 'completion': 1.0}}
+    assert "Tasks: 3 (1 open, 2 done, 67% complete)" in run('stats')
+
+
+def test_stats_verify_rebuilds_wrong_counts(run, counted):
+    import sqlite3
+
+    expected = stats_json(run)
+    table = 'task_counts' if counted == 'sqlite' else 'counts'
+    conn = sqlite3.connect('todo.db' if counted == 'sqlite' else 'todo.txt.idx')
+    with conn:
+        conn.execute(f"UPDATE {table} SET count = count + 5")
+    conn.close()
+    assert stats_json(run) != expected
+    assert "have been rebuilt" in run('stats', '--verify')
+    assert "match the task list" in run('stats', '--verify')
+    assert stats_json(run) == expected
+
+
+def test_stats_counts_files_made_before_tasks_were_counted(run, counted):
+    import sqlite3
+
+    expected = stats_json(run)
+    table, source = ('task_counts', 'tasks') if counted == 'sqlite' else ('counts', 'docs')
+    conn = sqlite3.connect('todo.db' if counted == 'sqlite' else 'todo.txt.idx')
+    # The database's user_version says its schema is not set up yet.
+    conn.executescript(f"DROP TABLE {table}; DROP TRIGGER {source}_count_insert; "
+                       f"DROP TRIGGER {source}_count_delete; DROP TRIGGER IF EXISTS {source}_count_update; "
+                       f"PRAGMA user_version = 0;")
+    conn.close()
+    assert stats_json(run) == expected
+    run('add', '--task', 'e', '--priority', 'low', '--category', 'ops')
+    run('complete', '2')
+    assert stats_json(run)['category'] == {'home': {'open': 0, 'done': 2, 'completion': 1.0},
+                                           'ops': {'open': 1, 'done': 1, 'completion': 0.5}}
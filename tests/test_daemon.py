@@ -0,0 +1,137 @@
+import pytest
+
+from todo import backends, storage
+from todo.daemon import CachedStore
+from todo.task import Priority, Task
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'todo.txt')
+
+
+@pytest.fixture
+def store(path):
+    store = CachedStore('text', path)
+    yield store
+    store.close()
+
+
+@pytest.fixture(params=['text', 'sqlite'])
+def backend_store(request, tmp_path):
+    path = str(tmp_path / backends.FILES[request.param])
+    store = CachedStore(request.param, path)
+    yield store.backend, path, store
+    store.close()
+
+
+def descriptions(tasks):
+    return [task.description for task in tasks]
+
+
+def test_load_tasks_sees_changes_by_other_processes(store, path):
+    storage.append_task(Task("one", Priority.LOW), path)
+    assert descriptions(store.load_tasks()) == ["one"]
+    storage.append_task(Task("two", Priority.HIGH), path)
+    assert descriptions(store.load_tasks()) == ["two", "one"]
+    storage.save_tasks([], path)
+    assert store.load_tasks() == []
+
+
+def test_writes_are_on_disk_straight_away(backend_store):
+    backend, path, store = backend_store
+    task_id = store.append_task(Task("one"))
+    assert descriptions(backend.load_tasks(path)) == ["one"]
+    store.remove_task(task_id)
+    assert backend.load_tasks(path) == []
+
+
+def test_add_does_not_overwrite_a_task_added_by_another_process(backend_store):
+    backend, path, store = backend_store
+    store.append_task(Task("one"))
+    store.load_tasks()
+    other = backend.append_task(Task("other"), path)
+    # The cache has not seen "other" yet; its next ID must not clobber it.
+    task_id = store.append_task(Task("two"))
+    assert task_id != other
+    assert sorted(descriptions(backend.load_tasks(path))) == ["one", "other", "two"]
+    assert sorted(descriptions(store.load_tasks())) == ["one", "other", "two"]
+
+
+def test_update_retries_after_a_conflicting_write(backend_store):
+    backend, path, store = backend_store
+    task_id = store.append_task(Task("one"))
+    calls = []
+
+    def change(index):
+        calls.append(index[task_id].description)
+        if len(calls) == 1:
+            # Another process edits the same task between our read and write.
+            task = backend.load_index(path)[task_id]
+            task.description = "edited elsewhere"
+            backend.replace_task(task, path)
+        task = index[task_id]
+        task.done = True
+        return [task], [], None
+
+    store.update(change)
+    assert calls == ["one", "edited elsewhere"]
+    [task] = backend.load_tasks(path)
+    assert (task.description, task.done) == ("edited elsewhere", True)
+
+
+def test_commit_raises_on_conflict_and_reloads(backend_store):
+    backend, path, store = backend_store
+    task_id = store.append_task(Task("one"))
+    task = store.load_index()[task_id]
+    # Another process edits the task after the cache last looked at the files.
+    elsewhere = backend.load_index(path)[task_id]
+    elsewhere.description = "edited elsewhere"
+    backend.replace_task(elsewhere, path)
+    task.description = "edited here"
+    with pytest.raises(storage.ConflictError):
+        store._commit([task], [])
+    assert descriptions(store.load_tasks()) == ["edited elsewhere"]
+
+
+def test_failing_command_is_not_run_again_by_the_client(store, path, monkeypatch):
+    from todo.daemon import run_command
+
+    append_task = store.append_task
+
+    def append_then_fail(task, path=None):
+        append_task(task)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, 'append_task', append_then_fail)
+    reply = run_command(store, {'args': ['add', '--task', 'one', '--priority', 'high'], 'backend': 'text'})
+    assert (reply['status'], reply['code']) == ('ok', 1)
+    assert "disk full" in reply['stderr']
+    assert descriptions(storage.load_tasks(path)) == ["one"]
+
+
+def test_client_that_never_finishes_its_request_does_not_block_others(tmp_path, monkeypatch):
+    import socket
+    import threading
+
+    from todo import daemon
+    from todo.client import send
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(daemon, 'REQUEST_TIMEOUT', 0.2)
+    socket_path = str(tmp_path / 'todo.sock')
+    server = threading.Thread(target=daemon.serve, args=('text', socket_path))
+    server.start()
+    try:
+        for _ in range(100):
+            if send({'ping': True}, socket_path) is not None:
+                break
+            threading.Event().wait(0.02)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stuck:
+            stuck.connect(socket_path)
+            stuck.sendall(b'{"ping"')
+            assert send({'ping': True}, socket_path) == {'status': 'ok'}
+    finally:
+        daemon.stop(socket_path)
+        server.join(5)
+    assert not server.is_alive()
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+
+import pytest
+
+from todo import database
+from todo.search import counts_schema
+from todo.task import Priority, Task
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'todo.db')
+
+
+def test_ids_are_not_reused(path):
+    database.append_tasks([Task("one", Priority.HIGH), Task("two", Priority.LOW)], path)
+    database.remove_task(2, path)
+    assert database.append_task(Task("three", Priority.LOW), path) == 3
+    database.save_tasks([], path)
+    assert database.append_task(Task("four", Priority.LOW), path) == 4
+    assert database.load_index(path).next_id == 5
+
+
+def test_database_without_autoincrement_is_upgraded(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(database.SCHEMA.replace(" AUTOINCREMENT", "") + database.FTS_SCHEMA + counts_schema('task_counts', 'tasks'))
+    conn.execute("INSERT INTO tasks (id, done, priority, description) VALUES (1, 0, 1, 'one'), (5, 1, 2, 'five')")
+    conn.commit()
+    conn.close()
+    database.remove_task(5, path)
+    assert database.append_task(Task("new", Priority.LOW), path) == 6
+    assert [task.description for task in database.load_tasks(path)] == ["one", "new"]
+    assert sorted(database.task_counts(path)) == [(False, Priority.HIGH, None, 1), (False, Priority.LOW, None, 1)]
+
+
+@pytest.fixture
+def filled(path):
+    database.append_tasks([
+        Task("Buy groceries", Priority.HIGH, "Home"),
+        Task("Write the quarterly report", Priority.MEDIUM, "work"),
+        Task("Fix the garage door", Priority.LOW, "home", done=True),
+        Task("Go", Priority.LOW),
+    ], path)
+    return path
+
+
+def search(path, query):
+    return [task.id for task in database.search_tasks(query, path)]
+
+
+def test_search_matches_substrings_of_descriptions_and_categories(filled):
+    assert search(filled, "ROCER") == [1]
+    assert search(filled, "the") == [2, 3]
+    assert search(filled, "the report") == [2]
+    assert search(filled, "hom") == [1, 3]
+    # Too short for the trigram index, so matched by scanning.
+    assert search(filled, "or") == [2, 3]
+    assert search(filled, "go") == [4]
+    assert search(filled, '"the garage"') == [3]
+    assert search(filled, "nothing") == []
+
+
+def test_search_applies_field_filters(filled):
+    assert search(filled, "the status:open") == [2]
+    assert search(filled, "category:HOME") == [1, 3]
+    assert search(filled, "priority:low status:done") == [3]
+    assert search(filled, "priority:urgent") == []
+    assert search(filled, "status:maybe") == []
+
+
+def test_search_sees_changes_and_deletions(filled):
+    database.replace_task(Task("Buy paint", Priority.HIGH, "home", id=1), filled)
+    database.remove_task(3, filled)
+    assert search(filled, "groceries") == []
+    assert search(filled, "paint") == [1]
+    assert search(filled, "home") == [1]
+
+
+def test_query_tasks_filters_by_status_category_and_priority(filled):
+    def query(**filters):
+        return [task.id for task in database.query_tasks(path=filled, **filters)]
+
+    assert query() == [1, 2, 3, 4]
+    assert query(status='open') == [1, 2, 4]
+    assert query(status='done') == [3]
+    assert query(category='HOME') == [1, 3]
+    assert query(priority='low') == [3, 4]
+    assert query(status='open', category='home', priority='high') == [1]
+    assert query(category='nowhere') == []
+
+
+def test_schema_is_set_up_once(path, monkeypatch):
+    calls = []
+    set_up_schema = database._set_up_schema
+    monkeypatch.setattr(database, '_set_up_schema', lambda conn: calls.append(set_up_schema(conn)))
+    database.append_task(Task("one", Priority.HIGH), path)
+    database.load_tasks(path)
+    assert database.version(path) == database.version(path)
+    assert len(calls) == 1
+    # A new file in the same place is set up again.
+    os.remove(path)
+    assert database.append_task(Task("two", Priority.HIGH), path) == 1
+    assert len(calls) == 2
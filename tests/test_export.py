@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('reportlab')
+
+from reportlab.platypus import Paragraph  # noqa: E402
+
+from todo import export  # noqa: E402
+from todo.task import Priority, Task  # noqa: E402
+
+
+@pytest.fixture
+def story(monkeypatch):
+    """The flowables handed to reportlab, before it splits tables across pages."""
+    flowables = []
+    build = export.SimpleDocTemplate.build
+
+    class RecordingTable(export.LongTable):
+        def __init__(self, data, *args, **kwargs):
+            self.rows = data
+            super().__init__(data, *args, **kwargs)
+
+    def recording_build(self, story, *args, **kwargs):
+        flowables.extend(story)
+        return build(self, story, *args, **kwargs)
+
+    monkeypatch.setattr(export, 'LongTable', RecordingTable)
+    monkeypatch.setattr(export.SimpleDocTemplate, 'build', recording_build)
+    return flowables
+
+
+def tables(story):
+    """Return the rows of each table in the story, header included."""
+    return [flowable.rows for flowable in story if isinstance(flowable, export.LongTable)]
+
+
+def headings(story):
+    return [flowable.getPlainText() for flowable in story
+            if isinstance(flowable, Paragraph) and flowable.style.name == 'Heading2']
+
+
+def is_pdf(filename):
+    with open(filename, 'rb') as file:
+        return file.read(5) == b'%PDF-'
+
+
+def test_export_writes_tasks_in_table_chunks(tmp_path, story):
+    filename = str(tmp_path / 'tasks.pdf')
+    tasks = (Task(f"task {i}", Priority.HIGH, done=i % 3 == 0) for i in range(120))
+    assert export.export_pdf(filename, tasks) == 120
+    assert is_pdf(filename)
+    chunks = tables(story)
+    assert [len(rows) for rows in chunks] == [51, 51, 21]
+    assert all(rows[0] == export.HEADER for rows in chunks)
+    assert [row[0] for rows in chunks for row in rows[1:]] == list(range(1, 121))
+    assert chunks[0][1] == [1, "[x]", "🔥", "task 0", "N/A"]
+
+
+def test_export_groups_by_category_in_list_order(tmp_path, story):
+    categories = ["work", "Home", None, "home", "work"]
+    tasks = [Task(f"task {i}", Priority.LOW, category) for i, category in enumerate(categories)]
+    assert export.export_pdf(str(tmp_path / 'tasks.pdf'), tasks, group_by_category=True) == 5
+    assert headings(story) == ["Home", "N/A", "work"]
+    assert [[row[0] for row in rows[1:]] for rows in tables(story)] == [[2, 4], [3], [1, 5]]
+
+
+def test_export_wraps_only_long_descriptions(tmp_path, story):
+    tasks = [Task("short", Priority.MEDIUM), Task("long " * 40, Priority.MEDIUM)]
+    export.export_pdf(str(tmp_path / 'tasks.pdf'), tasks)
+    (_, short, long), = tables(story)
+    assert short[3] == "short"
+    assert isinstance(long[3], Paragraph)
+
+
+def test_export_of_no_tasks(tmp_path, story):
+    filename = str(tmp_path / 'tasks.pdf')
+    assert export.export_pdf(filename, []) == 0
+    assert tables(story) == []
+    assert is_pdf(filename)
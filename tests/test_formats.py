@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+
+import pytest
+
+from todo.formats import read_tasks, write_tasks
+from todo.task import Priority, Task
+
+
+def tasks():
+    return [Task("one", Priority.HIGH, "work", id=1), Task("two", None, None, True, 2)]
+
+
+def written(fmt, tasks, lists=False):
+    file = io.StringIO()
+    write_tasks(file, tasks, fmt, lists)
+    return file.getvalue()
+
+
+def test_csv_has_a_list_column_only_for_several_lists():
+    assert 'list' not in next(csv.reader(io.StringIO(written('csv', tasks()))))
+    rows = list(csv.DictReader(io.StringIO(written('csv', zip(["home", "side project"], tasks()), lists=True))))
+    assert [(row['list'], row['description']) for row in rows] == [("home", "one"), ("side project", "two")]
+
+
+def test_jsonl_has_a_list_field():
+    rows = [json.loads(line) for line in written('jsonl', zip(["home", "work"], tasks()), lists=True).splitlines()]
+    assert [row['list'] for row in rows] == ["home", "work"]
+
+
+def test_todotxt_has_a_list_tag():
+    lines = written('todotxt', zip(["home", "side project"], tasks()), lists=True).splitlines()
+    assert lines == ["(A) one +work id:1 list:home", "x two id:2 list:side_project"]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'todotxt'])
+def test_import_ignores_the_list(fmt):
+    text = written(fmt, zip(["home", "work"], tasks()), lists=True)
+    assert [str(task) for task in read_tasks(io.StringIO(text), fmt)] == [str(task) for task in tasks()]
+
+
+def test_csv_with_line_breaks_and_commas_imports_as_one_line_per_task(tmp_path):
+    from todo import storage
+
+    path = str(tmp_path / 'todo.txt')
+    text = ('id,status,priority,description,category\r\n'
+            '1,open,high,"Ticket 1: crash, again\r\nsteps: open app","ops,\nteam"\r\n'
+            '2,open,low,"plain, with comma",\r\n')
+    storage.append_tasks(read_tasks(io.StringIO(text, newline=''), 'csv'), path)
+    with open(path) as file:
+        assert len(file.read().splitlines()) == 2
+    task = storage.load_index(path)[1]
+    assert (task.description, task.category) == ("Ticket 1: crash, again steps: open app", "ops, team")
+    task.done = True
+    storage.replace_task(task, path)
+    storage.compact(path)
+    assert [(task.id, task.done) for task in storage.load_tasks(path)] == [(1, True), (2, False)]
+    exported = written('csv', storage.load_tasks(path))
+    assert [str(task) for task in read_tasks(io.StringIO(exported, newline=''), 'csv')] == [
+        str(task) for task in storage.load_tasks(path)]
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from todo import search, storage
+from todo.task import Priority, Task
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'todo.txt')
+
+
+def test_index_follows_journal_and_compaction(path):
+    storage.save_tasks([Task("buy milk", Priority.HIGH), Task("write report", Priority.LOW)], path)
+    assert [task.id for task in search.search_tasks("milk", path)] == [1]
+    storage.append_task(Task("more milk", Priority.LOW), path)
+    storage.remove_task(1, path)
+    assert [task.id for task in search.search_tasks("milk", path)] == [3]
+    storage.compact(path)
+    storage.append_task(Task("milk again", Priority.LOW), path)
+    assert [task.id for task in search.search_tasks("milk", path)] == [3, 4]
+    assert sum(count for *_, count in search.task_counts(path)) == 3
+
+
+def test_compaction_waits_for_index_update(path, monkeypatch):
+    storage.save_tasks([Task("one", Priority.HIGH)], path)
+    search.search_tasks("one", path)
+    storage.append_task(Task("two", Priority.LOW), path)
+    read_journal = search.read_journal
+    compacted = threading.Event()
+
+    def compact_and_add():
+        storage.compact(path)
+        storage.append_task(Task("three", Priority.LOW), path)
+        compacted.set()
+
+    def racing_read_journal(journal_path):
+        result = read_journal(journal_path)
+        if not compacted.is_set() and not hasattr(racing_read_journal, 'thread'):
+            racing_read_journal.thread = threading.Thread(target=compact_and_add)
+            racing_read_journal.thread.start()
+            # Give the compaction every chance to slip in before the index is updated.
+            compacted.wait(0.3)
+        return result
+
+    monkeypatch.setattr(search, 'read_journal', racing_read_journal)
+    search.search_tasks("one", path)
+    racing_read_journal.thread.join()
+    monkeypatch.undo()
+    assert [task.description for task in search.search_tasks("t", path)] == ["two", "three"]
+    assert sum(count for *_, count in search.task_counts(path)) == 3
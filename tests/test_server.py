@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+from todo import storage
+from todo.daemon import CachedStore
+from todo.server import HTTPError, Api
+from todo.task import Priority, Task
+
+JSON = {'content-type': 'application/json'}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'todo.txt')
+
+
+@pytest.fixture
+def api(path):
+    store = CachedStore('text', path)
+    yield Api(store, '127.0.0.1', 8765)
+    store.close()
+
+
+def request(api, method, target, body=None):
+    status, _, data = asyncio.run(api.dispatch(method, target, json.dumps(body).encode() if body else b''))
+    return status, json.loads(data)
+
+
+def refused(api, method, headers):
+    with pytest.raises(HTTPError) as error:
+        api.check_request(method, headers)
+    return error.value.status
+
+
+@pytest.mark.parametrize('host', ['localhost:8765', '127.0.0.1:8765', '[::1]:8765', 'LOCALHOST:8765', 'localhost'])
+def test_own_host_is_accepted(api, host):
+    api.check_request('POST', {'host': host, **JSON})
+    api.check_request('GET', {'host': host, 'origin': f"http://{host}"})
+
+
+@pytest.mark.parametrize('host', ['evil.example:8765', 'localhost:9999', 'localhost:x'])
+def test_other_hosts_are_refused(api, host):
+    assert refused(api, 'GET', {'host': host}) == 403
+
+
+@pytest.mark.parametrize('origin', ['http://evil.example', 'https://localhost:8765', 'null', 'http://localhost:1'])
+def test_other_origins_are_refused(api, origin):
+    assert refused(api, 'POST', {'host': 'localhost:8765', 'origin': origin, **JSON}) == 403
+
+
+@pytest.mark.parametrize('content_type', [None, 'text/plain', 'application/x-www-form-urlencoded'])
+@pytest.mark.parametrize('method', ['POST', 'PATCH', 'DELETE'])
+def test_writes_must_be_json(api, method, content_type):
+    headers = {'host': 'localhost:8765'}
+    if content_type:
+        headers['content-type'] = content_type
+    assert refused(api, method, headers) == 415
+    api.check_request(method, {**headers, 'content-type': 'application/json; charset=utf-8'})
+
+
+def test_reads_need_no_content_type(api):
+    api.check_request('GET', {'host': 'localhost:8765'})
+
+
+def test_cached_lists_see_writes_by_other_programs(api, path):
+    storage.append_task(Task("one", Priority.HIGH), path)
+    for target in ('/tasks', '/search?q=one') * 2:
+        request(api, 'GET', target)
+    storage.append_task(Task("one more", Priority.LOW), path)
+    assert [task['description'] for task in request(api, 'GET', '/tasks')[1]['tasks']] == ["one", "one more"]
+    assert len(request(api, 'GET', '/search?q=one')[1]['tasks']) == 2
+
+
+def test_conflicts_are_reported_as_409(api, monkeypatch):
+    def update(change, path=None):
+        raise storage.ConflictError("todo.txt kept changing")
+
+    monkeypatch.setattr(api.store, 'update', update)
+    with pytest.raises(HTTPError) as error:
+        request(api, 'POST', '/tasks', {'description': "one"})
+    assert error.value.status == 409
+
+
+def test_line_breaks_in_fields_become_spaces(api):
+    status, task = request(api, 'POST', '/tasks', {'description': "first\nsecond", 'category': "a\r\nb"})
+    assert status == 201
+    assert (task['description'], task['category']) == ("first second", "a b")
+    with pytest.raises(HTTPError):
+        request(api, 'PATCH', f"/tasks/{task['id']}", {'description': "\n"})
@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from todo import storage
+from todo.task import Priority, Task
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'todo.txt')
+
+
+def add(path, *descriptions):
+    return [storage.append_task(Task(description, Priority.MEDIUM), path) for description in descriptions]
+
+
+def descriptions(tasks):
+    return {task.id: task.description for task in tasks}
+
+
+def test_journal_is_replayed_over_snapshot(path):
+    storage.save_tasks([Task("one", Priority.HIGH)], path)
+    add(path, "two", "three")
+    assert os.path.exists(storage.journal_path(path))
+    assert descriptions(storage.load_tasks(path)) == {1: "one", 2: "two", 3: "three"}
+
+
+def test_snapshot_edited_by_hand_keeps_journal(path):
+    add(path, "one", "two")
+    with open(path, 'a') as file:
+        file.write("[ ] 🔶 by hand\n")
+    assert descriptions(storage.load_tasks(path)) == {1: "one", 2: "two", 3: "by hand"}
+    # Adding folds the journal into the edited snapshot; the hand-made task keeps its ID.
+    add(path, "four")
+    assert descriptions(storage.load_tasks(path)) == {1: "one", 2: "two", 3: "by hand", 4: "four"}
+    assert descriptions(storage.iter_tasks(path)) == descriptions(storage.load_tasks(path))
+
+
+def test_copied_list_keeps_journal(tmp_path):
+    source = tmp_path / 'a'
+    source.mkdir()
+    path = str(source / 'todo.txt')
+    storage.save_tasks([Task("one", Priority.HIGH)], path)
+    add(path, "two")
+    shutil.copytree(source, tmp_path / 'b')
+    copy = str(tmp_path / 'b' / 'todo.txt')
+    assert descriptions(storage.load_tasks(copy)) == {1: "one", 2: "two"}
+    add(copy, "three")
+    assert descriptions(storage.load_tasks(copy)) == {1: "one", 2: "two", 3: "three"}
+
+
+def test_journal_left_by_interrupted_compaction_is_harmless(path):
+    add(path, "one", "two")
+    storage.remove_task(1, path)
+    journal = storage.journal_path(path)
+    with open(journal) as file:
+        leftover = file.read()
+    storage.compact(path)
+    # As if compaction had crashed before removing the journal.
+    with open(journal, 'w') as file:
+        file.write(leftover)
+    assert descriptions(storage.load_tasks(path)) == {2: "two"}
+    add(path, "three")
+    assert descriptions(storage.load_tasks(path)) == {2: "two", 3: "three"}
+
+
+def test_unreadable_header_still_replays_records(path):
+    add(path, "one")
+    journal = storage.journal_path(path)
+    with open(journal) as file:
+        lines = file.read().splitlines()
+    with open(journal, 'w') as file:
+        file.write("\n".join(["not a header", *lines[1:]]) + "\n")
+    assert descriptions(storage.load_tasks(path)) == {1: "one"}
+
+
+def test_compaction_folds_journal_into_snapshot(path, monkeypatch):
+    monkeypatch.setattr(storage, 'COMPACT_THRESHOLD', 500)
+    ids = add(path, *(f"task {i}" for i in range(20)))
+    storage.remove_task(ids[3], path)
+    storage.replace_task(Task("changed", Priority.LOW, id=ids[5]), path)
+    expected = {task_id: f"task {i}" for i, task_id in enumerate(ids) if i != 3}
+    expected[ids[5]] = "changed"
+    assert descriptions(storage.load_tasks(path)) == expected
+    with open(storage.journal_path(path)) as file:
+        assert len(file.read()) <= 500
+    storage.compact(path)
+    assert descriptions(storage.load_tasks(path)) == expected
+    assert os.path.getsize(path) > 0
+
+
+def test_iter_tasks_matches_load_order(path):
+    storage.save_tasks([Task(f"task {i}", Priority.MEDIUM) for i in range(5)], path)
+    add(path, "added 1", "added 2")
+    storage.replace_task(Task("changed 2", Priority.HIGH, id=2), path)
+    storage.remove_task(3, path)
+    storage.replace_task(Task("changed added", Priority.LOW, id=7), path)
+    storage.remove_task(6, path)
+    storage.replace_task(Task("put back", Priority.LOW, id=3), path)
+    loaded = [str(task) for task in storage.load_tasks(path)]
+    assert [str(task) for task in storage.iter_tasks(path)] == loaded
+    assert [task.id for task in storage.load_tasks(path)] == [1, 2, 4, 5, 7, 3]
+
+
+def test_commit_conflicts_only_on_tasks_changed_since(path):
+    add(path, "one", "two")
+    expected = storage.version(path)
+    storage.replace_task(Task("one, elsewhere", Priority.MEDIUM, id=1), path)
+    storage.commit([Task("two, here", Priority.MEDIUM, id=2)], path=path, expected=expected)
+    with pytest.raises(storage.ConflictError):
+        storage.commit([Task("one, here", Priority.MEDIUM, id=1)], path=path, expected=expected)
+    assert descriptions(storage.load_tasks(path)) == {1: "one, elsewhere", 2: "two, here"}
+
+
+def test_commit_conflicts_after_snapshot_rewrite(path):
+    add(path, "one")
+    expected = storage.version(path)
+    storage.compact(path)
+    with pytest.raises(storage.ConflictError):
+        storage.commit([Task("two", Priority.MEDIUM, id=2)], path=path, expected=expected)
+
+
+def test_update_retries_on_conflict(path):
+    add(path, "one")
+    calls = []
+
+    def change(index):
+        calls.append(dict(index))
+        if len(calls) == 1:
+            # Another process changes the same task in between.
+            storage.replace_task(Task("elsewhere", Priority.MEDIUM, id=1), path)
+        task = index[1]
+        task.description += " and here"
+        return [task], (), task.description
+
+    assert storage.update(change, path) == "elsewhere and here"
+    assert len(calls) == 2
+
+
+def test_journal_records_are_json_lines(path):
+    add(path, "one")
+    with open(storage.journal_path(path)) as file:
+        header, record = map(json.loads, file.read().splitlines())
+    assert record == {'op': 'put', 'id': 1, 'task': "[ ] 🔶 one [ID: 1]"}
+    assert 'next_id' in header
+
+
+def test_ids_are_not_reused_after_delete_and_compaction(path):
+    add(path, "one", "two", "three")
+    storage.remove_task(3, path)
+    storage.compact(path)
+    assert add(path, "four") == [4]
+    storage.save_tasks([], path)
+    assert add(path, "five") == [5]
+    assert storage.next_task_id(storage.load_index(path)) == 6
+
+
+def test_legacy_file_keeps_its_ids_through_add_and_complete(path):
+    with open(path, 'w') as file:
+        file.write("[ ] 🔥 one\n[ ] 🔷 two\n[ ] 🔶 three\n")
+    assert add(path, "x") == [4]
+    task = storage.load_index(path)[1]
+    task.done = True
+    storage.replace_task(task, path)
+    tasks = storage.load_tasks(path)
+    assert {task.id: (task.description, task.done) for task in tasks} == {
+        1: ("one", True), 2: ("two", False), 3: ("three", False), 4: ("x", False)}
@@ -0,0 +1,55 @@
+import datetime
+
+import pytest
+
+from todo.task import Task, next_due, parse_every
+
+date = datetime.date
+
+
+@pytest.mark.parametrize('due, every, today, expected', [
+    # Month ends are clamped, but later months go back to the original day.
+    (date(2023, 1, 31), 'month', date(2023, 1, 31), date(2023, 2, 28)),
+    (date(2024, 1, 31), 'month', date(2024, 1, 31), date(2024, 2, 29)),
+    (date(2023, 1, 31), 'month', date(2023, 2, 28), date(2023, 3, 31)),
+    (date(2024, 2, 29), 'year', date(2024, 2, 29), date(2025, 2, 28)),
+    # Rolling over into the next year.
+    (date(2023, 12, 15), 'month', date(2023, 12, 15), date(2024, 1, 15)),
+    (date(2023, 11, 30), '3 months', date(2023, 11, 30), date(2024, 2, 29)),
+    (date(2023, 12, 31), 'day', date(2023, 12, 31), date(2024, 1, 1)),
+    (date(2023, 12, 28), 'week', date(2023, 12, 28), date(2024, 1, 4)),
+    # Daily and weekly steps.
+    (date(2024, 6, 1), 'day', date(2024, 6, 1), date(2024, 6, 2)),
+    (date(2024, 6, 1), '3 days', date(2024, 6, 1), date(2024, 6, 4)),
+    (date(2024, 6, 1), 'week', date(2024, 6, 1), date(2024, 6, 8)),
+    (date(2024, 6, 1), '2 weeks', date(2024, 6, 1), date(2024, 6, 15)),
+    # An overdue task skips the dates already past, staying on its schedule.
+    (date(2024, 6, 1), 'week', date(2024, 6, 20), date(2024, 6, 22)),
+    (date(2024, 6, 1), 'day', date(2024, 5, 1), date(2024, 6, 2)),
+])
+def test_next_due(due, every, today, expected):
+    assert next_due(due, every, today) == expected
+
+
+def test_next_due_without_a_recurrence():
+    assert next_due(date(2024, 6, 1), 'fortnightly', date(2024, 6, 1)) is None
+
+
+@pytest.mark.parametrize('text, stored', [
+    ('daily', 'day'), ('weekly', 'week'), ('2w', '2 weeks'), ('3 days', '3 days'), (' Monthly ', 'month'), ('1y', 'year'),
+])
+def test_parse_every(text, stored):
+    assert parse_every(text) == stored
+
+
+@pytest.mark.parametrize('text', ['', '0d', 'fortnightly', '2 decades'])
+def test_parse_every_rejects(text):
+    with pytest.raises(ValueError):
+        parse_every(text)
+
+
+def test_next_occurrence_is_open_and_keeps_the_schedule():
+    task = Task("Pay rent", due=date(2000, 1, 31), every='month', done=True)
+    upcoming = task.next_occurrence()
+    assert not upcoming.done and upcoming.every == 'month' and upcoming.due > datetime.date.today()
+    assert Task("once", due=date(2024, 1, 1)).next_occurrence() is None
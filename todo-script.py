@@ -1,176 +1,147 @@
-import os
-import re
+import itertools
+import shutil
 from colorama import init, Fore, Style
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 import click
+from todo.api import TodoStore, numbered_tasks
 
 # Initialize colorama
 init(autoreset=True)
 
-TODO_FILE = 'todo.txt'
-
-PRIORITY_MAP = {
-    "high": "🔥",
-    "medium": "🔶",
-    "low": "🔷",
-}
+# The task list in the current directory (see todo.api)
+todos = TodoStore()
 
 DEFAULT_PRIORITY = "medium"
 
-def load_tasks():
-    if not os.path.exists(TODO_FILE):
-        return []
-    with open(TODO_FILE, 'r') as file:
-        tasks = [line.strip() for line in file]
-    return tasks
+# Terminal lines taken up by the menu and prompts around the list.
+MENU_LINES = 12
 
-def save_tasks(tasks):
-    with open(TODO_FILE, 'w') as file:
-        for task in tasks:
-            file.write(f"{task}\n")
+# What the interactive loop last printed: ID -> (number, line), and the store generation it showed.
+shown_lines = None
+shown_generation = None
 
 def add_task(task, category=None, priority=None):
-    priority = priority or DEFAULT_PRIORITY
-    tasks = load_tasks()
-    category_str = f" [Category: {category}]" if category else ""
-    tasks.append(f"[ ] {PRIORITY_MAP[priority]} {task}{category_str}")
-    save_tasks(tasks)
+    todos.add(task, priority or DEFAULT_PRIORITY, category)
     return Fore.GREEN + Style.BRIGHT + f"Added task: '{task}'"
 
 def view_tasks():
-    tasks = load_tasks()
-    if not tasks:
+    numbered = todos.numbered()
+    if not numbered:
         return Fore.RED + Style.BRIGHT + "No tasks found."
 
-    # Sort tasks by priority
-    priority_order = {'🔥': 1, '🔶': 2, '🔷': 3}
-    sorted_tasks = sorted(
-        tasks,
-        key=lambda x: priority_order.get(re.search(r'🔷|🔶|🔥', x).group(0), 4) if re.search(r'🔷|🔶|🔥', x) else 4
-    )
-
     output = [Fore.MAGENTA + Style.BRIGHT + "\nYour To-Do List:"]
-    for i, task in enumerate(sorted_tasks, 1):
+    for i, task in numbered:
         output.append(f"{i}. {task}")
     output.append("")
     click.echo("\n".join(output))  # Use click.echo instead of print
-    return sorted_tasks
+    return [task for _, task in numbered]
+
+def show_tasks(full=False):
+    """Print the list for the interactive loop.
+
+    A list that fits on the screen is printed in full every time. A longer
+    one is printed in full the first time (or when ``full`` is set), and
+    after that only the tasks that were added, changed, moved to another
+    number or removed since.
+    """
+    global shown_lines, shown_generation
+    count = len(todos)
+    if not count:
+        print(Fore.RED + Style.BRIGHT + "No tasks found.")
+        shown_lines, shown_generation = {}, todos.generation
+        return
+    if full or shown_lines is None or count <= shutil.get_terminal_size().lines - MENU_LINES:
+        tasks = view_tasks()
+        shown_lines = {task.id: (number, str(task)) for number, task in numbered_tasks(tasks)}
+    elif todos.generation == shown_generation:
+        print(Fore.MAGENTA + Style.BRIGHT + f"\nYour To-Do List is unchanged ({count} tasks, 8 shows them all).\n")
+    else:
+        # Compare numbers as well as text: the numbers are what the menu's
+        # commands take, so a task that moved must be shown again.
+        lines = {task.id: (number, str(task)) for number, task in numbered_tasks(list(todos))}
+        changed = [f"{number}. {line}" for task_id, (number, line) in sorted(lines.items(), key=lambda item: item[1][0])
+                   if shown_lines.get(task_id) != (number, line)]
+        removed = [line for task_id, (_, line) in shown_lines.items() if task_id not in lines]
+        output = [Fore.MAGENTA + Style.BRIGHT + f"\nChanges to your To-Do List ({count} tasks, 8 shows them all):"]
+        output += changed
+        output += [Fore.RED + f"Removed: {line}" for line in removed]
+        output.append("")
+        click.echo("\n".join(output))
+        shown_lines = lines
+    shown_generation = todos.generation
+
+def find_task(task_number):
+    """Return the task listed as ``task_number`` by view_tasks, or None."""
+    task_id = todos.resolve(task_number)
+    return None if task_id is None else todos.get(task_id)
 
 def complete_task(task_number):
-    tasks = load_tasks()
-    sorted_tasks = view_tasks()
-    if 0 < task_number <= len(sorted_tasks):
-        task = sorted_tasks[task_number - 1]
-        index = tasks.index(task)
-        if task.startswith("[ ]"):
-            tasks[index] = task.replace("[ ]", "[x]", 1)
-            save_tasks(tasks)
-            return Fore.GREEN + Style.BRIGHT + f"Task {task_number} marked as complete."
+    task = find_task(task_number)
+    if task:
+        if not task.done:
+            following = todos.complete(task.id)
+            message = Fore.GREEN + Style.BRIGHT + f"Task {task_number} marked as complete."
+            for upcoming in following:
+                message += f"\nNext '{upcoming.description}' is due {upcoming.due.isoformat()}."
+            return message
         else:
             return Fore.YELLOW + Style.BRIGHT + f"Task {task_number} is already completed."
     else:
         return Fore.RED + Style.BRIGHT + "Invalid task number."
 
 def delete_task(task_number):
-    tasks = load_tasks()
-    sorted_tasks = view_tasks()
-    if 0 < task_number <= len(sorted_tasks):
-        task = sorted_tasks[task_number - 1]
-        tasks.remove(task)
-        save_tasks(tasks)
+    task = find_task(task_number)
+    if task:
+        todos.delete(task.id)
         return Fore.GREEN + Style.BRIGHT + f"Deleted task: '{task}'"
     else:
         return Fore.RED + Style.BRIGHT + "Invalid task number."
 
 def clear_tasks():
-    save_tasks([])
+    todos.clear()
     return Fore.GREEN + Style.BRIGHT + "All tasks have been cleared."
 
 def edit_task(task_number, new_task):
-    tasks = load_tasks()
-    sorted_tasks = view_tasks()
-    if 0 < task_number <= len(sorted_tasks):
-        task = sorted_tasks[task_number - 1]
-        index = tasks.index(task)
-        parts = re.split(r'(\[.\]) (.)', task, 1)
-        tasks[index] = f"{parts[1]} {parts[2]} {new_task}"
-        save_tasks(tasks)
+    task = find_task(task_number)
+    if task:
+        try:
+            todos.edit(task.id, description=new_task)
+        except ValueError as error:
+            return Fore.RED + Style.BRIGHT + f"{error}."
         return Fore.GREEN + Style.BRIGHT + f"Task {task_number} has been updated to: '{new_task}'"
     else:
         return Fore.RED + Style.BRIGHT + "Invalid task number."
 
 def search_task(keyword):
-    tasks = load_tasks()
-    found_tasks = [task for task in tasks if keyword.lower() in task.lower()]
+    from todo.search import highlight
+
+    found_tasks = todos.search(keyword)
     if found_tasks:
         output = [Fore.GREEN + Style.BRIGHT + f"\nTasks containing '{keyword}':"]
         for i, task in enumerate(found_tasks, 1):
-            highlighted_task = re.sub(f"({keyword})", Fore.YELLOW + r"\1" + Fore.GREEN, task, flags=re.IGNORECASE)
+            highlighted_task = highlight(str(task), keyword, Fore.YELLOW, Fore.GREEN)
             output.append(f"{i}. {highlighted_task}")
         return "\n".join(output)
     else:
         return Fore.RED + Style.BRIGHT + f"No tasks found containing '{keyword}'."
 
 def prioritize_task(task_number, priority):
-    tasks = load_tasks()
-    sorted_tasks = view_tasks()
-    if 0 < task_number <= len(sorted_tasks):
-        task = sorted_tasks[task_number - 1]
-        index = tasks.index(task)
-        parts = re.split(r'(\[.\]) (.)', task, 1)
-        tasks[index] = f"{parts[1]} {PRIORITY_MAP[priority]} {parts[3].strip()}"
-        save_tasks(tasks)
+    task = find_task(task_number)
+    if task:
+        todos.edit(task.id, priority=priority)
         return Fore.GREEN + Style.BRIGHT + f"Task {task_number} has been prioritized as {priority}."
     else:
         return Fore.RED + Style.BRIGHT + "Invalid task number."
 
 def export_to_pdf(filename):
-    tasks = load_tasks()
-    if not tasks:
-        return Fore.RED + Style.BRIGHT + "No tasks to export."
-
-    doc = SimpleDocTemplate(filename, pagesize=letter)
-    elements = []
-
-    # Title
-    styles = getSampleStyleSheet()
-    title_style = styles["Title"]
-    title = Paragraph("To-Do List", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 12))
+    # reportlab is slow to import, so only load it when exporting.
+    from todo.export import export_pdf
 
-    # Create table data
-    data = [["#", "Status", "Priority", "Task Description", "Category"]]
-    for i, task in enumerate(tasks, 1):
-        parts = re.split(r'(\[.\]) (.)', task, 1)
-        if len(parts) < 4:
-            continue
-        status = parts[1]
-        priority = parts[2]
-        description = parts[3].strip()
-        category_match = re.search(r'\[Category: (.*?)\]', description)
-        category = category_match.group(1) if category_match else "N/A"
-        description = re.sub(r'\[Category: (.*?)\]', '', description).strip()
-        data.append([i, status, priority, description, category])
-
-    # Create table
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
+    tasks = todos.tasks()
+    first = next(tasks, None)
+    if first is None:
+        return Fore.RED + Style.BRIGHT + "No tasks to export."
 
-    elements.append(table)
-    doc.build(elements)
+    export_pdf(filename, itertools.chain([first], tasks))
     return Fore.GREEN + Style.BRIGHT + f"Tasks have been exported to {filename}."
 
 def show_help():
@@ -191,6 +162,8 @@ def show_help():
         "   - Enter the keyword to search for.\n"
         "7. ⭐ Prioritize task: Set the priority of an existing task (high, medium, low).\n"
         "   - Enter the task number and the priority level.\n"
+        "8. 📋 View all tasks: Show the whole list again.\n"
+        "   - Long lists otherwise only show what changed since they were last shown.\n"
         "10. 📄 Export to PDF: Export tasks to a PDF file.\n"
         "   - Enter the filename for the PDF (e.g., tasks.pdf).\n"
         "11. 🚪 Exit: Exit the application.\n"
@@ -201,13 +174,25 @@ def show_help():
 def show_menu():
     print(Fore.YELLOW + Style.BRIGHT + "1.  ➕ Add task          6.  🔍 Search task")
     print(Fore.YELLOW + Style.BRIGHT + "2.  ✔️  Complete task    7.  ⭐ Prioritize task")
-    print(Fore.YELLOW + Style.BRIGHT + "3.  ✏️  Edit task        10. 📄 Export to PDF")
-    print(Fore.YELLOW + Style.BRIGHT + "4.  ❌ Delete task       11. 🚪 Exit")
-    print(Fore.YELLOW + Style.BRIGHT + "5.  🗑️  Clear all tasks  0.  🆘 Help")
+    print(Fore.YELLOW + Style.BRIGHT + "3.  ✏️  Edit task        8.  📋 View all tasks")
+    print(Fore.YELLOW + Style.BRIGHT + "4.  ❌ Delete task       10. 📄 Export to PDF")
+    print(Fore.YELLOW + Style.BRIGHT + "5.  🗑️  Clear all tasks  11. 🚪 Exit")
+    print(Fore.YELLOW + Style.BRIGHT + "0.  🆘 Help")
     print("--------------------------------------------------")
 
 def main():
+    # Keep the list in memory for the session, reloading it only when
+    # another program changes the files.
+    global todos
+    todos = TodoStore(cached=True)
+    try:
+        run_menu()
+    finally:
+        todos.close()
+
+def run_menu():
     first_run = True
+    show_all = False
     last_message = ""
     help_message = ""
     while True:
@@ -226,7 +211,8 @@ def main():
             print("--------------------------------------------------")
             first_run = False
         show_menu()
-        tasks_output = view_tasks()  # Automatically display the to-do list each time
+        show_tasks(show_all)  # Automatically display the to-do list each time
+        show_all = False
         if last_message:
             print(last_message)
             last_message = ""
@@ -281,6 +267,8 @@ def main():
                     last_message = Fore.RED + Style.BRIGHT + "Invalid priority. Please choose from high, medium, or low."
             except ValueError:
                 last_message = Fore.RED + Style.BRIGHT + "Please enter a valid task number."
+        elif choice == '8':
+            show_all = True
         elif choice == '10':
             filename = input(Fore.MAGENTA + Style.BRIGHT + "Enter the filename for the PDF (e.g., tasks.pdf, include the .pdf): ").strip()
             last_message = export_to_pdf(filename)
@@ -0,0 +1,451 @@
+"""Python API for task lists.
+
+``TodoStore`` is a task list for Python programs. It takes and returns
+Task objects rather than formatted text, and both `todo` (todo/cli.py)
+and todo-script.py are built on it::
+
+    from todo.api import TodoStore
+
+    with TodoStore(cached=True) as todos:
+        task = todos.add("Write report", priority='high', due='2024-06-01')
+        with todos.transaction() as tx:
+            tx.complete(task.id)
+            tx.edit(3, category='work')
+            tx.delete(4)
+        for number, task in todos.numbered(status='open', limit=20):
+            print(number, task.description, task.due)
+
+By default every call reads and writes the task files directly, which
+suits one-off calls such as a CLI command. ``cached=True`` keeps the parsed
+list in memory (see todo.daemon.CachedStore), for programs that make many
+calls: reads cost no reparse, and writes go to disk straight away unless
+another program changed the same tasks meanwhile. The cache is reloaded if
+another program changes the files.
+
+Tasks returned by a cached store are its own objects; change tasks
+through the store's methods rather than by setting their fields.
+Unknown task IDs raise KeyError and invalid values ValueError, before
+anything is written. Line breaks in descriptions and categories become
+spaces, as each task is one line of the task file.
+"""
+import contextlib
+import copy
+import datetime
+import heapq
+import itertools
+import os
+from collections import Counter
+from operator import attrgetter, itemgetter
+
+from todo import trace
+from todo.backends import FILES, backend_name, get_backend
+from todo.storage import next_task_id
+from todo.task import Priority, Task, parse_date, parse_every, single_line, task_filter
+
+# Fields that ``edit`` can change.
+EDITABLE_FIELDS = ('description', 'priority', 'category', 'due', 'every', 'done')
+
+
+def sort_tasks(tasks):
+    """Sort tasks by priority, then due date."""
+    with trace.phase('sort'):
+        tasks.sort(key=attrgetter('rank'))
+    return tasks
+
+
+def display_order(index, limit=None):
+    """Return task IDs in the order `view` numbers them, only the first ``limit`` if given."""
+    with trace.phase('sort'):
+        key = lambda task_id: index[task_id].rank
+        # Picking a few of many tasks is cheaper than ordering all of them.
+        if limit is not None and limit * 10 < len(index):
+            return heapq.nsmallest(limit, index, key=key)
+        return sorted(index, key=key)[:limit]
+
+
+def numbered_tasks(tasks):
+    """Yield (number, task) for a list of tasks in file order, numbered the way `view` lists them.
+
+    Tasks are listed by priority and due date and, within the same rank, in
+    file order, so a task's number is the count of tasks ranked before it
+    plus its place among those of its own rank. Counting gives the numbers
+    without sorting the tasks themselves.
+    """
+    with trace.phase('sort'):
+        counts = Counter(task.rank for task in tasks)
+        last_number, total = {}, 0
+        for rank in sorted(counts):
+            last_number[rank] = total
+            total += counts[rank]
+    for task in tasks:
+        last_number[task.rank] += 1
+        yield last_number[task.rank], task
+
+
+def resolve_task(index, task_ref, order=None):
+    """Find the ID of a task given its number in the list or 'id:N'."""
+    task_ref = str(task_ref).strip().lower()
+    try:
+        if task_ref.startswith('id:'):
+            task_id = int(task_ref[3:])
+            return task_id if task_id in index else None
+        task_number = int(task_ref)
+    except ValueError:
+        return None
+    if not 0 < task_number <= len(index):
+        return None
+    order = order or display_order(index, task_number)
+    return order[task_number - 1]
+
+
+def select_tasks(todos, index, task_refs, where=None):
+    """Resolve task numbers, ranges like 3-7, 'id:N' and a search query to task IDs.
+
+    Raises ValueError with the offending reference if one is invalid.
+    """
+    # Only the tasks up to the highest number given need to be put in order.
+    highest = max((int(part) for task_ref in task_refs for part in task_ref.split('-') if part.isdigit()), default=0)
+    order = display_order(index, highest) if highest else None
+    selected = {}
+    for task_ref in task_refs:
+        start, sep, end = task_ref.partition('-')
+        if sep and start.isdigit() and end.isdigit():
+            if not 0 < int(start) <= int(end) <= len(index):
+                raise ValueError(task_ref)
+            selected.update(dict.fromkeys(order[int(start) - 1:int(end)]))
+            continue
+        task_id = resolve_task(index, task_ref, order)
+        if task_id is None:
+            raise ValueError(task_ref)
+        selected[task_id] = None
+    if where:
+        selected.update(dict.fromkeys(task.id for task in todos.search(where) if task.id in index))
+    return list(selected)
+
+
+def _priority(value):
+    if value is None or isinstance(value, Priority):
+        return value
+    name = str(value).strip().upper()
+    if name not in Priority.__members__:
+        raise ValueError(f"Invalid priority: {value!r} (use high, medium or low)")
+    return Priority[name]
+
+
+def _date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return parse_date(str(value))
+
+
+def _every(value):
+    return parse_every(str(value)) if value else None
+
+
+def _category(value):
+    return single_line(str(value)) or None if value else None
+
+
+def _new_task(description, priority, category, due, every):
+    return Task(single_line(str(description)), _priority(priority), _category(category),
+                due=_date(due), every=_every(every))
+
+
+def _field_values(fields):
+    """Check the fields given to ``edit`` and return them with their values converted."""
+    unknown = set(fields) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+    values = dict(fields)
+    if 'description' in values:
+        values['description'] = single_line(str(values['description'] or ''))
+        if not values['description']:
+            raise ValueError("The description must not be empty")
+    if 'category' in values:
+        values['category'] = _category(values['category'])
+    if 'priority' in values:
+        values['priority'] = _priority(values['priority'])
+    if 'due' in values:
+        values['due'] = _date(values['due'])
+    if 'every' in values:
+        values['every'] = _every(values['every'])
+    if 'done' in values:
+        values['done'] = bool(values['done'])
+    return values
+
+
+class Transaction:
+    """Changes collected by ``TodoStore.transaction()``, written together when it ends.
+
+    The changes are applied to the list as it is when the transaction is
+    committed, so tasks read inside it do not reflect them yet.
+    """
+
+    def __init__(self):
+        self._operations = []
+        # Every task added, changed or completed, as written; filled in on commit.
+        self.changed = []
+        # The next occurrences of the recurring tasks that were completed.
+        self.following = []
+
+    def add(self, description, priority=Priority.MEDIUM, category=None, due=None, every=None):
+        """Add a task; the returned Task gets its ID when the transaction is committed."""
+        task = _new_task(description, priority, category, due, every)
+        self._operations.append(('add', task))
+        return task
+
+    def complete(self, task_id):
+        """Mark a task as complete, adding its next occurrence if it recurs."""
+        self._operations.append(('complete', task_id))
+
+    def edit(self, task_id, **fields):
+        """Change fields of a task: description, priority, category, due, every or done."""
+        self._operations.append(('edit', task_id, _field_values(fields)))
+
+    def delete(self, task_id):
+        """Remove a task."""
+        self._operations.append(('delete', task_id))
+
+    def _apply(self, index):
+        """Apply the changes to an ID-to-Task dict, as a backend's ``update`` change."""
+        # Tasks as changed so far, None once deleted. The tasks in ``index``
+        # may be a cache's own, so they are copied before being changed.
+        working = {}
+        next_id = next_task_id(index)
+        self.following = []
+
+        def get(task_id):
+            task = working[task_id] if task_id in working else index.get(task_id)
+            if task is None:
+                raise KeyError(task_id)
+            if task_id not in working:
+                task = working[task_id] = copy.copy(task)
+            return task
+
+        for operation, *args in self._operations:
+            if operation == 'add':
+                task = args[0]
+                task.id, next_id = next_id, next_id + 1
+                working[task.id] = task
+            elif operation == 'complete':
+                task = get(args[0])
+                if not task.done:
+                    task.done = True
+                    upcoming = task.next_occurrence()
+                    if upcoming is not None:
+                        upcoming.id, next_id = next_id, next_id + 1
+                        working[upcoming.id] = upcoming
+                        self.following.append(upcoming)
+            elif operation == 'edit':
+                task = get(args[0])
+                for name, value in args[1].items():
+                    setattr(task, name, value)
+            else:
+                get(args[0])
+                working[args[0]] = None
+        self.changed = [task for task in working.values() if task is not None]
+        removed = [task_id for task_id, task in working.items() if task is None and task_id in index]
+        if not self.changed and not removed:
+            return None
+        return self.changed, removed, None
+
+
+class TodoStore:
+    """A task list: the one in ``directory`` (default: the current directory), or see ``open_list``.
+
+    ``backend`` is 'text' or 'sqlite' (see todo.backends); by default it is
+    chosen the way `todo` chooses it.
+    """
+
+    def __init__(self, directory=None, backend=None, cached=False):
+        name = backend or backend_name(directory)
+        path = os.path.join(directory, FILES[name]) if directory else None
+        if cached:
+            from todo.daemon import CachedStore
+
+            store = CachedStore(name, path)
+        else:
+            store = get_backend(name)
+        self._bind(store, directory, path)
+
+    def _bind(self, store, directory, path):
+        self._store = store
+        self.directory = directory
+        self.path = path
+        self.cached = hasattr(store, 'cached_index')
+
+    @classmethod
+    def wrap(cls, store):
+        """Return a TodoStore for the current directory on top of a backend module or a CachedStore."""
+        todos = cls.__new__(cls)
+        todos._bind(store, None, None)
+        return todos
+
+    @classmethod
+    def open_list(cls, name, **options):
+        """Open a named list (see todo.lists), creating it if there is none by that name."""
+        from todo.lists import list_directory, register
+
+        return cls(list_directory(name) or register(name), **options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Drop the cached list; a cached store cannot be used afterwards."""
+        if self.cached:
+            self._store.close()
+
+    @property
+    def generation(self):
+        """A number that goes up whenever a cached list changes (None if not cached)."""
+        return self._store.generation if self.cached else None
+
+    def _index(self):
+        return self._store.cached_index() if self.cached else self._store.load_index(self.path)
+
+    # Reading
+
+    def __len__(self):
+        return len(self._index())
+
+    def __iter__(self):
+        return self.tasks()
+
+    def get(self, task_id):
+        """Return the task with the given ID, or None."""
+        return self._index().get(task_id)
+
+    def tasks(self, status=None, category=None, priority=None):
+        """Yield the tasks with the given status ('open' or 'done'), category and priority, in ID order."""
+        if isinstance(priority, Priority):
+            priority = priority.name.lower()
+        return iter(self._store.query_tasks(status, category, priority, path=self.path))
+
+    def numbered(self, status=None, category=None, priority=None, limit=None, offset=0):
+        """Return (number, task) for the matching tasks in `view` order, ``limit`` of them after ``offset``.
+
+        Numbers are the tasks' places in the whole list, so they stay the
+        same whatever the filters.
+        """
+        if isinstance(priority, Priority):
+            priority = priority.name.lower()
+        tasks = self._store.load_tasks(self.path)
+        end = offset + limit if limit else None
+        if status or category or priority:
+            matches = task_filter(status, category, priority)
+            matched = (entry for entry in numbered_tasks(tasks) if matches(entry[1]))
+            with trace.phase('sort'):
+                if end is None:
+                    return sorted(matched, key=itemgetter(0))[offset:]
+                # Only the first page needs to be put in order.
+                return heapq.nsmallest(end, matched, key=itemgetter(0))[offset:]
+        # Without a filter a task's number is simply its place in the sorted list.
+        if end is not None and end * 10 < len(tasks):
+            with trace.phase('sort'):
+                tasks = heapq.nsmallest(end, tasks, key=attrgetter('rank'))
+        else:
+            tasks = sort_tasks(tasks)
+        return list(itertools.islice(enumerate(tasks, 1), offset, end))
+
+    def search(self, query):
+        """Return the tasks matching a search query (see todo.search), in ID order."""
+        return self._store.search_tasks(query, path=self.path)
+
+    def archived(self, query=None):
+        """Yield the archived tasks (see todo.archive), only those matching ``query`` if given."""
+        from todo.archive import iter_archive
+        from todo.search import query_filter
+
+        tasks = iter_archive(self._archive_dir())
+        return filter(query_filter(query), tasks) if query else tasks
+
+    def due(self, before=None, limit=None):
+        """Return the open tasks that have a due date, before ``before`` if given, soonest first.
+
+        Tasks due on the same day come in priority order. ``limit`` returns only the first so many.
+        """
+        return self._store.due_tasks(_date(before), limit, path=self.path)
+
+    def counts(self):
+        """Return (done, priority, category, count) for every combination that has tasks."""
+        return self._store.task_counts(path=self.path)
+
+    def rebuild_counts(self):
+        """Recount the tasks from scratch."""
+        self._store.rebuild_counts(path=self.path)
+
+    def resolve(self, task_ref):
+        """Return the ID of the task with a number in the list or 'id:N', or None."""
+        return resolve_task(self._index(), task_ref)
+
+    def select(self, task_refs, where=None):
+        """Return the IDs of task numbers, ranges like 3-7, 'id:N' and a search query.
+
+        Raises ValueError with the offending reference if one is invalid.
+        """
+        return select_tasks(self, self._index(), task_refs, where)
+
+    # Changing
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Collect changes in a Transaction and write them all at once when the block ends.
+
+        Nothing is written if the block raises, or if any change is invalid.
+        """
+        transaction = Transaction()
+        yield transaction
+        if transaction._operations:
+            self.update(transaction._apply)
+
+    def update(self, change):
+        """Apply a read-modify-write change (see todo.storage.update) and return its result."""
+        return self._store.update(change, path=self.path)
+
+    def add(self, description, priority=Priority.MEDIUM, category=None, due=None, every=None):
+        """Add a task and return it, with its new ID."""
+        task = _new_task(description, priority, category, due, every)
+        self._store.append_task(task, path=self.path)
+        return task
+
+    def add_many(self, tasks):
+        """Add many Task objects in one write and return how many were added."""
+        return self._store.append_tasks(tasks, path=self.path)
+
+    def complete(self, *task_ids):
+        """Mark tasks as complete and return the next occurrences of those that recur."""
+        with self.transaction() as transaction:
+            for task_id in task_ids:
+                transaction.complete(task_id)
+        return transaction.following
+
+    def edit(self, task_id, **fields):
+        """Change fields of a task (description, priority, category, due, every or done) and return it."""
+        with self.transaction() as transaction:
+            transaction.edit(task_id, **fields)
+        return next((task for task in transaction.changed if task.id == task_id), self.get(task_id))
+
+    def delete(self, *task_ids):
+        """Remove tasks."""
+        with self.transaction() as transaction:
+            for task_id in task_ids:
+                transaction.delete(task_id)
+
+    def clear(self):
+        """Remove every task."""
+        self._store.save_tasks([], path=self.path)
+
+    def archive(self):
+        """Move every completed task into the archive and return how many were moved."""
+        from todo.archive import archive_tasks
+
+        return archive_tasks(self._store, self._archive_dir(), self.path)
+
+    def _archive_dir(self):
+        from todo.archive import ARCHIVE_DIR
+
+        return os.path.join(self.directory, ARCHIVE_DIR) if self.directory else None
@@ -0,0 +1,98 @@
+"""Archive of completed tasks.
+
+Completed tasks can be moved out of the task list into ``todo.archive/``,
+so that loading and saving the list no longer pays for them. Each archive
+run writes one segment: a gzip-compressed file of task lines that is never
+changed afterwards. Searches and exports read the archive only when asked
+to, one segment at a time.
+
+The archive is plain task lines, so it is the same for every backend.
+"""
+import gzip
+import os
+
+from todo.task import Task
+
+ARCHIVE_DIR = 'todo.archive'
+SEGMENT_SUFFIX = '.txt.gz'
+
+# If set (TODO_ARCHIVE_AFTER), completed tasks are archived automatically
+# once there are more than this many in the list. 0, the default, leaves
+# them there until `todo archive`.
+AUTO_ARCHIVE_AFTER = int(os.environ.get('TODO_ARCHIVE_AFTER', '0'))
+
+
+def segments(directory=None):
+    """Return the paths of the archive's segments, oldest first."""
+    directory = directory or ARCHIVE_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+
+def _claim_segment(directory):
+    """Create an empty segment file with the next free number and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    number = len(segments(directory)) + 1
+    while True:
+        path = os.path.join(directory, f"{number:06d}{SEGMENT_SUFFIX}")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            # Another process archived at the same time.
+            number += 1
+
+
+def write_segment(tasks, path):
+    """Write tasks to a segment file in one go, replacing whatever is there."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(filename='', fileobj=raw, mode='wb') as file:
+            file.write("".join(f"{task}\n" for task in tasks).encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+def iter_archive(directory=None):
+    """Yield every archived task, reading one segment at a time."""
+    for path in segments(directory):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield Task.parse(line)
+
+
+def archive_tasks(store, directory=None, path=None):
+    """Move every completed task into a new segment and return how many were moved.
+
+    The segment is written before the tasks are removed from the list, so a
+    crash in between leaves them in both places rather than in neither.
+    ``path`` is the task file, as for the backend functions.
+    """
+    directory = directory or ARCHIVE_DIR
+    segment = _claim_segment(directory)
+
+    def change(index):
+        done = [task for task in index.values() if task.done]
+        if not done:
+            return None
+        # A retried change rewrites the same segment.
+        write_segment(done, segment)
+        return (), [task.id for task in done], len(done)
+
+    try:
+        count = store.update(change, path)
+    except BaseException:
+        os.remove(segment)
+        raise
+    if not count:
+        os.remove(segment)
+        return 0
+    # Fold the removals into the task file straight away so that it shrinks.
+    store.compact(path)
+    return count
@@ -0,0 +1,66 @@
+"""Storage backend selection.
+
+A backend is a module providing the task functions of todo.storage:
+``load_index``, ``load_tasks``, ``iter_tasks``, ``query_tasks``,
+``search_tasks``, ``due_tasks``, ``task_counts``, ``rebuild_counts``, ``save_tasks``,
+``append_task``, ``append_tasks``, ``commit``, ``update``,
+``replace_task``, ``remove_task``, ``version`` and ``compact``.
+
+* ``text``: ``todo.txt`` plus its journal (todo.storage).
+* ``sqlite``: ``todo.db``, a SQLite database with indexed fields and
+  full-text search (todo.database).
+
+``TODO_BACKEND`` picks one; otherwise SQLite is used if ``todo.db`` exists in
+the list's directory (the current directory by default). Backends are imported on first use, so the text
+backend never loads sqlite3.
+"""
+import importlib
+import os
+
+from todo.storage import TODO_FILE
+
+DB_FILE = 'todo.db'
+
+BACKENDS = {'text': 'todo.storage', 'sqlite': 'todo.database'}
+
+# The file each backend keeps its tasks in, and the files that go with it.
+FILES = {'text': TODO_FILE, 'sqlite': DB_FILE}
+SIDE_FILES = {'text': ['.journal'], 'sqlite': ['-wal', '-shm']}
+
+
+def backend_name(directory=None):
+    """Return the name of the backend to use for the list in ``directory`` when none is given."""
+    name = os.environ.get('TODO_BACKEND')
+    if name:
+        return name
+    return 'sqlite' if os.path.exists(os.path.join(directory or '', DB_FILE)) else 'text'
+
+
+def get_backend(name=None):
+    """Return the backend module with the given name, or the default one."""
+    name = name or backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return importlib.import_module(BACKENDS[name])
+
+
+def _set_aside(name):
+    """Rename a backend's files to ``*.bak`` so it is no longer picked up."""
+    path = FILES[name]
+    for suffix in ['', *SIDE_FILES[name]]:
+        if os.path.exists(path + suffix):
+            os.replace(path + suffix, f"{path}.bak{suffix}")
+
+
+def migrate(target):
+    """Move every task from the other backend into ``target`` and return how many were moved.
+
+    The old files are kept as ``*.bak``. Raises FileExistsError if ``target``
+    already has a task file.
+    """
+    source = 'text' if target == 'sqlite' else 'sqlite'
+    if os.path.exists(FILES[target]):
+        raise FileExistsError(FILES[target])
+    count = get_backend(target).append_tasks(get_backend(source).iter_tasks())
+    _set_aside(source)
+    return count
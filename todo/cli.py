@@ -1,16 +1,18 @@
+from todo import trace
+import datetime
+import itertools
+import json
 import os
-import re
+import shutil
+import sys
+from collections import Counter
 from colorama import init, Fore, Style
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 import click
-
-# Initialize colorama
-init(autoreset=True)
-
-TODO_FILE = 'todo.txt'
+from todo.api import TodoStore, resolve_task, select_tasks
+from todo.formats import FORMATS, guess_format, read_tasks, write_tasks
+from todo.backends import BACKENDS, backend_name, migrate as migrate_backend
+from todo.storage import ConflictError, next_task_id
+from todo.task import Priority, parse_date, parse_every, task_filter
 
 PRIORITY_MAP = {
     "high": "🔥",
@@ -20,215 +22,671 @@ PRIORITY_MAP = {
 
 DEFAULT_PRIORITY = "medium"
 
-def load_tasks():
-    """Load tasks from the file."""
-    if not os.path.exists(TODO_FILE):
-        return []
-    with open(TODO_FILE, 'r') as file:
-        tasks = [line.strip() for line in file]
-    return tasks
-
-def save_tasks(tasks):
-    """Save tasks to the file."""
-    with open(TODO_FILE, 'w') as file:
-        for task in tasks:
-            file.write(f"{task}\n")
-
-def sort_tasks(tasks):
-    """Sort tasks by priority."""
-    priority_order = {'🔥': 1, '🔶': 2, '🔷': 3}
-    tasks.sort(
-        key=lambda x: priority_order.get(
-            re.search(r'🔷|🔶|🔥', x).group(0), 4
-        ) if re.search(r'🔷|🔶|🔥', x) else 4
-    )
-    return tasks
+def _selected_tasks(todos, index, task_numbers, where, messages):
+    """Select tasks for a batch command, leaving any problem in ``messages`` for run_update to show."""
+    # Called again on every retry, so only the last attempt's messages count.
+    messages[:] = []
+    if not task_numbers and not where:
+        messages.append(Fore.RED + Style.BRIGHT + "No tasks given. Pass task numbers or --where.")
+        return None
+    try:
+        task_ids = select_tasks(todos, index, task_numbers, where)
+    except ValueError as error:
+        messages.append(Fore.RED + Style.BRIGHT + f"Invalid task number: {error}.")
+        return None
+    if not task_ids:
+        messages.append(Fore.YELLOW + Style.BRIGHT + "No tasks matched.")
+        return None
+    return [index[task_id] for task_id in task_ids]
+
+def run_update(todos, change, messages=()):
+    """Apply a read-modify-write change, then show the messages it left.
+
+    The change may run several times if other writers get in the way, so it
+    must not print itself. Tells the user if they kept getting in the way.
+    """
+    try:
+        return todos.update(change)
+    except ConflictError as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"Could not save changes: {error}.")
+        return None
+    finally:
+        for message in messages:
+            click.echo(message)
+
+def user_path(filename):
+    """Return a file name from the command line as seen from where `todo` was started.
+
+    `todo --list NAME` runs in the list's directory instead.
+    """
+    if filename == '-':
+        return filename
+    return os.path.join(click.get_current_context().meta.get('todo.cwd', ''), filename)
+
+def open_text(filename, mode):
+    """Open a text file for import/export, with "-" meaning stdin/stdout."""
+    if filename == '-':
+        return click.open_file(filename, mode, encoding='utf-8')
+    # newline='' leaves line endings to the csv module.
+    return open(user_path(filename), mode, encoding='utf-8', newline='')
 
 @click.group()
-def cli():
+@click.option('--backend', type=click.Choice(list(BACKENDS)), envvar='TODO_BACKEND',
+              help='Where tasks are stored (default: sqlite if todo.db exists, else text).')
+@click.option('--list', 'list_name', metavar='NAME',
+              help='Use the named list instead of the one in the current directory (created if new).')
+@click.option('--profile', is_flag=True, envvar='TODO_TRACE',
+              help='Print how long each phase of the command took and how much it read and wrote.')
+@click.option('--profile-output', type=click.Path(dir_okay=False), envvar='TODO_PROFILE_OUTPUT',
+              help='Save cProfile data for the command to this file.')
+@click.option('--metrics-log', type=click.Path(dir_okay=False), envvar='TODO_METRICS_LOG',
+              help='Append the timings and counts to this file as a JSON line.')
+@click.pass_context
+def cli(ctx, backend, list_name, profile, profile_output, metrics_log):
     """A simple CLI to-do list application."""
-    pass
+    # Initialize colorama
+    init(autoreset=True)
+    ctx.meta['todo.cwd'] = os.getcwd()
+    if profile or profile_output or metrics_log:
+        profile_output = profile_output and os.path.abspath(profile_output)
+        metrics_log = metrics_log and os.path.abspath(metrics_log)
+        trace.start(profile_output)
+        ctx.call_on_close(lambda: trace.finish(ctx.invoked_subcommand, profile, profile_output, metrics_log))
+    if list_name:
+        from todo.lists import list_directory, register
+
+        # Every file of a list is in its directory, so work from there.
+        try:
+            os.chdir(list_directory(list_name) or register(list_name))
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint='--list')
+    # `todo daemon` passes in its in-memory store.
+    ctx.obj = TodoStore(backend=backend) if ctx.obj is None else TodoStore.wrap(ctx.obj)
+
+def parse_date_option(ctx, param, value):
+    """Click callback turning a date option into a date; 'none' gives False (remove the date)."""
+    if value is None or value.lower() == 'none':
+        return None if value is None else False
+    try:
+        return parse_date(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+def parse_every_option(ctx, param, value):
+    """Click callback normalizing a recurrence option; 'none' gives False (stop recurring)."""
+    if value is None or value.lower() == 'none':
+        return None if value is None else False
+    try:
+        return parse_every(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+DUE_HELP = 'The date the task is due: YYYY-MM-DD, today or tomorrow.'
+EVERY_HELP = 'Repeat the task, e.g. daily, weekly, monthly, 2w or "3 days".'
 
 @cli.command()
 @click.option('--task', prompt='Enter the task description', help='The description of the task.')
 @click.option('--category', default='', help='The category of the task.')
 @click.option('--priority', default=DEFAULT_PRIORITY, help='The priority of the task (high, medium, low).')
-def add(task, category, priority):
+@click.option('--due', 'due_date', callback=parse_date_option, metavar='DATE', help=DUE_HELP)
+@click.option('--every', callback=parse_every_option, help=EVERY_HELP + ' Due today unless --due is given.')
+@click.pass_obj
+def add(todos, task, category, priority, due_date, every):
     """Add a new task to your to-do list."""
     if priority not in PRIORITY_MAP:
         click.echo(Fore.RED + Style.BRIGHT + "Invalid priority. Task not added.")
         return
-    category_str = f" [Category: {category}]" if category else ""
-    tasks = load_tasks()
-    tasks.append(f"[ ] {PRIORITY_MAP[priority]} {task}{category_str}")
-    save_tasks(tasks)
+    if every and not due_date:
+        due_date = datetime.date.today()
+    todos.add(task, priority, category, due=due_date or None, every=every or None)
     click.echo(Fore.GREEN + Style.BRIGHT + f"Added task: '{task}'")
 
+# Lines written to the terminal at a time when streaming a long list.
+ECHO_CHUNK = 1000
+
+def echo_lines(lines):
+    """Print lines as they are produced, through a pager if they don't fit on the terminal."""
+    if sys.stdout.isatty():
+        height = shutil.get_terminal_size().lines
+        first = list(itertools.islice(lines, height))
+        lines = itertools.chain(first, lines)
+        if len(first) == height:
+            click.echo_via_pager(line + "\n" for line in lines)
+            return
+    while True:
+        chunk = list(itertools.islice(lines, ECHO_CHUNK))
+        if not chunk:
+            return
+        click.echo("\n".join(chunk))
+
 @cli.command()
-def view():
-    """View all tasks."""
-    tasks = load_tasks()
-    if not tasks:
+@click.option('--limit', type=click.IntRange(min=1), help='Show at most this many tasks.')
+@click.option('--offset', type=click.IntRange(min=0), default=0, help='Skip this many of the matching tasks first.')
+@click.option('--status', type=click.Choice(['open', 'done']), help='Only show open or completed tasks.')
+@click.option('--category', default=None, help='Only show tasks in this category.')
+@click.option('--priority', type=click.Choice(list(PRIORITY_MAP)), help='Only show tasks with this priority.')
+@click.option('--all-lists', is_flag=True, help='Show the tasks of every named list, highest priority first.')
+@click.pass_obj
+def view(todos, limit, offset, status, category, priority, all_lists):
+    """View all tasks.
+
+    Tasks keep the numbers they have in the full list, so they can be
+    passed to other commands even when only some tasks are shown.
+    """
+    if all_lists:
+        view_all_lists(limit, offset, status, category, priority)
+        return
+
+    page = todos.numbered(status, category, priority, limit, offset)
+    if not page:
         click.echo(Fore.RED + Style.BRIGHT + "No tasks found.")
         return
 
-    tasks = sort_tasks(tasks)
-    output = [Fore.MAGENTA + Style.BRIGHT + "\nYour To-Do List:"]
+    lines = (f"{number}. {task}" for number, task in page)
+    with trace.phase('render'):
+        echo_lines(itertools.chain([Fore.MAGENTA + Style.BRIGHT + "\nYour To-Do List:"], lines, [""]))
 
-    task_map = {}
-    for i, task in enumerate(tasks, 1):
-        output.append(f"{i}. {task}")
-        task_map[i] = task
+def view_all_lists(limit, offset, status, category, priority):
+    """Print the matching tasks of every named list, with each task's list and number in it."""
+    from todo.lists import load_registry, view_all
 
-    output.append("")
-    click.echo("\n".join(output))
-    return task_map
+    registry = load_registry()
+    if not registry:
+        click.echo(Fore.RED + Style.BRIGHT + "No named lists found. Create one with `todo lists add NAME`.")
+        return
+    with trace.phase('load'):
+        entries = list(view_all(status, category, priority, registry))
+    end = offset + limit if limit else None
+    page = entries[offset:end]
+    if not page:
+        click.echo(Fore.RED + Style.BRIGHT + "No tasks found.")
+        return
+
+    lines = (f"[{name}] {number}. {task}" for name, number, task in page)
+    with trace.phase('render'):
+        echo_lines(itertools.chain([Fore.MAGENTA + Style.BRIGHT + "\nTasks in all lists:"], lines, [""]))
+
+WHERE_HELP = "Also select tasks matching a search query, e.g. 'status:done' or 'category:ops'."
 
 @cli.command()
-@click.argument('task_number', type=int)
-def complete(task_number):
-    """Mark a task as complete."""
-    tasks = load_tasks()
-    task_map = view()
-
-    if task_number in task_map:
-        task = task_map[task_number]
-        index = tasks.index(task)
-        if tasks[index].startswith("[ ]"):
-            tasks[index] = tasks[index].replace("[ ]", "[x]", 1)
-            save_tasks(tasks)
-            click.echo(Fore.GREEN + Style.BRIGHT + f"Task {task_number} marked as complete.")
+@click.argument('task_numbers', nargs=-1)
+@click.option('--where', help=WHERE_HELP)
+@click.pass_obj
+def complete(todos, task_numbers, where):
+    """Mark tasks as complete (by number, range like 3-7, id:N or --where)."""
+    messages = []
+
+    def change(index):
+        tasks = _selected_tasks(todos, index, task_numbers, where, messages)
+        if tasks is None:
+            return None
+        changed = [task for task in tasks if not task.done]
+        # Recurring tasks come back as a new task, due on their next date.
+        following = []
+        for task in changed:
+            task.done = True
+            upcoming = task.next_occurrence()
+            if upcoming is not None:
+                upcoming.id = next_task_id(index) + len(following)
+                following.append(upcoming)
+        return changed + following, (), (tasks, changed, following, sum(task.done for task in index.values()))
+
+    result = run_update(todos, change, messages)
+    if result is None:
+        return
+
+    tasks, changed, following, done = result
+    if len(tasks) == 1:
+        label = task_numbers[0] if task_numbers else f"id:{tasks[0].id}"
+        if changed:
+            click.echo(Fore.GREEN + Style.BRIGHT + f"Task {label} marked as complete.")
         else:
-            click.echo(Fore.YELLOW + Style.BRIGHT + f"Task {task_number} is already completed.")
+            click.echo(Fore.YELLOW + Style.BRIGHT + f"Task {label} is already completed.")
     else:
-        click.echo(Fore.RED + Style.BRIGHT + "Invalid task number.")
+        click.echo(Fore.GREEN + Style.BRIGHT + f"{len(changed)} tasks marked as complete "
+                   f"({len(tasks) - len(changed)} already completed).")
+    for task in following:
+        click.echo(Fore.CYAN + Style.BRIGHT + f"Next '{task.description}' is due {task.due.isoformat()} [ID: {task.id}].")
+
+    from todo import archive
+
+    if changed and 0 < archive.AUTO_ARCHIVE_AFTER < done:
+        try:
+            count = todos.archive()
+        except ConflictError as error:
+            # The tasks are completed either way; `todo archive` can be run again later.
+            click.echo(Fore.YELLOW + Style.BRIGHT + f"Could not archive completed tasks: {error}.")
+            return
+        click.echo(Fore.CYAN + Style.BRIGHT + f"Moved {count} completed tasks to the archive ({archive.ARCHIVE_DIR}).")
 
 @cli.command()
-@click.argument('task_number', type=int)
-def delete(task_number):
-    """Delete a task."""
-    tasks = load_tasks()
-    task_map = view()
-
-    if task_number in task_map:
-        task = task_map[task_number]
-        tasks.remove(task)
-        save_tasks(tasks)
-        click.echo(Fore.GREEN + Style.BRIGHT + f"Deleted task: '{task}'")
+@click.argument('task_numbers', nargs=-1)
+@click.option('--where', help=WHERE_HELP)
+@click.pass_obj
+def delete(todos, task_numbers, where):
+    """Delete tasks (by number, range like 3-7, id:N or --where)."""
+    messages = []
+
+    def change(index):
+        tasks = _selected_tasks(todos, index, task_numbers, where, messages)
+        if tasks is None:
+            return None
+        return (), [task.id for task in tasks], tasks
+
+    tasks = run_update(todos, change, messages)
+    if tasks is None:
+        return
+
+    if len(tasks) == 1:
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Deleted task: '{tasks[0]}'")
     else:
-        click.echo(Fore.RED + Style.BRIGHT + "Invalid task number.")
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Deleted {len(tasks)} tasks.")
 
 @cli.command()
-def clear():
+@click.pass_obj
+def clear(todos):
     """Clear all tasks."""
     confirm = click.confirm("Are you sure you want to clear all tasks?", abort=True)
     if confirm:
-        save_tasks([])
+        todos.clear()
         click.echo(Fore.GREEN + Style.BRIGHT + "All tasks have been cleared.")
 
 @cli.command()
-@click.argument('task_number', type=int)
+@click.argument('task_number')
 @click.option('--new_task', prompt='Enter the new task description', help='The new description of the task.')
-def edit(task_number, new_task):
-    """Edit a task."""
-    tasks = load_tasks()
-    task_map = view()
-
-    if task_number in task_map:
-        task = task_map[task_number]
-        index = tasks.index(task)
-        parts = re.split(r'(\[.\]) (.)', tasks[index], 1)
-        tasks[index] = f"{parts[1]} {parts[2]} {new_task}"
-        save_tasks(tasks)
+@click.pass_obj
+def edit(todos, task_number, new_task):
+    """Edit a task (by number or id:N)."""
+    messages = []
+
+    def change(index):
+        messages[:] = []
+        task_id = resolve_task(index, task_number)
+        if task_id is None:
+            messages.append(Fore.RED + Style.BRIGHT + "Invalid task number.")
+            return None
+        task = index[task_id]
+        task.description = new_task
+        return [task], (), task
+
+    if run_update(todos, change, messages) is not None:
         click.echo(Fore.GREEN + Style.BRIGHT + f"Task {task_number} has been updated to: '{new_task}'")
-    else:
-        click.echo(Fore.RED + Style.BRIGHT + "Invalid task number.")
 
 @cli.command()
 @click.option('--keyword', prompt='Enter the keyword to search for', help='The keyword to search for.')
-def search(keyword):
+@click.option('--archive', 'include_archive', is_flag=True, help='Also search archived tasks.')
+@click.option('--all-lists', is_flag=True, help='Search every named list.')
+@click.pass_obj
+def search(todos, keyword, include_archive, all_lists):
     """Search for tasks containing a specific keyword."""
-    tasks = load_tasks()
-    found_tasks = [task for task in tasks if keyword.lower() in task.lower()]
+    from todo.search import highlight
+
+    if all_lists:
+        if include_archive:
+            raise click.UsageError("--archive cannot be combined with --all-lists.")
+        from todo.lists import search_all
+
+        found = search_all(keyword)
+        if not found:
+            click.echo(Fore.RED + Style.BRIGHT + f"No tasks found containing '{keyword}' in any list.")
+            return
+        with trace.phase('render'):
+            output = [Fore.GREEN + Style.BRIGHT + f"\nTasks containing '{keyword}' in all lists:"]
+            for i, (name, task) in enumerate(found, 1):
+                output.append(f"{i}. [{name}] {highlight(str(task), keyword, Fore.YELLOW, Fore.GREEN)}")
+            click.echo("\n".join(output))
+        return
+
+    found_tasks = todos.search(keyword)
     if found_tasks:
-        output = [Fore.GREEN + Style.BRIGHT + f"\nTasks containing '{keyword}':"]
-        for i, task in enumerate(found_tasks, 1):
-            highlighted_task = re.sub(f"({keyword})", Fore.YELLOW + r"\1" + Fore.GREEN, task, flags=re.IGNORECASE)
-            output.append(f"{i}. {highlighted_task}")
-        click.echo("\n".join(output))
-    else:
+        with trace.phase('render'):
+            output = [Fore.GREEN + Style.BRIGHT + f"\nTasks containing '{keyword}':"]
+            for i, task in enumerate(found_tasks, 1):
+                highlighted_task = highlight(str(task), keyword, Fore.YELLOW, Fore.GREEN)
+                output.append(f"{i}. {highlighted_task}")
+            click.echo("\n".join(output))
+    elif not include_archive:
         click.echo(Fore.RED + Style.BRIGHT + f"No tasks found containing '{keyword}'.")
+    if include_archive:
+        # Printed as they are found, as the archive is read one segment at a time.
+        found = False
+        with trace.phase('search'):
+            for task in todos.archived(keyword):
+                if not found:
+                    click.echo(Fore.GREEN + Style.BRIGHT + f"\nArchived tasks containing '{keyword}':")
+                    found = True
+                click.echo(f"- {highlight(str(task), keyword, Fore.YELLOW, Fore.GREEN)}")
+        if not found:
+            click.echo(Fore.RED + Style.BRIGHT + f"No archived tasks found containing '{keyword}'.")
 
 @cli.command()
-@click.argument('task_number', type=int)
+@click.argument('task_numbers', nargs=-1)
+@click.option('--where', help=WHERE_HELP)
 @click.option('--priority', prompt='Enter the priority (high, medium, low)', help='The priority level.')
-def prioritize(task_number, priority):
-    """Set the priority of an existing task."""
+@click.pass_obj
+def prioritize(todos, task_numbers, where, priority):
+    """Set the priority of tasks (by number, range like 3-7, id:N or --where)."""
     if priority not in PRIORITY_MAP:
         click.echo(Fore.RED + Style.BRIGHT + "Invalid priority.")
         return
-    tasks = load_tasks()
-    task_map = view()
 
-    if task_number in task_map:
-        task = task_map[task_number]
-        index = tasks.index(task)
-        parts = re.split(r'(\[.\]) (.)', tasks[index], 1)
-        tasks[index] = f"{parts[1]} {PRIORITY_MAP[priority]} {parts[3].strip()}"
-        save_tasks(tasks)
-        click.echo(Fore.GREEN + Style.BRIGHT + f"Task {task_number} has been prioritized as {priority}.")
+    messages = []
+
+    def change(index):
+        tasks = _selected_tasks(todos, index, task_numbers, where, messages)
+        if tasks is None:
+            return None
+        for task in tasks:
+            task.priority = Priority[priority.upper()]
+        return tasks, (), tasks
+
+    tasks = run_update(todos, change, messages)
+    if tasks is None:
+        return
+
+    if len(tasks) == 1:
+        label = task_numbers[0] if task_numbers else f"id:{tasks[0].id}"
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Task {label} has been prioritized as {priority}.")
+    else:
+        click.echo(Fore.GREEN + Style.BRIGHT + f"{len(tasks)} tasks have been prioritized as {priority}.")
+
+@cli.command()
+@click.argument('task_numbers', nargs=-1)
+@click.option('--where', help=WHERE_HELP)
+@click.option('--due', 'due_date', callback=parse_date_option, metavar='DATE',
+              help=DUE_HELP + ' "none" removes the due date.')
+@click.option('--every', callback=parse_every_option, help=EVERY_HELP + ' "none" stops repeating.')
+@click.pass_obj
+def schedule(todos, task_numbers, where, due_date, every):
+    """Set the due date or recurrence of tasks (by number, range like 3-7, id:N or --where)."""
+    if due_date is None and every is None:
+        click.echo(Fore.RED + Style.BRIGHT + "Nothing to change. Pass --due or --every.")
+        return
+
+    messages = []
+
+    def change(index):
+        tasks = _selected_tasks(todos, index, task_numbers, where, messages)
+        if tasks is None:
+            return None
+        for task in tasks:
+            if due_date is not None:
+                task.due = due_date or None
+            if every is not None:
+                task.every = every or None
+            if task.every and not task.due:
+                task.due = datetime.date.today()
+        return tasks, (), tasks
+
+    tasks = run_update(todos, change, messages)
+    if tasks is None:
+        return
+
+    if len(tasks) == 1:
+        label = task_numbers[0] if task_numbers else f"id:{tasks[0].id}"
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Task {label} has been scheduled: '{tasks[0]}'")
     else:
-        click.echo(Fore.RED + Style.BRIGHT + "Invalid task number.")
+        click.echo(Fore.GREEN + Style.BRIGHT + f"{len(tasks)} tasks have been scheduled.")
 
 @cli.command()
-@click.option('--filename', prompt='Enter the filename for the PDF (e.g., tasks.pdf, include the .pdf)', help='The filename for the PDF.')
-def export(filename):
-    """Export tasks to a PDF file."""
-    tasks = load_tasks()
+@click.option('--before', callback=parse_date_option, metavar='DATE',
+              help='Only tasks due on or before this date (YYYY-MM-DD, today or tomorrow).')
+@click.option('--overdue', is_flag=True, help='Only tasks whose due date has passed.')
+@click.option('--limit', type=click.IntRange(min=1), help='Show at most this many tasks.')
+@click.pass_obj
+def due(todos, before, overdue, limit):
+    """Show open tasks that have a due date, soonest first."""
+    today = datetime.date.today()
+    cutoffs = [today] if overdue else []
+    if before:
+        cutoffs.append(before + datetime.timedelta(days=1))
+    # Read from a date-ordered index, so with --limit only the tasks shown are loaded.
+    tasks = todos.due(min(cutoffs, default=None), limit)
     if not tasks:
+        click.echo(Fore.YELLOW + Style.BRIGHT + ("No overdue tasks." if overdue else "No tasks due."))
+        return
+
+    lines = (Fore.RED + f"{task} (overdue)" if task.due < today else str(task) for task in tasks)
+    with trace.phase('render'):
+        echo_lines(itertools.chain([Fore.MAGENTA + Style.BRIGHT + "\nTasks due:"], lines, [""]))
+
+def count_tasks(tasks):
+    """Count tasks by status, priority and lowercased category, like a backend's ``task_counts``."""
+    counts = Counter((task.done, task.priority, (task.category or '').lower() or None) for task in tasks)
+    return [(done, priority, category, count) for (done, priority, category), count in counts.items()]
+
+def summarize_counts(rows):
+    """Total (done, priority, category, count) rows overall, per priority and per category."""
+    def totals():
+        return {'open': 0, 'done': 0}
+
+    summary = {'total': totals(), 'priority': {}, 'category': {}}
+    for done, priority, category, count in rows:
+        status = 'done' if done else 'open'
+        summary['total'][status] += count
+        summary['priority'].setdefault(priority.name.lower() if priority else 'none', totals())[status] += count
+        summary['category'].setdefault(category or '', totals())[status] += count
+    for group in [summary['total'], *summary['priority'].values(), *summary['category'].values()]:
+        group['completion'] = round(group['done'] / ((group['open'] + group['done']) or 1), 4)
+    # Priorities from high to none, categories alphabetically.
+    summary['priority'] = {name: summary['priority'][name] for name in [*PRIORITY_MAP, 'none'] if name in summary['priority']}
+    summary['category'] = dict(sorted(summary['category'].items()))
+    return summary
+
+def _stats_line(label, totals):
+    return (f"  {label:<16} {totals['open']:>7} open {totals['done']:>7} done "
+            f"{totals['completion']:>6.0%} complete")
+
+@cli.command()
+@click.option('--verify', is_flag=True, help='Recount every task and fix the stored counts if they are wrong.')
+@click.option('--rebuild', is_flag=True, help='Throw away the stored counts and recount every task.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the statistics as JSON.')
+@click.pass_obj
+def stats(todos, verify, rebuild, as_json):
+    """Show how many tasks are open and done, by priority and category."""
+    if rebuild:
+        todos.rebuild_counts()
+    rows = todos.counts()
+    if verify:
+        expected = count_tasks(todos)
+        key = lambda row: (row[0], int(row[1] or 0), row[2] or '')
+        if sorted(rows, key=key) == sorted(expected, key=key):
+            click.echo(Fore.GREEN + Style.BRIGHT + "The stored counts match the task list.", err=as_json)
+        else:
+            todos.rebuild_counts()
+            rows = todos.counts()
+            click.echo(Fore.YELLOW + Style.BRIGHT + "The stored counts were wrong and have been rebuilt.", err=as_json)
+
+    summary = summarize_counts(rows)
+    if as_json:
+        click.echo(json.dumps(summary, indent=2))
+        return
+    total = summary['total']
+    if not total['open'] + total['done']:
+        click.echo(Fore.RED + Style.BRIGHT + "No tasks found.")
+        return
+    output = [Fore.MAGENTA + Style.BRIGHT + f"\nTasks: {total['open'] + total['done']} "
+              f"({total['open']} open, {total['done']} done, {total['completion']:.0%} complete)",
+              "", Fore.MAGENTA + Style.BRIGHT + "By priority:"]
+    output += [_stats_line(f"{PRIORITY_MAP.get(name, '  ')} {name}", totals) for name, totals in summary['priority'].items()]
+    output += ["", Fore.MAGENTA + Style.BRIGHT + "By category:"]
+    output += [_stats_line(name or "(none)", totals) for name, totals in summary['category'].items()]
+    output.append("")
+    click.echo("\n".join(output))
+
+@cli.command()
+@click.option('--filename', prompt='Enter the filename to export to (e.g., tasks.pdf, tasks.csv)', help='The file to export to ("-" writes text formats to stdout).')
+@click.option('--format', 'fmt', type=click.Choice(['pdf', *FORMATS]), help='The export format (default: from the file extension, else pdf).')
+@click.option('--status', type=click.Choice(['open', 'done']), help='Only export open or completed tasks.')
+@click.option('--category', default=None, help='Only export tasks in this category.')
+@click.option('--priority', type=click.Choice(list(PRIORITY_MAP)), help='Only export tasks with this priority.')
+@click.option('--group-by-category', is_flag=True, help='Group tasks under a heading per category (PDF only).')
+@click.option('--archive', 'include_archive', is_flag=True, help='Also export archived tasks, after the others.')
+@click.option('--all-lists', is_flag=True, help='Export the tasks of every named list, highest priority first.')
+@click.pass_obj
+def export(todos, filename, fmt, status, category, priority, group_by_category, include_archive, all_lists):
+    """Export tasks to a PDF, CSV, JSON Lines or todo.txt file."""
+    fmt = fmt or guess_format(filename) or 'pdf'
+    if all_lists:
+        if include_archive:
+            raise click.UsageError("--archive cannot be combined with --all-lists.")
+        from todo.lists import query_all
+
+        with trace.phase('load'):
+            listed = query_all(status, category, priority)
+        # Text formats keep each task's list; the PDF lists the tasks on their own.
+        tasks = iter(listed if fmt != 'pdf' else [task for _, task in listed])
+    else:
+        tasks = todos.tasks(status, category, priority)
+    if include_archive:
+        tasks = itertools.chain(tasks, filter(task_filter(status, category, priority), todos.archived()))
+    first = next(tasks, None)
+    if first is None:
         click.echo(Fore.RED + Style.BRIGHT + "No tasks to export.")
         return
+    tasks = itertools.chain([first], tasks)
 
-    doc = SimpleDocTemplate(filename, pagesize=letter)
-    elements = []
-
-    # Title
-    styles = getSampleStyleSheet()
-    title_style = styles["Title"]
-    title = Paragraph("To-Do List", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-
-    # Create table data
-    data = [["#", "Status", "Priority", "Task Description", "Category"]]
-    for i, task in enumerate(tasks, 1):
-        parts = re.split(r'(\[.\]) (.)', task, 1)
-        if len(parts) < 4:
-            continue
-        status = parts[1]
-        priority = parts[2]
-        description = parts[3].strip()
-        category_match = re.search(r'\[Category: (.*?)\]', description)
-        category = category_match.group(1) if category_match else "N/A"
-        description = re.sub(r'\[Category: (.*?)\]', '', description).strip()
-        data.append([i, status, priority, description, category])
-
-    # Create table
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
+    # Reading the tasks is timed as 'load' even though it streams into the export.
+    with trace.phase('export'):
+        if fmt == 'pdf':
+            # reportlab is slow to import, so only load it when exporting.
+            from todo.export import export_pdf
+
+            export_pdf(user_path(filename), tasks, group_by_category)
+        else:
+            with open_text(filename, 'w') as file:
+                write_tasks(file, tasks, fmt, lists=all_lists)
+    if filename == '-':
+        return
     click.echo(Fore.GREEN + Style.BRIGHT + f"Tasks have been exported to {filename}.")
 
+@cli.command('archive')
+@click.pass_obj
+def archive_done(todos):
+    """Move completed tasks out of the list into the archive."""
+    from todo.archive import ARCHIVE_DIR
+
+    try:
+        count = todos.archive()
+    except ConflictError as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"Could not archive tasks: {error}.")
+        return
+    if count:
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Moved {count} completed tasks to the archive ({ARCHIVE_DIR}).")
+    else:
+        click.echo(Fore.YELLOW + Style.BRIGHT + "No completed tasks to archive.")
+
+@cli.group('lists', invoke_without_command=True)
+@click.pass_context
+def lists_command(ctx):
+    """Show the named lists, or add and remove them."""
+    if ctx.invoked_subcommand:
+        return
+    from todo.lists import load_registry
+
+    registry = load_registry()
+    if not registry:
+        click.echo(Fore.YELLOW + Style.BRIGHT + "No named lists yet. Create one with `todo lists add NAME`.")
+        return
+    click.echo(Fore.MAGENTA + Style.BRIGHT + "\nYour lists:")
+    click.echo("\n".join(f"{name}: {directory}" for name, directory in registry.items()))
+
+@lists_command.command('add')
+@click.argument('name')
+@click.option('--path', 'directory', type=click.Path(file_okay=False),
+              help='Keep the list in this directory, e.g. a project that already has a todo.txt.')
+def add_list(name, directory):
+    """Register a named list."""
+    from todo.lists import register
+
+    try:
+        directory = register(name, directory and user_path(directory))
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='NAME')
+    click.echo(Fore.GREEN + Style.BRIGHT + f"Added list '{name}' in {directory}.")
+
+@lists_command.command('remove')
+@click.argument('name')
+def remove_list(name):
+    """Forget a named list. Its tasks are not deleted."""
+    from todo.lists import unregister
+
+    if unregister(name):
+        click.echo(Fore.GREEN + Style.BRIGHT + f"Removed list '{name}'. Its files were kept.")
+    else:
+        click.echo(Fore.RED + Style.BRIGHT + f"No list named '{name}'.")
+
+@cli.command('import')
+@click.argument('filename', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='The file format (default: from the file extension).')
+@click.pass_obj
+def import_tasks(todos, filename, fmt):
+    """Import tasks from a CSV, JSON Lines or todo.txt file."""
+    fmt = fmt or guess_format(filename)
+    if fmt not in FORMATS:
+        click.echo(Fore.RED + Style.BRIGHT + "Unknown file format. Use --format to choose one.")
+        return
+    try:
+        with open_text(filename, 'r') as file:
+            count = todos.add_many(read_tasks(file, fmt))
+    except (ValueError, KeyError) as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"Could not import {filename}: {error}")
+        return
+    click.echo(Fore.GREEN + Style.BRIGHT + f"Imported {count} tasks from {filename}.")
+
+@cli.command()
+@click.option('--to', 'target', type=click.Choice(list(BACKENDS)), default='sqlite', help='The backend to move your tasks to.')
+def migrate(target):
+    """Move your tasks to another storage backend (text or sqlite)."""
+    try:
+        count = migrate_backend(target)
+    except FileExistsError as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"{error} already exists. Move it away before migrating.")
+        return
+    click.echo(Fore.GREEN + Style.BRIGHT + f"Moved {count} tasks to the {target} backend. "
+               "The old files were kept with a .bak extension.")
+
+@cli.command()
+@click.option('--stop', is_flag=True, help='Stop the daemon running in this directory.')
+@click.pass_context
+def daemon(ctx, stop):
+    """Keep the task list in memory and answer commands from it."""
+    import signal
+    from todo.daemon import SOCKET_FILE, serve, stop as stop_daemon
+
+    if stop:
+        if stop_daemon():
+            click.echo(Fore.GREEN + Style.BRIGHT + "The daemon has been stopped.")
+        else:
+            click.echo(Fore.YELLOW + Style.BRIGHT + "No daemon is running here.")
+        return
+    # Let `kill` stop the daemon cleanly, writing out any pending changes.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    click.echo(Fore.GREEN + Style.BRIGHT + f"Serving tasks on {SOCKET_FILE}. Press Ctrl+C to stop.")
+    try:
+        serve(ctx.find_root().params['backend'] or backend_name())
+    except (RuntimeError, OSError) as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"Could not start the daemon: {error}")
+    except KeyboardInterrupt:
+        pass
+
+@cli.command('serve')
+@click.option('--host', default='127.0.0.1', help='The address to listen on.')
+@click.option('--port', default=8765, help='The port to listen on.')
+@click.pass_context
+def serve_api(ctx, host, port):
+    """Serve the task list as a JSON API over HTTP."""
+    import signal
+    from todo.server import run
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    click.echo(Fore.GREEN + Style.BRIGHT + f"Serving the task API on http://{host}:{port}/. Press Ctrl+C to stop.")
+    try:
+        run(ctx.find_root().params['backend'] or backend_name(), host, port)
+    except OSError as error:
+        click.echo(Fore.RED + Style.BRIGHT + f"Could not start the server: {error}")
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
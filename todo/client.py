@@ -0,0 +1,64 @@
+"""Entry point of the `todo` command.
+
+If a ``todo daemon`` is running in the current directory, the command is
+sent to it over its Unix socket and its output printed here. Otherwise, or
+if the daemon cannot run the command (e.g. because it has to prompt), the
+CLI runs in this process as usual. Only the standard library is imported
+before that decision, so a command answered by the daemon costs a socket
+round trip rather than loading click and parsing the task file.
+
+With ``--list NAME`` the daemon running in that list's directory is used.
+"""
+import json
+import os
+import socket
+import sys
+
+from todo.lists import list_directory, list_option
+
+SOCKET_FILE = 'todo.sock'
+
+
+def send(request, path=SOCKET_FILE):
+    """Send a request to the daemon and return its reply, or None if no daemon answered."""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode('utf-8'))
+            sock.shutdown(socket.SHUT_WR)
+            data = b"".join(iter(lambda: sock.recv(65536), b""))
+        except OSError:
+            # A daemon that exited without removing its socket.
+            return None
+    return json.loads(data) if data else None
+
+
+def main():
+    args = sys.argv[1:]
+    path = SOCKET_FILE
+    name, list_args = list_option(args)
+    if name is not None:
+        directory = list_directory(name)
+        # File names given to export and import are relative to this
+        # directory, not to the daemon's.
+        if directory is None or 'export' in args or 'import' in args:
+            path = None
+        else:
+            path = os.path.join(directory, SOCKET_FILE)
+            args = list_args
+    if path and os.environ.get('TODO_DAEMON') != '0' and 'daemon' not in args:
+        reply = send({
+            'args': args,
+            'backend': os.environ.get('TODO_BACKEND'),
+            'color': sys.stdout.isatty(),
+        }, path)
+        if reply and reply['status'] == 'ok':
+            sys.stdout.write(reply['stdout'])
+            sys.stderr.write(reply['stderr'])
+            sys.exit(reply['code'])
+
+    from todo.cli import cli
+
+    cli()
@@ -0,0 +1,327 @@
+"""Resident daemon serving `todo` commands over a Unix socket.
+
+``todo daemon`` loads the task list once and keeps it, together with its
+display order, in memory. It then runs the regular CLI commands sent by
+``todo.client``, answering reads from memory. Changes are written to the
+storage backend straight away, and only if the tasks they touch were not
+changed by another program meanwhile. The list is reloaded if another
+program changes the task files.
+
+Commands that need to read from stdin (prompts, ``import -``) are sent back
+to the client to run itself.
+"""
+import io
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from operator import attrgetter
+
+import click
+
+from todo import backends, trace
+from todo.client import SOCKET_FILE, send
+from todo.storage import UPDATE_ATTEMPTS, ConflictError, next_task_id
+from todo.task import task_filter
+
+# Commands that change which backend is in use or start a server of their own,
+# and --all-lists, which starts a process pool to read other lists, so always
+# run in the client.
+LOCAL_COMMANDS = ('daemon', 'migrate', 'serve', '--all-lists')
+
+# Seconds a client has to send its whole request, so that one that never
+# finishes cannot hold up the others.
+REQUEST_TIMEOUT = 5
+
+
+class _StdinNeeded(Exception):
+    """A command tried to read from stdin, which the daemon does not have."""
+
+
+class _NoInput(io.TextIOBase):
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        raise _StdinNeeded
+
+    def readline(self, size=-1):
+        raise _StdinNeeded
+
+
+class CachedStore:
+    """A storage backend that keeps the parsed task list in memory.
+
+    Provides the backend functions of todo.backends on top of another
+    backend. Changes are written to it straight away, checked against the
+    backend's ``version`` from when the list was loaded, so that changes
+    made meanwhile by other programs are never overwritten.
+    """
+
+    def __init__(self, name, path=None):
+        self.name = name
+        # The task file, or None for the backend's file in the current directory.
+        self.path = path
+        self.backend = backends.get_backend(name)
+        self.index = None
+        self.order = None
+        # The backend's version the cached list was loaded at.
+        self.version = None
+        # Goes up whenever the cached list changes, so callers can cache results.
+        self.generation = 0
+        self.lock = threading.RLock()
+
+    def _fresh(self):
+        """Return the in-memory index, reloading it if the task files were changed by someone else."""
+        with self.lock:
+            current = self.backend.version(self.path)
+            if self.index is None or current != self.version:
+                # Taken before loading: if a write slips in between, the
+                # next commit sees it as a conflict rather than missing it.
+                self.version = current
+                self.index = self.backend.load_index(self.path)
+                self.order = None
+                self.generation += 1
+            return self.index
+
+    def _commit(self, changed, removed):
+        """Write changes made to the cached list, then apply them to it.
+
+        Raises ConflictError if they clash with a change written since the
+        list was loaded, which is then reloaded.
+        """
+        with self.lock:
+            try:
+                current = self.backend.commit(changed, removed, path=self.path, expected=self.version)
+            except ConflictError:
+                self.index = None
+                raise
+            if current is None:
+                # Written, but so were other changes, which the cache lacks.
+                self.index = None
+                return
+            index = self.index
+            for task in changed:
+                index[task.id] = task
+                index.next_id = max(index.next_id, task.id + 1)
+            for task_id in removed:
+                index.pop(task_id, None)
+            self.version = current
+            self.order = None
+            self.generation += 1
+
+    def close(self):
+        """Drop the cached list."""
+        with self.lock:
+            self.index = None
+            self.order = None
+
+    def _display_order(self):
+        # Reload first: the order is only as fresh as the index it was made from.
+        index = self._fresh()
+        if self.order is None:
+            self.order = sorted(index.values(), key=lambda task: task.rank)
+        return self.order
+
+    def cached_index(self):
+        """Return the cached ID-to-Task dict itself, which callers must not change."""
+        return self._fresh()
+
+    def load_index(self, path=None):
+        return self._fresh().copy()
+
+    def load_tasks(self, path=None):
+        # Already in display order, which sorting by rank leaves as it is.
+        with self.lock:
+            return list(self._display_order())
+
+    def iter_tasks(self, path=None):
+        return iter(list(self._fresh().values()))
+
+    def query_tasks(self, status=None, category=None, priority=None, path=None):
+        return filter(task_filter(status, category, priority), list(self._fresh().values()))
+
+    def search_tasks(self, query, path=None):
+        # Scanning the tasks in memory beats keeping the backend's index up to date.
+        from todo.search import query_filter
+
+        with self.lock:
+            return sorted(filter(query_filter(query), self._fresh().values()), key=attrgetter('id'))
+
+    def due_tasks(self, before=None, limit=None, path=None):
+        # Like the counts, the backend keeps a date index up to date as changes are written.
+        return self.backend.due_tasks(before, limit, path=self.path)
+
+    def task_counts(self, path=None):
+        # The backend keeps counts incrementally as changes are written.
+        return self.backend.task_counts(path=self.path)
+
+    def rebuild_counts(self, path=None):
+        self.backend.rebuild_counts(path=self.path)
+
+    def save_tasks(self, tasks, path=None):
+        with self.lock:
+            self.backend.save_tasks(tasks, path=self.path)
+            self.index = None
+
+    def append_tasks(self, tasks, path=None):
+        with self.lock:
+            count = self.backend.append_tasks(tasks, path=self.path)
+            self.index = None
+            return count
+
+    def append_task(self, task, path=None):
+        def change(index):
+            # The ID comes from the high-water mark of the list as loaded; if
+            # another program adds a task meanwhile, the commit conflicts and
+            # the ID is picked again from the reloaded list.
+            task.id = next_task_id(index)
+            return [task], [], task.id
+
+        return self.update(change)
+
+    def commit(self, changed=(), removed=(), path=None):
+        with self.lock:
+            self._fresh()
+            self._commit(list(changed), list(removed))
+
+    def compact(self, path=None):
+        # The tasks stay the same, so the cache is only reloaded for the new version.
+        with self.lock:
+            self.backend.compact(self.path)
+
+    def replace_task(self, task, path=None):
+        self.commit(changed=[task])
+
+    def remove_task(self, task_id, path=None):
+        self.commit(removed=[task_id])
+
+    def update(self, change, path=None):
+        with self.lock:
+            for attempt in range(UPDATE_ATTEMPTS):
+                # ``change`` edits the cached tasks in place. That is safe as
+                # long as it either returns them for commit or fails, in which
+                # case the list is reloaded from the backend.
+                try:
+                    outcome = change(self._fresh().copy())
+                except BaseException:
+                    self.index = None
+                    raise
+                if outcome is None:
+                    return None
+                changed, removed, result = outcome
+                try:
+                    self._commit(list(changed), list(removed))
+                except ConflictError:
+                    time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+                    continue
+                return result
+        raise ConflictError(f"{self.path or backends.FILES[self.name]} kept changing; "
+                            f"gave up after {UPDATE_ATTEMPTS} attempts")
+
+
+def _backend_option(args):
+    """Return the value of a --backend option given before the subcommand, if any."""
+    for i, arg in enumerate(args):
+        if arg.startswith('--backend='):
+            return arg.split('=', 1)[1]
+        if arg == '--backend':
+            return args[i + 1] if i + 1 < len(args) else None
+        if not arg.startswith('-'):
+            return None
+    return None
+
+
+def run_command(store, request):
+    """Run one CLI command against the store and return the reply for the client."""
+    from todo.cli import cli
+
+    args = request['args']
+    backend = _backend_option(args) or request.get('backend') or backends.backend_name()
+    if backend != store.name or any(command in args for command in LOCAL_COMMANDS):
+        return {'status': 'fallback'}
+    stdout, stderr = io.StringIO(), io.StringIO()
+    code = 0
+    failure = None
+    stdin = sys.stdin
+    sys.stdin = _NoInput()
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                cli.main(args, prog_name='todo', obj=store, standalone_mode=False,
+                         color=request.get('color') or None)
+            except click.exceptions.Exit as error:
+                code = error.exit_code
+            except click.ClickException as error:
+                error.show()
+                code = error.exit_code
+            except click.Abort:
+                click.echo("Aborted!", err=True)
+                code = 1
+            except _StdinNeeded:
+                raise
+            except Exception as error:
+                # The command may have written changes before it failed, so
+                # running it again in the client could make them twice.
+                click.echo(f"Error: {error}", err=True)
+                failure, code = error, 1
+    except _StdinNeeded:
+        return {'status': 'fallback'}
+    finally:
+        sys.stdin = stdin
+    if failure is not None:
+        click.echo(f"todo daemon: {failure!r}", err=True)
+    return {'status': 'ok', 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'code': code}
+
+
+def serve(name, path=SOCKET_FILE):
+    """Serve commands on a Unix socket until stopped."""
+    if send({'ping': True}, path) is not None:
+        raise RuntimeError(f"A todo daemon is already running on {path}")
+    if os.path.exists(path):
+        os.remove(path)
+    store = CachedStore(name)
+    store.load_tasks()
+    trace.skip_import()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        server.listen()
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    request = json.loads(b"".join(iter(lambda: conn.recv(65536), b"")))
+                except (OSError, ValueError) as error:
+                    click.echo(f"todo daemon: dropped a request: {error!r}", err=True)
+                    continue
+                if 'ping' in request or 'stop' in request:
+                    reply = {'status': 'ok'}
+                else:
+                    try:
+                        reply = run_command(store, request)
+                    except Exception as error:
+                        # Errors in the command itself are replied with, so
+                        # this one came before it started.
+                        click.echo(f"todo daemon: {error!r}", err=True)
+                        reply = {'status': 'fallback'}
+                try:
+                    conn.sendall(json.dumps(reply).encode('utf-8'))
+                except OSError as error:
+                    click.echo(f"todo daemon: could not reply: {error!r}", err=True)
+            if 'stop' in request:
+                break
+    finally:
+        server.close()
+        os.remove(path)
+        store.close()
+
+
+def stop(path=SOCKET_FILE):
+    """Ask the daemon to stop; return False if none is running."""
+    return send({'stop': True}, path) is not None
@@ -0,0 +1,466 @@
+"""SQLite storage backend.
+
+Tasks are rows of a ``tasks`` table in ``todo.db``, indexed on status,
+priority and category, so filtered queries such as "open high-priority tasks
+in category X" are index lookups rather than scans of the whole list.
+Descriptions and categories are also kept in an FTS5 table with the trigram
+tokenizer, which answers the same substring searches as the text backend's
+search index. Triggers keep a count of tasks per status, priority and
+category in ``task_counts`` for ``todo stats``, and a partial index on the
+due dates of open tasks answers ``todo due``. The database runs in WAL
+mode, so readers never block the writer.
+
+The functions mirror todo.storage; see todo.backends.
+"""
+import datetime
+import os
+import sqlite3
+
+from todo import trace
+from todo.backends import DB_FILE
+from todo.search import add_counts, count_rows, counts_schema
+from todo.storage import ConflictError, TaskIndex
+from todo.task import NO_PRIORITY_RANK, Priority, Task
+
+# Seconds a writer waits for another writer's transaction to finish.
+BUSY_TIMEOUT = 30
+
+# AUTOINCREMENT makes SQLite remember the highest ID ever used, so that
+# the IDs of deleted tasks are never given out again.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    done INTEGER NOT NULL,
+    priority INTEGER,
+    description TEXT NOT NULL,
+    category TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (done, priority, category);
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority, category);
+CREATE INDEX IF NOT EXISTS tasks_category ON tasks (category);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+# Every write of the tasks bumps the 'version' row of meta; see version().
+BUMP_VERSION = """
+INSERT INTO meta (key, value) VALUES ('version', 1)
+ON CONFLICT (key) DO UPDATE SET value = value + 1
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    description, category, content='tasks', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, description, category) VALUES (new.id, new.description, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, description, category)
+    VALUES ('delete', old.id, old.description, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, description, category)
+    VALUES ('delete', old.id, old.description, old.category);
+    INSERT INTO tasks_fts (rowid, description, category) VALUES (new.id, new.description, new.category);
+END;
+"""
+
+# Added to databases made before tasks had due dates, hence not part of SCHEMA.
+DUE_COLUMNS = ('due', 'every')
+DUE_INDEX = "CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due, id) WHERE done = 0 AND due IS NOT NULL"
+
+COLUMNS = "id, done, priority, description, category, due, every"
+PLACEHOLDERS = "?, ?, ?, ?, ?, ?, ?"
+
+STATUS_VALUES = {'open': 0, 'done': 1}
+
+
+# Stored as the database's user_version once its schema is set up, so that
+# connections only check a number rather than set it up every time. Raise it
+# when the schema changes, so that existing databases are upgraded.
+SCHEMA_VERSION = 1
+
+
+def _connect(path):
+    conn = sqlite3.connect(path or DB_FILE, timeout=BUSY_TIMEOUT, isolation_level=None)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _set_up_schema(conn)
+    return conn
+
+
+def _set_up_schema(conn):
+    """Create the tables of a new database and upgrade one made by an older version."""
+    # WAL mode is kept in the database file, so it stays on for later connections.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        # SQLite before 3.34 has no trigram tokenizer; search falls back to scanning.
+        pass
+    add_counts(conn, 'task_counts', 'tasks')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_due'").fetchone() is None:
+        _add_due_columns(conn)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone() is None:
+        _add_autoincrement(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _add_due_columns(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have added them while we waited for the lock.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column in DUE_COLUMNS:
+            if column not in columns:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+        conn.execute(DUE_INDEX)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _add_autoincrement(conn):
+    """Rebuild a tasks table made before IDs were kept unique, with AUTOINCREMENT."""
+    # Dropping the table drops its indexes and triggers, so they are made again.
+    # The FTS table and the counts stay as they are: the rows keep their IDs.
+    fts = FTS_SCHEMA if _has_fts(conn) else ""
+    conn.executescript(f"""
+        BEGIN IMMEDIATE;
+        CREATE TABLE tasks_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            done INTEGER NOT NULL,
+            priority INTEGER,
+            description TEXT NOT NULL,
+            category TEXT COLLATE NOCASE,
+            due TEXT,
+            every TEXT
+        );
+        INSERT INTO tasks_new ({COLUMNS}) SELECT {COLUMNS} FROM tasks;
+        DROP TABLE tasks;
+        ALTER TABLE tasks_new RENAME TO tasks;
+        {SCHEMA} {fts} {counts_schema('task_counts', 'tasks')} {DUE_INDEX};
+        COMMIT;
+    """)
+
+
+def _next_id(conn):
+    """Return the lowest ID no task has had."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+    return (row[0] if row else 0) + 1
+
+
+def _version(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    return row[0] if row else 0
+
+
+def _has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").fetchone() is not None
+
+
+def _task(row):
+    task_id, done, priority, description, category, due, every = row
+    return Task(description, Priority(priority) if priority else None, category, bool(done), task_id,
+                datetime.date.fromisoformat(due) if due else None, every)
+
+
+def _values(task):
+    return (task.id, int(task.done), int(task.priority) if task.priority else None,
+            task.description, task.category, task.due.isoformat() if task.due else None, task.every)
+
+
+def _insert(conn, task, floor=1):
+    """Insert a task, giving it a new ID if it has none, its ID is below ``floor`` or it is taken."""
+    if task.id is not None and task.id >= floor:
+        try:
+            conn.execute(f"INSERT INTO tasks ({COLUMNS}) VALUES ({PLACEHOLDERS})", _values(task))
+            return
+        except sqlite3.IntegrityError:
+            pass
+    cursor = conn.execute(f"INSERT INTO tasks ({COLUMNS}) VALUES (NULL, {PLACEHOLDERS[3:]})", _values(task)[1:])
+    task.id = cursor.lastrowid
+
+
+def _write(conn, changed, removed):
+    changed, removed = list(changed), list(removed)
+    trace.count('rows_written', len(changed) + len(removed))
+    conn.executemany(
+        f"INSERT INTO tasks ({COLUMNS}) VALUES ({PLACEHOLDERS}) ON CONFLICT (id) DO UPDATE SET "
+        "done = excluded.done, priority = excluded.priority, "
+        "description = excluded.description, category = excluded.category, "
+        "due = excluded.due, every = excluded.every",
+        map(_values, changed),
+    )
+    conn.executemany("DELETE FROM tasks WHERE id = ?", ((task_id,) for task_id in removed))
+    conn.execute(BUMP_VERSION)
+
+
+def _select(sql, params, path):
+    return trace.timed('load', _rows(sql, params, path))
+
+
+def _rows(sql, params, path):
+    # Reading must not create the database, as that would make it the default backend.
+    if not os.path.exists(path or DB_FILE):
+        return
+    conn = _connect(path)
+    rows = 0
+    try:
+        for rows, row in enumerate(conn.execute(sql, params), 1):
+            yield _task(row)
+    finally:
+        conn.close()
+        trace.count('rows_read', rows)
+
+
+def load_index(path=None):
+    """Load tasks as a TaskIndex (an ID-to-Task dict), in ID order."""
+    index = TaskIndex((task.id, task) for task in iter_tasks(path))
+    if os.path.exists(path or DB_FILE):
+        conn = _connect(path)
+        try:
+            index.next_id = _next_id(conn)
+        finally:
+            conn.close()
+    return index
+
+
+def load_tasks(path=None):
+    """Load all tasks, in ID order."""
+    return list(iter_tasks(path))
+
+
+def iter_tasks(path=None):
+    """Yield tasks in ID order without loading them all into memory."""
+    return query_tasks(path=path)
+
+
+def query_tasks(status=None, category=None, priority=None, path=None):
+    """Yield the tasks with the given status ('open' or 'done'), category and priority name."""
+    conditions, params = [], []
+    if status:
+        conditions.append("done = ?")
+        params.append(STATUS_VALUES[status])
+    if priority:
+        conditions.append("priority = ?")
+        params.append(int(Priority[priority.upper()]))
+    if category:
+        conditions.append("category = ?")
+        params.append(category)
+    sql = f"SELECT {COLUMNS} FROM tasks"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return _select(sql + " ORDER BY id", params, path)
+
+
+def search_tasks(query, path=None):
+    """Return the tasks matching a query, ordered by ID (same syntax as todo.search)."""
+    from todo.search import parse_query
+
+    terms, filters = parse_query(query)
+    if not os.path.exists(path or DB_FILE):
+        return []
+    conn = _connect(path)
+    try:
+        conditions, params = [], []
+        fts = _has_fts(conn)
+        # The trigram tokenizer cannot match terms shorter than three characters.
+        phrases = [term for term in terms if fts and len(term) >= 3]
+        if phrases:
+            conditions.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+            params.append(" AND ".join('"{}"'.format(term.replace('"', '""')) for term in phrases))
+        for term in terms:
+            if term not in phrases:
+                conditions.append("instr(lower(description || ' ' || coalesce(category, '')), ?) > 0")
+                params.append(term)
+        if 'category' in filters:
+            conditions.append("category = ?")
+            params.append(filters['category'])
+        if 'priority' in filters:
+            if filters['priority'].upper() not in Priority.__members__:
+                return []
+            conditions.append("priority = ?")
+            params.append(int(Priority[filters['priority'].upper()]))
+        if 'status' in filters:
+            if filters['status'] not in STATUS_VALUES:
+                return []
+            conditions.append("done = ?")
+            params.append(STATUS_VALUES[filters['status']])
+        if 'id' in filters:
+            if not filters['id'].isdigit():
+                return []
+            conditions.append("id = ?")
+            params.append(int(filters['id']))
+        sql = f"SELECT {COLUMNS} FROM tasks"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with trace.phase('search'):
+            tasks = [_task(row) for row in conn.execute(sql + " ORDER BY id", params)]
+        trace.count('rows_read', len(tasks))
+        return tasks
+    finally:
+        conn.close()
+
+
+def due_tasks(before=None, limit=None, path=None):
+    """Return the open tasks with a due date, earliest first, only those due before ``before`` if given.
+
+    Tasks due on the same day come in priority order. ``limit`` returns only the first so many.
+    """
+    # Without statistics SQLite would pick the status index and sort every open task.
+    sql = f"SELECT {COLUMNS} FROM tasks INDEXED BY tasks_due WHERE done = 0 AND due IS NOT NULL"
+    params = []
+    if before is not None:
+        sql += " AND due < ?"
+        params.append(before.isoformat())
+    sql += f" ORDER BY due, coalesce(priority, {NO_PRIORITY_RANK}), id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with trace.phase('search'):
+        return list(_select(sql, params, path))
+
+
+def task_counts(path=None):
+    """Return (done, priority, category, count) for every combination that has tasks.
+
+    Categories are lowercased. The counts are kept up to date by triggers,
+    so this reads a handful of rows however long the list is.
+    """
+    if not os.path.exists(path or DB_FILE):
+        return []
+    conn = _connect(path)
+    try:
+        rows = conn.execute("SELECT done, priority, category, count FROM task_counts WHERE count > 0").fetchall()
+    finally:
+        conn.close()
+    return [(bool(done), Priority(priority) if priority else None, category or None, count)
+            for done, priority, category, count in rows]
+
+
+def rebuild_counts(path=None):
+    """Recount the tasks from the tasks table."""
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM task_counts")
+            conn.execute(count_rows('task_counts', 'tasks'))
+    finally:
+        conn.close()
+
+
+def save_tasks(tasks, path=None):
+    """Replace all stored tasks with the given ones."""
+    conn = _connect(path)
+    try:
+        with trace.phase('save'), conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM tasks")
+            for task in tasks:
+                _insert(conn, task)
+                trace.count('rows_written')
+            conn.execute(BUMP_VERSION)
+    finally:
+        conn.close()
+
+
+def append_tasks(tasks, path=None):
+    """Add many tasks in one transaction and return how many were added.
+
+    Tasks keep their IDs unless a task has ever had them (they are below
+    the high-water mark) or they clash with one another.
+    """
+    count = 0
+    conn = _connect(path)
+    try:
+        with trace.phase('save'), conn:
+            conn.execute("BEGIN IMMEDIATE")
+            floor = _next_id(conn)
+            for count, task in enumerate(tasks, 1):
+                _insert(conn, task, floor)
+            conn.execute(BUMP_VERSION)
+        trace.count('rows_written', count)
+    finally:
+        conn.close()
+    return count
+
+
+def append_task(task, path=None):
+    """Add a single task, giving it a new ID, which is also returned."""
+    task.id = None
+    append_tasks([task], path)
+    return task.id
+
+
+def version(path=None):
+    """Return a number that goes up whenever the tasks are written."""
+    if not os.path.exists(path or DB_FILE):
+        return 0
+    conn = _connect(path)
+    try:
+        return _version(conn)
+    finally:
+        conn.close()
+
+
+def commit(changed=(), removed=(), path=None, expected=None):
+    """Store many changed tasks and remove many task IDs in one transaction.
+
+    If ``expected`` is a ``version`` taken when the tasks were loaded,
+    ConflictError is raised if anything was written since: unlike the text
+    backend's journal, the database does not record which tasks a write
+    changed. Returns the ``version`` after the write.
+    """
+    conn = _connect(path)
+    try:
+        with trace.phase('save'), conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if expected is not None and _version(conn) != expected:
+                raise ConflictError(f"{path or DB_FILE} was changed by another process")
+            _write(conn, changed, removed)
+            return _version(conn)
+    finally:
+        conn.close()
+
+
+def compact(path=None):
+    """Nothing to do: deleted rows are gone from the tasks table straight away."""
+
+
+def replace_task(task, path=None):
+    """Store a changed task in place of the one with the same ID."""
+    commit(changed=[task], path=path)
+
+
+def remove_task(task_id, path=None):
+    """Remove the task with the given ID."""
+    commit(removed=[task_id], path=path)
+
+
+def update(change, path=None):
+    """Apply a read-modify-write change in a single write transaction.
+
+    ``change(index)`` is called with an ID-to-Task dict and returns
+    ``(changed, removed, result)``, or None to write nothing. Other writers
+    wait for the transaction, so there is nothing to retry.
+    """
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            with trace.phase('load'):
+                index = TaskIndex((task.id, task) for task in map(_task, conn.execute(f"SELECT {COLUMNS} FROM tasks ORDER BY id")))
+                index.next_id = _next_id(conn)
+            trace.count('rows_read', len(index))
+            outcome = change(index)
+            if outcome is None:
+                return None
+            changed, removed, result = outcome
+            with trace.phase('save'):
+                _write(conn, changed, removed)
+            return result
+    finally:
+        conn.close()
@@ -0,0 +1,95 @@
+"""PDF export.
+
+Tasks go into the document in fixed-size chunks, each one a page-splittable
+``LongTable``, so the whole list never has to be laid out as a single table.
+reportlab is only imported when this module is.
+"""
+import itertools
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+# Rows per table chunk.
+CHUNK_ROWS = 50
+
+HEADER = ["#", "Status", "Priority", "Task Description", "Category"]
+COLUMN_WIDTHS = [40, 50, 50, 260, 100]
+# Room for text in the description column once the cell padding is taken off.
+DESCRIPTION_WIDTH = COLUMN_WIDTHS[3] - 12
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def _row(number, task):
+    return [
+        number,
+        task.status,
+        task.priority.emoji if task.priority else "",
+        task.description,
+        task.category or "N/A",
+    ]
+
+
+def _tables(rows, cell_style):
+    """Yield one LongTable per CHUNK_ROWS rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return
+        data = [HEADER]
+        for row in chunk:
+            # Paragraphs wrap long text but are slow to lay out, so only use
+            # one when the description does not fit on a single line.
+            if stringWidth(row[3], cell_style.fontName, cell_style.fontSize) > DESCRIPTION_WIDTH:
+                row[3] = Paragraph(escape(row[3]), cell_style)
+            data.append(row)
+        table = LongTable(data, colWidths=COLUMN_WIDTHS, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
+        yield table
+
+
+def _grouped(rows, styles, cell_style):
+    """Yield a heading followed by that category's tables, for each category."""
+    def category(row):
+        return row[4].lower()
+
+    # The sort is stable, so each category keeps the list's order.
+    for _, group in itertools.groupby(sorted(rows, key=category), key=category):
+        first = next(group)
+        yield Paragraph(escape(first[4]), styles["Heading2"])
+        yield from _tables(itertools.chain([first], group), cell_style)
+
+
+def export_pdf(filename, tasks, group_by_category=False):
+    """Write tasks to a PDF file and return how many were exported."""
+    styles = getSampleStyleSheet()
+    cell_style = styles["Normal"]
+    count = 0
+
+    def rows():
+        nonlocal count
+        for count, task in enumerate(tasks, 1):
+            yield _row(count, task)
+
+    story = [Paragraph("To-Do List", styles["Title"]), Spacer(1, 12)]
+    if group_by_category:
+        story.extend(_grouped(rows(), styles, cell_style))
+    else:
+        story.extend(_tables(rows(), cell_style))
+    SimpleDocTemplate(filename, pagesize=letter).build(story)
+    return count
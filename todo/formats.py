@@ -0,0 +1,207 @@
+"""Plain-text export and import formats.
+
+* ``csv``: one row per task with an ``id,status,priority,description,category,due,every`` header.
+* ``jsonl``: one JSON object per line with the same fields.
+* ``todotxt``: the todo.txt format (http://todotxt.org): ``x`` marks done
+  tasks, priorities are ``(A)``/``(B)``/``(C)``, the category is a
+  ``+project``, the ID an ``id:`` tag, and the due date and recurrence the
+  common ``due:`` and ``rec:`` extensions.
+
+Tasks exported from several named lists also carry the name of their list:
+a ``list`` column or field, or a ``list:`` tag in todo.txt. Imports ignore it.
+Line breaks in imported descriptions and categories become spaces, as each
+task is one line of the task file.
+
+Readers and writers work one task at a time, so files of any size can be
+converted without holding them in memory.
+"""
+import csv
+import json
+import os
+import re
+
+from todo.task import EVERY_PATTERN, TASK_PATTERN, Priority, Task, parse_date, parse_every, single_line
+
+FORMATS = ('csv', 'jsonl', 'todotxt')
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.txt': 'todotxt',
+    '.pdf': 'pdf',
+}
+
+CSV_FIELDS = ['id', 'status', 'priority', 'description', 'category', 'due', 'every']
+LIST_FIELD = 'list'
+
+TODOTXT_PRIORITIES = {Priority.HIGH: 'A', Priority.MEDIUM: 'B', Priority.LOW: 'C'}
+TODOTXT_LETTERS = {letter: priority for priority, letter in TODOTXT_PRIORITIES.items()}
+
+TODOTXT_PATTERN = re.compile(
+    r'^(?P<done>x )?'
+    r'(?:\((?P<priority>[A-Z])\) )?'
+    r'(?:\d{4}-\d{2}-\d{2} ){0,2}'
+    r'(?P<text>.*)$'
+)
+TODOTXT_TAG = re.compile(r'(?:^|\s)(?:\+(?P<project>\S+)|(?P<key>id|pri|due|rec|list):(?P<value>\S+))(?=\s|$)')
+
+
+def guess_format(filename):
+    """Guess a file's format from its extension, or return None."""
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def _priority_name(task):
+    return task.priority.name.lower() if task.priority else ''
+
+
+def _priority_from_name(name):
+    name = (name or '').strip().upper()
+    return Priority[name] if name in Priority.__members__ else None
+
+
+def task_to_dict(task):
+    """Return a task as a dict of plain values (the CSV and JSON Lines fields)."""
+    return {
+        'id': task.id,
+        'status': 'done' if task.done else 'open',
+        'priority': _priority_name(task),
+        'description': task.description,
+        'category': task.category or '',
+        'due': task.due.isoformat() if task.due else '',
+        'every': task.every or '',
+    }
+
+
+def task_from_dict(row):
+    """Build a task from a dict of CSV or JSON Lines fields."""
+    task_id = str(row.get('id') or '').strip()
+    due, every = str(row.get('due') or '').strip(), str(row.get('every') or '').strip()
+    return Task(
+        single_line(str(row.get('description') or '')),
+        priority=_priority_from_name(row.get('priority')),
+        category=single_line(str(row.get('category') or '')) or None,
+        done=str(row.get('status') or '').strip().lower() in ('done', 'x', 'true', '1'),
+        id=int(task_id) if task_id.isdigit() else None,
+        due=parse_date(due) if due else None,
+        every=parse_every(every) if every else None,
+    )
+
+
+def _with_list(list_name, task):
+    row = task_to_dict(task)
+    if list_name is not None:
+        row[LIST_FIELD] = list_name
+    return row
+
+
+def _write_csv(file, tasks, lists):
+    writer = csv.DictWriter(file, fieldnames=CSV_FIELDS + [LIST_FIELD] if lists else CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for count, (list_name, task) in enumerate(tasks, 1):
+        writer.writerow(_with_list(list_name, task))
+    return count
+
+
+def _read_csv(file):
+    for row in csv.DictReader(file):
+        yield task_from_dict(row)
+
+
+def _write_jsonl(file, tasks, lists):
+    count = 0
+    for count, (list_name, task) in enumerate(tasks, 1):
+        file.write(json.dumps(_with_list(list_name, task), ensure_ascii=False) + "\n")
+    return count
+
+
+def _read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield task_from_dict(json.loads(line))
+
+
+def _todotxt_line(task):
+    parts = []
+    letter = TODOTXT_PRIORITIES.get(task.priority)
+    if task.done:
+        parts.append('x')
+    elif letter:
+        parts.append(f"({letter})")
+    parts.append(task.description)
+    if task.category:
+        parts.append('+' + task.category.replace(' ', '_'))
+    if task.done and letter:
+        # Completed tasks drop the (A) prefix, so keep the priority as a tag.
+        parts.append(f"pri:{letter}")
+    if task.due:
+        parts.append(f"due:{task.due.isoformat()}")
+    rec = EVERY_PATTERN.match(task.every or '')
+    if rec:
+        parts.append(f"rec:{rec.group('count') or 1}{rec.group('unit')[0]}")
+    if task.id is not None:
+        parts.append(f"id:{task.id}")
+    return " ".join(parts)
+
+
+def _parse_todotxt(line):
+    if TASK_PATTERN.match(line):
+        # Our own todo.txt lines can be imported as they are.
+        return Task.parse(line)
+    match = TODOTXT_PATTERN.match(line)
+    letter = match.group('priority')
+    category = task_id = due = every = None
+    for tag in TODOTXT_TAG.finditer(match.group('text')):
+        if tag.group('project') and category is None:
+            category = tag.group('project').replace('_', ' ')
+        elif tag.group('key') == 'id' and tag.group('value').isdigit():
+            task_id = int(tag.group('value'))
+        elif tag.group('key') == 'pri':
+            letter = letter or tag.group('value')[:1].upper()
+        elif tag.group('key') == 'due':
+            due = parse_date(tag.group('value'))
+        elif tag.group('key') == 'rec':
+            # A leading + (strict recurrence) makes no difference here.
+            every = parse_every(tag.group('value').lstrip('+'))
+    description = TODOTXT_TAG.sub('', match.group('text')).strip()
+    # Anything below (C) is still a low priority.
+    priority = TODOTXT_LETTERS.get(letter, Priority.LOW) if letter else None
+    return Task(description, priority, category, done=bool(match.group('done')), id=task_id, due=due, every=every)
+
+
+def _write_todotxt(file, tasks, lists):
+    count = 0
+    for count, (list_name, task) in enumerate(tasks, 1):
+        line = _todotxt_line(task)
+        if list_name is not None:
+            line += " list:" + list_name.replace(' ', '_')
+        file.write(line + "\n")
+    return count
+
+
+def _read_todotxt(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield _parse_todotxt(line)
+
+
+WRITERS = {'csv': _write_csv, 'jsonl': _write_jsonl, 'todotxt': _write_todotxt}
+READERS = {'csv': _read_csv, 'jsonl': _read_jsonl, 'todotxt': _read_todotxt}
+
+
+def write_tasks(file, tasks, fmt, lists=False):
+    """Write tasks to an open text file in the given format and return how many were written.
+
+    With ``lists``, ``tasks`` are (list name, task) pairs and the list names are written too.
+    """
+    if not lists:
+        tasks = ((None, task) for task in tasks)
+    return WRITERS[fmt](file, tasks, lists)
+
+
+def read_tasks(file, fmt):
+    """Yield tasks read from an open text file in the given format."""
+    return READERS[fmt](file)
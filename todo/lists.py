@@ -0,0 +1,155 @@
+"""Named task lists.
+
+Every list is a directory holding its own task file (and journal, search
+index, archive and daemon socket), exactly like the directory `todo` runs
+in. The registry, ``lists.json`` in ``TODO_HOME`` (default ``~/.todo``),
+maps list names to their directories; lists created by name alone live
+in ``TODO_HOME/lists/<name>``.
+
+Commands that span every list load each one in a separate process, on a
+pool of one worker per CPU, and merge the results by priority.
+
+Only the standard library is imported at the top, as todo.client uses this
+module before deciding whether to load the CLI.
+"""
+import heapq
+import json
+import os
+from operator import attrgetter
+
+REGISTRY_FILE = 'lists.json'
+
+
+def home():
+    """Return the directory holding the registry and the lists created by name."""
+    return os.environ.get('TODO_HOME') or os.path.join(os.path.expanduser('~'), '.todo')
+
+
+def load_registry():
+    """Return the registered lists as a dict of name -> directory, sorted by name."""
+    try:
+        with open(os.path.join(home(), REGISTRY_FILE), encoding='utf-8') as file:
+            registry = json.load(file)
+    except FileNotFoundError:
+        return {}
+    return dict(sorted(registry.items()))
+
+
+def _save_registry(registry):
+    path = os.path.join(home(), REGISTRY_FILE)
+    os.makedirs(home(), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(dict(sorted(registry.items())), file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_directory(name):
+    """Return the directory of a registered list, or None if there is no list by that name."""
+    return load_registry().get(name)
+
+
+def register(name, directory=None):
+    """Register a list and return its directory, creating it if needed.
+
+    Without ``directory`` the list gets a new directory under ``home()``.
+    Raises ValueError if the name is not usable as a directory name.
+    """
+    if not name or name != os.path.basename(name) or name.startswith('.'):
+        raise ValueError(f"Invalid list name: {name!r}")
+    directory = os.path.abspath(directory or os.path.join(home(), 'lists', name))
+    os.makedirs(directory, exist_ok=True)
+    registry = load_registry()
+    registry[name] = directory
+    _save_registry(registry)
+    return directory
+
+
+def unregister(name):
+    """Remove a list from the registry, keeping its files. Return whether it was registered."""
+    registry = load_registry()
+    if registry.pop(name, None) is None:
+        return False
+    _save_registry(registry)
+    return True
+
+
+def list_option(args):
+    """Return the value of a --list option given before the subcommand, and the other arguments."""
+    for i, arg in enumerate(args):
+        if arg.startswith('--list='):
+            return arg.split('=', 1)[1], args[:i] + args[i + 1:]
+        if arg == '--list':
+            return (args[i + 1] if i + 1 < len(args) else None), args[:i] + args[i + 2:]
+        if not arg.startswith('-'):
+            break
+    return None, args
+
+
+def _list_view(job):
+    """Return a list's tasks matching the filters as (number, task), in `view` order."""
+    from todo.api import TodoStore
+
+    directory, filters = job
+    return TodoStore(directory).numbered(*filters)
+
+
+def _list_search(job):
+    from todo.api import TodoStore
+
+    directory, query = job
+    return sorted(TodoStore(directory).search(query), key=attrgetter('rank'))
+
+
+def _list_query(job):
+    from todo.api import TodoStore
+
+    directory, filters = job
+    return sorted(TodoStore(directory).tasks(*filters), key=attrgetter('rank'))
+
+
+def fan_out(function, jobs, workers=None):
+    """Return ``[function(job) for job in jobs]``, run on a process pool when there are several jobs and CPUs.
+
+    ``workers`` defaults to one per CPU.
+    """
+    jobs = list(jobs)
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers < 2:
+        return [function(job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Hand out several lists at a time when there are many small ones.
+        return list(pool.map(function, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def _merge(names, results, key):
+    """Merge per-list results, each already ordered by ``key``, into (list name, item) by ``key``."""
+    tagged = ([(name, item) for item in items] for name, items in zip(names, results))
+    return heapq.merge(*tagged, key=lambda entry: key(entry[1]))
+
+
+def view_all(status=None, category=None, priority=None, registry=None):
+    """Yield (list name, number, task) for every list's matching tasks, highest priority first.
+
+    Numbers are the tasks' numbers within their own list.
+    """
+    registry = load_registry() if registry is None else registry
+    results = fan_out(_list_view, [(directory, (status, category, priority)) for directory in registry.values()])
+    for name, (number, task) in _merge(registry, results, lambda entry: entry[1].rank):
+        yield name, number, task
+
+
+def search_all(query, registry=None):
+    """Return (list name, task) for the tasks matching ``query`` in every list, highest priority first."""
+    registry = load_registry() if registry is None else registry
+    results = fan_out(_list_search, [(directory, query) for directory in registry.values()])
+    return list(_merge(registry, results, attrgetter('rank')))
+
+
+def query_all(status=None, category=None, priority=None, registry=None):
+    """Return (list name, task) for every list's tasks matching the filters, highest priority first."""
+    registry = load_registry() if registry is None else registry
+    results = fan_out(_list_query, [(directory, (status, category, priority)) for directory in registry.values()])
+    return list(_merge(registry, results, attrgetter('rank')))
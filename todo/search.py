@@ -0,0 +1,380 @@
+"""Trigram search index.
+
+The index is a small SQLite database next to the task file
+(``todo.txt.idx``). Every task's description and category are broken into
+three-character grams, so a substring query only has to look at the tasks
+that contain all of the query's grams.
+
+The index remembers which snapshot and how many journal records it has seen.
+Before answering a query it applies any journal records it has not seen yet,
+and compaction moves it onto the new snapshot, so it is only rebuilt from
+scratch when the task file was rewritten some other way.
+
+The index also keeps the number of tasks per status, priority and category
+(for ``todo stats``), which triggers update as tasks are indexed, and the
+due dates of open tasks in date order (for ``todo due``).
+"""
+import json
+import os
+import re
+import shlex
+import sqlite3
+
+from todo.storage import TODO_FILE, load_index, locked, read_journal, snapshot_stamp
+from todo.task import NO_PRIORITY_RANK, Priority, Task
+
+INDEX_SUFFIX = '.idx'
+
+# Field filters accepted in queries, e.g. "category:work priority:high".
+FIELDS = ('category', 'priority', 'status', 'id')
+
+STATUS_VALUES = {'open': 0, 'done': 1}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    line TEXT NOT NULL,
+    text TEXT NOT NULL,
+    category TEXT,
+    priority INTEGER,
+    done INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_category ON docs (category);
+CREATE INDEX IF NOT EXISTS docs_priority ON docs (priority);
+CREATE INDEX IF NOT EXISTS docs_done ON docs (done);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (gram, id)
+) WITHOUT ROWID;
+"""
+
+# Counts of the tasks in the table {source}, kept up to date by triggers.
+# Category and priority are '' and 0 rather than NULL so that they can be part
+# of the key, and categories are counted in lower case, as they are matched.
+COUNTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {counts} (
+    done INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (done, priority, category)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS {source}_count_insert AFTER INSERT ON {source} BEGIN
+    INSERT INTO {counts} (done, priority, category, count)
+    VALUES (new.done, coalesce(new.priority, 0), lower(coalesce(new.category, '')), 1)
+    ON CONFLICT (done, priority, category) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS {source}_count_delete AFTER DELETE ON {source} BEGIN
+    UPDATE {counts} SET count = count - 1
+    WHERE done = old.done AND priority = coalesce(old.priority, 0) AND category = lower(coalesce(old.category, ''));
+END;
+CREATE TRIGGER IF NOT EXISTS {source}_count_update AFTER UPDATE ON {source} BEGIN
+    UPDATE {counts} SET count = count - 1
+    WHERE done = old.done AND priority = coalesce(old.priority, 0) AND category = lower(coalesce(old.category, ''));
+    INSERT INTO {counts} (done, priority, category, count)
+    VALUES (new.done, coalesce(new.priority, 0), lower(coalesce(new.category, '')), 1)
+    ON CONFLICT (done, priority, category) DO UPDATE SET count = count + 1;
+END;
+"""
+
+COUNT_ROWS = """
+INSERT INTO {counts} (done, priority, category, count)
+SELECT done, coalesce(priority, 0), lower(coalesce(category, '')), COUNT(*) FROM {source} GROUP BY 1, 2, 3
+"""
+
+# Open tasks that have a due date, in date order.
+DUES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dues (
+    due TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (due, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dues_id ON dues (id);
+"""
+
+def index_path(path=None):
+    """Return the search index file that belongs to a task file."""
+    return (path or TODO_FILE) + INDEX_SUFFIX
+
+
+def trigrams(text):
+    """Return the set of three-character grams in a piece of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _searchable_text(task):
+    return f"{task.description} {task.category or ''}".lower()
+
+
+def _put(conn, task):
+    _discard(conn, task.id)
+    text = _searchable_text(task)
+    conn.execute(
+        "INSERT INTO docs (id, line, text, category, priority, done) VALUES (?, ?, ?, ?, ?, ?)",
+        (task.id, str(task), text, (task.category or '').lower() or None,
+         int(task.priority) if task.priority else None, int(task.done)),
+    )
+    conn.executemany(
+        "INSERT INTO grams (gram, id) VALUES (?, ?)",
+        ((gram, task.id) for gram in trigrams(text)),
+    )
+    if task.due and not task.done:
+        conn.execute("INSERT INTO dues (due, id) VALUES (?, ?)", (task.due.isoformat(), task.id))
+
+
+def _discard(conn, task_id):
+    row = conn.execute("SELECT text FROM docs WHERE id = ?", (task_id,)).fetchone()
+    if row is None:
+        return
+    conn.executemany(
+        "DELETE FROM grams WHERE gram = ? AND id = ?",
+        ((gram, task_id) for gram in trigrams(row[0])),
+    )
+    conn.execute("DELETE FROM docs WHERE id = ?", (task_id,))
+    conn.execute("DELETE FROM dues WHERE id = ?", (task_id,))
+
+
+def _apply(conn, records):
+    for record in records:
+        if record['op'] == 'put':
+            _put(conn, Task.parse(record['task']))
+        elif record['op'] == 'delete':
+            _discard(conn, record['id'])
+
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+
+def counts_schema(counts, source):
+    """Return the SQL creating the table ``counts`` that counts the tasks in ``source``, and its triggers."""
+    return COUNTS_SCHEMA.format(counts=counts, source=source)
+
+
+def count_rows(counts, source):
+    """Return the SQL that fills the empty table ``counts`` with the counts of the tasks in ``source``."""
+    return COUNT_ROWS.format(counts=counts, source=source)
+
+
+def add_counts(conn, counts, source):
+    """Create and fill the table ``counts`` in a database made before tasks were counted."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (counts,)).fetchone() is None:
+        # Another process may be doing the same, so start the count afresh inside the transaction.
+        conn.executescript(f"BEGIN IMMEDIATE; {counts_schema(counts, source)} "
+                           f"DELETE FROM {counts}; {count_rows(counts, source)}; COMMIT;")
+
+
+def _connect(path):
+    conn = sqlite3.connect(index_path(path))
+    conn.executescript(SCHEMA)
+    add_counts(conn, 'counts', 'docs')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'dues'").fetchone() is None:
+        # An index made before due dates: forgetting its snapshot makes the
+        # next open_index rebuild it, dates included.
+        conn.executescript(f"BEGIN IMMEDIATE; {DUES_SCHEMA} DELETE FROM meta WHERE key = 'base'; COMMIT;")
+    return conn
+
+
+def rebuild_index(path=None):
+    """Rebuild the search index from the task file."""
+    path = path or TODO_FILE
+    conn = _connect(path)
+    with locked(path, shared=True), conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _rebuild(conn, path)
+    conn.close()
+
+
+def _rebuild(conn, path):
+    # The caller holds the task file's lock, so the snapshot and the journal match.
+    conn.execute("DELETE FROM docs")
+    conn.execute("DELETE FROM grams")
+    conn.execute("DELETE FROM counts")
+    conn.execute("DELETE FROM dues")
+    base = snapshot_stamp(path)
+    records = read_journal(path)[1]
+    for task in load_index(path).values():
+        _put(conn, task)
+    _set_meta(conn, 'base', base)
+    _set_meta(conn, 'applied', len(records))
+
+
+def open_index(path=None):
+    """Open the search index, bringing it up to date with the task file.
+
+    The journal is read and what the index has seen of it checked and updated
+    while holding the task file's lock and the index's write lock, so a
+    compaction cannot move the index onto a new journal in between.
+    """
+    path = path or TODO_FILE
+    conn = _connect(path)
+    with locked(path, shared=True), conn:
+        conn.execute("BEGIN IMMEDIATE")
+        records = read_journal(path)[1]
+        applied = _get_meta(conn, 'applied')
+        if _get_meta(conn, 'base') != snapshot_stamp(path) or applied is None or applied > len(records):
+            _rebuild(conn, path)
+        elif applied < len(records):
+            _apply(conn, records[applied:])
+            _set_meta(conn, 'applied', len(records))
+    return conn
+
+
+def task_counts(path=None):
+    """Return (done, priority, category, count) for every combination that has tasks.
+
+    Categories are lowercased. Only the journal records since the last call
+    are read, so this takes about the same time however long the list is.
+    """
+    conn = open_index(path)
+    try:
+        rows = conn.execute("SELECT done, priority, category, count FROM counts WHERE count > 0").fetchall()
+    finally:
+        conn.close()
+    return [(bool(done), Priority(priority) if priority else None, category or None, count)
+            for done, priority, category, count in rows]
+
+
+def due_tasks(before=None, limit=None, path=None):
+    """Return the open tasks with a due date, earliest first, only those due before ``before`` if given.
+
+    Tasks due on the same day come in priority order. They are read from
+    the date-ordered index, so with ``limit`` only the tasks returned are read.
+    """
+    sql = "SELECT line FROM dues JOIN docs USING (id)"
+    params = []
+    if before is not None:
+        sql += " WHERE due < ?"
+        params.append(before.isoformat())
+    sql += f" ORDER BY due, coalesce(priority, {NO_PRIORITY_RANK}), id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    conn = open_index(path)
+    try:
+        return [Task.parse(line) for (line,) in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def rebase_index(path, base, records):
+    """Move the index onto a snapshot that was just compacted from ``base`` plus ``records``."""
+    if not os.path.exists(index_path(path)):
+        return
+    conn = _connect(path)
+    # Compaction holds the task file's write lock while calling this.
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        applied = _get_meta(conn, 'applied')
+        if _get_meta(conn, 'base') == base and applied is not None and applied <= len(records):
+            _apply(conn, records[applied:])
+            _set_meta(conn, 'base', snapshot_stamp(path))
+            _set_meta(conn, 'applied', 0)
+    conn.close()
+
+
+def parse_query(query):
+    """Split a query into plain search terms and field filters."""
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        tokens = query.split()
+    terms, filters = [], {}
+    for token in tokens:
+        field, sep, value = token.partition(':')
+        if sep and field.lower() in FIELDS and value:
+            filters[field.lower()] = value.lower()
+        else:
+            terms.append(token.lower())
+    return terms, filters
+
+
+def search_tasks(query, path=None):
+    """Return the tasks matching a query, ordered by ID.
+
+    Every plain term must appear in the task's description or category
+    (case-insensitively); ``category:``, ``priority:``, ``status:`` (open or
+    done) and ``id:`` restrict the match to tasks with that field value.
+    """
+    terms, filters = parse_query(query)
+    conditions, params = [], []
+    for term in terms:
+        grams = trigrams(term)
+        if grams:
+            conditions.append(
+                "id IN (SELECT id FROM grams WHERE gram IN ({}) GROUP BY id HAVING COUNT(*) = ?)".format(
+                    ", ".join("?" * len(grams)))
+            )
+            params.extend(grams)
+            params.append(len(grams))
+        conditions.append("instr(text, ?) > 0")
+        params.append(term)
+    if 'category' in filters:
+        conditions.append("category = ?")
+        params.append(filters['category'])
+    if 'priority' in filters:
+        if filters['priority'].upper() not in Priority.__members__:
+            return []
+        conditions.append("priority = ?")
+        params.append(int(Priority[filters['priority'].upper()]))
+    if 'status' in filters:
+        if filters['status'] not in STATUS_VALUES:
+            return []
+        conditions.append("done = ?")
+        params.append(STATUS_VALUES[filters['status']])
+    if 'id' in filters:
+        if not filters['id'].isdigit():
+            return []
+        conditions.append("id = ?")
+        params.append(int(filters['id']))
+
+    sql = "SELECT line FROM docs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY id"
+    conn = open_index(path)
+    try:
+        return [Task.parse(line) for (line,) in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def query_filter(query):
+    """Return a predicate that matches tasks the way ``search_tasks`` does, for tasks already in memory."""
+    terms, filters = parse_query(query)
+    category = filters.get('category')
+    priority = filters.get('priority', '').upper()
+    status = filters.get('status')
+    task_id = filters.get('id')
+    if ((priority and priority not in Priority.__members__)
+            or (status and status not in STATUS_VALUES)
+            or (task_id and not task_id.isdigit())):
+        return lambda task: False
+    priority = Priority[priority] if priority else None
+    done = bool(STATUS_VALUES[status]) if status else None
+    task_id = int(task_id) if task_id else None
+
+    def matches(task):
+        text = _searchable_text(task)
+        return (all(term in text for term in terms)
+                and (category is None or (task.category or '').lower() == category)
+                and (priority is None or task.priority == priority)
+                and (done is None or task.done == done)
+                and (task_id is None or task.id == task_id))
+    return matches
+
+
+def highlight(text, query, marker, reset):
+    """Wrap every occurrence of the query's plain terms in ``marker``/``reset``."""
+    terms = [term for term in parse_query(query)[0] if term]
+    if not terms:
+        return text
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    return pattern.sub(lambda match: marker + match.group(0) + reset, text)
@@ -0,0 +1,428 @@
+"""Local HTTP/JSON API.
+
+``todo serve`` answers HTTP requests on a single asyncio event loop from the
+daemon's in-memory store (todo.daemon.CachedStore), so a request costs no
+process start and no reparse of the list. Responses to list and search
+requests are cached until the next write.
+
+Tasks are JSON objects with the fields of the JSON Lines export: ``id``,
+``status`` ("open" or "done"), ``priority`` ("high", "medium", "low" or
+""), ``description``, ``category``, ``due`` ("YYYY-MM-DD" or "") and
+``every`` (e.g. "week" or "3 days"; completing a recurring task adds its
+next occurrence).
+
+    GET    /tasks?status=&category=&priority=&limit=&cursor=
+    POST   /tasks                  {"description", "priority", "category", "due", "every"}
+    GET    /tasks/<id>
+    PATCH  /tasks/<id>             any of description, priority, category, due, every, status
+    DELETE /tasks/<id>
+    POST   /tasks/<id>/complete
+    POST   /tasks/batch            {"operations": [{"op": "add"|"edit"|"complete"|"delete", ...}]}
+    GET    /search?q=&limit=&cursor=
+    GET    /export?format=csv|jsonl|todotxt|pdf&status=&category=&priority=
+
+Lists are returned in ID order, ``limit`` tasks at a time, with a
+``next_cursor`` to pass back as ``cursor`` for the following page. A batch
+is applied in one write, and not at all if any operation in it fails.
+
+Web pages must not be able to use the API from the user's browser: requests
+that change tasks must be sent as ``Content-Type: application/json``, which
+a page cannot send to another site without the browser asking first, and
+requests whose ``Host`` or ``Origin`` names another site are refused.
+"""
+import asyncio
+import bisect
+import copy
+import io
+import ipaddress
+import json
+import os
+import tempfile
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from todo.daemon import CachedStore
+from todo.formats import FORMATS, task_to_dict, write_tasks
+from todo.storage import ConflictError, next_task_id
+from todo.task import Priority, Task, parse_date, parse_every, single_line, task_filter
+
+DEFAULT_PORT = 8765
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# Largest request body accepted, in bytes.
+MAX_BODY = 1024 * 1024
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'todotxt': 'text/plain; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+
+# Methods of the requests that change tasks.
+WRITE_METHODS = ('POST', 'PATCH', 'DELETE')
+
+# Fields of a task that an "add" or "edit" operation may set.
+TASK_FIELDS = ('description', 'priority', 'category', 'due', 'every', 'status')
+
+
+class HTTPError(Exception):
+    """An error to send back to the client with the given status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(params, name, default=None, low=0, high=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    if not value.isdigit() or int(value) < low or (high is not None and int(value) > high):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid {name}: {value!r}")
+    return int(value)
+
+
+def _choice_param(params, name, choices):
+    value = (params.get(name) or '').lower() or None
+    if value is not None and value not in choices:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid {name}: {value!r}")
+    return value
+
+
+def _filters(params):
+    return (
+        _choice_param(params, 'status', ('open', 'done')),
+        params.get('category') or None,
+        _choice_param(params, 'priority', [name.lower() for name in Priority.__members__]),
+    )
+
+
+def _page(tasks, params):
+    """Return one page of tasks (in ID order) after the cursor, with the cursor of the next."""
+    limit = _int_param(params, 'limit', PAGE_SIZE, low=1, high=MAX_PAGE_SIZE)
+    page = []
+    for task in tasks:
+        if len(page) == limit:
+            return {'tasks': page, 'next_cursor': str(page[-1]['id'])}
+        page.append(task_to_dict(task))
+    return {'tasks': page, 'next_cursor': None}
+
+
+def _apply_fields(task, fields):
+    """Set a task's fields from an add/edit operation; raises ValueError if one is invalid."""
+    unknown = set(fields) - set(TASK_FIELDS) - {'op', 'id'}
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    if 'description' in fields:
+        if not isinstance(fields['description'], str) or not single_line(fields['description']):
+            raise ValueError("description must be a non-empty string")
+        task.description = single_line(fields['description'])
+    if 'priority' in fields:
+        name = str(fields['priority'] or '').upper()
+        if name and name not in Priority.__members__:
+            raise ValueError(f"invalid priority: {fields['priority']!r}")
+        task.priority = Priority[name] if name else None
+    if 'category' in fields:
+        task.category = single_line(str(fields['category'] or '')) or None
+    if 'due' in fields:
+        task.due = parse_date(str(fields['due'])) if fields['due'] else None
+    if 'every' in fields:
+        task.every = parse_every(str(fields['every'])) if fields['every'] else None
+    if 'status' in fields:
+        if fields['status'] not in ('open', 'done'):
+            raise ValueError(f"invalid status: {fields['status']!r}")
+        task.done = fields['status'] == 'done'
+
+
+class Api:
+    """Request handlers of the HTTP API."""
+
+    def __init__(self, store, host='127.0.0.1', port=DEFAULT_PORT):
+        self.store = store
+        # Names the server may be reached by; IP addresses are accepted too.
+        self.hostnames = {'localhost', host.lower()}
+        self.port = port
+        # (path, query) -> response body of GET requests, valid for one store generation.
+        self.cache = {}
+        self.cache_generation = None
+        self.ids = []
+        self.ids_generation = None
+
+    def _cached(self, key):
+        # Reload first if another program changed the list, so that its
+        # generation goes up and cached responses are dropped.
+        self.store.cached_index()
+        if self.cache_generation != self.store.generation:
+            self.cache.clear()
+            self.cache_generation = self.store.generation
+        return self.cache.get(key)
+
+    def _sorted_ids(self):
+        index = self.store.cached_index()
+        if self.ids_generation != self.store.generation:
+            self.ids = sorted(index)
+            self.ids_generation = self.store.generation
+        return self.ids, index
+
+    def _after_cursor(self, params):
+        """Yield tasks in ID order, starting after the request's cursor."""
+        cursor = _int_param(params, 'cursor', 0)
+        ids, index = self._sorted_ids()
+        for task_id in ids[bisect.bisect_right(ids, cursor):]:
+            task = index.get(task_id)
+            if task is not None:
+                yield task
+
+    def list_tasks(self, params):
+        status, category, priority = _filters(params)
+        return _page(filter(task_filter(status, category, priority), self._after_cursor(params)), params)
+
+    def get_task(self, task_id):
+        task = self.store.cached_index().get(task_id)
+        if task is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No task with ID {task_id}")
+        return task_to_dict(task)
+
+    def apply(self, operations):
+        """Apply a list of operations in one write and return one result per operation."""
+        if not isinstance(operations, list) or not operations:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "operations must be a non-empty list")
+        failure = []
+
+        def change(index):
+            # Check everything before touching the cached tasks.
+            next_id = next_task_id(index)
+            # Tasks as changed by the operations so far, None once deleted.
+            working = {}
+            results = []
+            for position, operation in enumerate(operations):
+                try:
+                    if not isinstance(operation, dict):
+                        raise ValueError("operation must be an object")
+                    op = operation.get('op')
+                    if op == 'add':
+                        task = working[next_id] = Task('', Priority.MEDIUM, id=next_id)
+                        next_id += 1
+                        _apply_fields(task, {'description': None, **operation})
+                    elif op in ('edit', 'complete', 'delete'):
+                        task_id = operation.get('id')
+                        if task_id not in working and isinstance(task_id, int) and task_id in index:
+                            working[task_id] = copy.copy(index[task_id])
+                        task = working.get(task_id)
+                        if task is None:
+                            raise LookupError(f"no task with ID {task_id}")
+                        if op == 'edit':
+                            _apply_fields(task, operation)
+                        elif op == 'complete':
+                            following = None if task.done else task.next_occurrence()
+                            task.done = True
+                            if following is not None:
+                                following.id = next_id
+                                working[next_id] = following
+                                next_id += 1
+                        else:
+                            working[task_id] = None
+                            results.append({'id': task_id, 'deleted': True})
+                            continue
+                    else:
+                        raise ValueError(f"unknown op: {op!r}")
+                except (ValueError, LookupError) as error:
+                    failure[:] = [position, error]
+                    return None
+                results.append(task_to_dict(task))
+            changed = [task for task in working.values() if task is not None]
+            removed = [task_id for task_id, task in working.items() if task is None and task_id in index]
+            return changed, removed, results
+
+        try:
+            results = self.store.update(change)
+        except ConflictError as error:
+            raise HTTPError(HTTPStatus.CONFLICT, f"{error}. Nothing was changed.")
+        if failure:
+            position, error = failure
+            status = HTTPStatus.NOT_FOUND if isinstance(error, LookupError) else HTTPStatus.UNPROCESSABLE_ENTITY
+            if len(operations) > 1:
+                raise HTTPError(status, f"Operation {position}: {error}. Nothing was changed.")
+            raise HTTPError(status, str(error)[:1].upper() + str(error)[1:])
+        return results
+
+    def search(self, params):
+        query = params.get('q', '').strip()
+        if not query:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing query parameter q")
+        cursor = _int_param(params, 'cursor', 0)
+        return _page((task for task in self.store.search_tasks(query) if task.id > cursor), params)
+
+    def export(self, params):
+        fmt = _choice_param(params, 'format', (*FORMATS, 'pdf')) or 'jsonl'
+        tasks = self.store.query_tasks(*_filters(params))
+        if fmt != 'pdf':
+            buffer = io.StringIO()
+            write_tasks(buffer, tasks, fmt)
+            return CONTENT_TYPES[fmt], buffer.getvalue().encode('utf-8')
+        from todo.export import export_pdf
+
+        fd, filename = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            export_pdf(filename, tasks)
+            with open(filename, 'rb') as file:
+                return CONTENT_TYPES[fmt], file.read()
+        finally:
+            os.remove(filename)
+
+    def _own_host(self, value):
+        """Whether a Host header or Origin host names this server rather than another site."""
+        try:
+            url = urlsplit('//' + value)
+            hostname, port = url.hostname, url.port
+        except ValueError:
+            return False
+        if hostname is None or (port is not None and port != self.port):
+            return False
+        if hostname in self.hostnames:
+            return True
+        # Another site's name can be pointed at 127.0.0.1 (DNS rebinding), an address cannot.
+        try:
+            ipaddress.ip_address(hostname)
+        except ValueError:
+            return False
+        return True
+
+    def check_request(self, method, headers):
+        """Refuse requests that could come from a web page on another site."""
+        host = headers.get('host')
+        if host is not None and not self._own_host(host):
+            raise HTTPError(HTTPStatus.FORBIDDEN, f"Unknown host: {host}")
+        origin = headers.get('origin')
+        if origin is not None:
+            scheme, _, origin_host = origin.partition('://')
+            if scheme.lower() != 'http' or not self._own_host(origin_host):
+                raise HTTPError(HTTPStatus.FORBIDDEN, f"Requests from {origin} are not allowed")
+        if method in WRITE_METHODS:
+            content_type = headers.get('content-type', '').partition(';')[0].strip().lower()
+            if content_type != 'application/json':
+                raise HTTPError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "Content-Type must be application/json")
+
+    async def dispatch(self, method, target, body):
+        """Route a request and return (status, content type, body bytes)."""
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        parts = [part for part in url.path.split('/') if part]
+        if method == 'GET' and parts in (['tasks'], ['search']):
+            key = (url.path, tuple(sorted(params.items())))
+            cached = self._cached(key)
+            if cached is None:
+                payload = self.list_tasks(params) if parts == ['tasks'] else self.search(params)
+                cached = self.cache[key] = _json_body(payload)
+            return HTTPStatus.OK, 'application/json', cached
+        if method == 'GET' and parts == ['export']:
+            content_type, data = await asyncio.to_thread(self.export, params)
+            return HTTPStatus.OK, content_type, data
+
+        payload = _json_request(body) if body else {}
+        if parts == ['tasks'] and method == 'POST':
+            return HTTPStatus.CREATED, 'application/json', _json_body(self.apply([{**payload, 'op': 'add'}])[0])
+        if parts == ['tasks', 'batch'] and method == 'POST':
+            return HTTPStatus.OK, 'application/json', _json_body({'results': self.apply(payload.get('operations'))})
+        if len(parts) >= 2 and parts[0] == 'tasks' and parts[1].isdigit():
+            task_id = int(parts[1])
+            if len(parts) == 2 and method == 'GET':
+                result = self.get_task(task_id)
+            elif len(parts) == 2 and method == 'PATCH':
+                result = self.apply([{**payload, 'op': 'edit', 'id': task_id}])[0]
+            elif len(parts) == 2 and method == 'DELETE':
+                result = self.apply([{'op': 'delete', 'id': task_id}])[0]
+            elif parts[2:] == ['complete'] and method == 'POST':
+                result = self.apply([{'op': 'complete', 'id': task_id}])[0]
+            else:
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {url.path}")
+            return HTTPStatus.OK, 'application/json', _json_body(result)
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No such endpoint: {method} {url.path}")
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one client connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length') or 0)
+                    if length > MAX_BODY:
+                        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+                except ValueError:
+                    await _respond(writer, HTTPStatus.BAD_REQUEST, 'application/json',
+                                   _json_body({'error': "Malformed request"}), False)
+                    break
+                except HTTPError as error:
+                    await _respond(writer, error.status, 'application/json', _json_body({'error': str(error)}), False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                try:
+                    self.check_request(method.upper(), headers)
+                    status, content_type, data = await self.dispatch(method.upper(), target, body)
+                except HTTPError as error:
+                    status, content_type, data = error.status, 'application/json', _json_body({'error': str(error)})
+                await _respond(writer, status, content_type, data, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _json_request(body):
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+    return payload
+
+
+def _json_body(payload):
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+async def _respond(writer, status, content_type, data, keep_alive):
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + data)
+    await writer.drain()
+
+
+def run(name, host='127.0.0.1', port=DEFAULT_PORT):
+    """Serve the API for the given backend until interrupted."""
+    store = CachedStore(name)
+    store.load_tasks()
+    api = Api(store, host, port)
+
+    async def main():
+        server = await asyncio.start_server(api.handle, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    finally:
+        store.close()
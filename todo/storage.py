@@ -0,0 +1,638 @@
+"""Task file storage.
+
+Tasks live in a snapshot file (``todo.txt``) plus an append-only journal next
+to it (``todo.txt.journal``). Single-task changes are appended to the journal,
+loading replays the journal over the snapshot, and once the journal grows past
+``COMPACT_THRESHOLD`` it is folded back into the snapshot.
+
+Journal records put or delete a task by ID, so replaying them is harmless
+even over a snapshot that already contains them, and the journal is always
+replayed: over a snapshot edited by hand or copied elsewhere as much as over
+the one it was started against. Before anything else is appended to a
+journal whose snapshot was changed that way, the two are folded together so
+that tasks added by hand get IDs of their own.
+
+Several ``todo`` processes may share the same files. Every write holds an
+exclusive advisory lock on ``todo.txt.lock`` and reads hold it shared, so a
+reader never sees half of a compaction. Read-modify-write changes go through
+``update``, which checks at write time that none of the tasks it touches were
+changed since they were loaded and retries if they were.
+"""
+import contextlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from operator import itemgetter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from todo import trace
+from todo.task import Task, task_filter
+
+TODO_FILE = 'todo.txt'
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+
+# Set TODO_JOURNAL=0 to rewrite the task file on every change instead.
+JOURNAL_ENABLED = os.environ.get('TODO_JOURNAL', '1') != '0'
+
+# Once the journal grows past this many bytes it is folded back into the snapshot.
+COMPACT_THRESHOLD = 64 * 1024
+
+# Matches the ID tag at the end of a stored task line.
+ID_TAG = re.compile(r' \[ID: (\d+)\]$')
+
+# Matches the task ID at the start of a journal record, as json.dumps writes it.
+RECORD_ID = re.compile(r'^\{"op": "\w+", "id": (\d+)', re.MULTILINE)
+
+# How many times ``update`` reloads and retries after a conflicting write.
+UPDATE_ATTEMPTS = 10
+
+# Locks held by each thread: lock file path -> [fd, nesting depth, shared,
+# actions to run once released]. Threads lock separately, so flock keeps
+# them apart just like separate processes.
+_held = threading.local()
+
+
+class ConflictError(Exception):
+    """Tasks being changed were changed by another process since they were loaded."""
+
+
+def journal_path(path=None):
+    """Return the journal file that belongs to a snapshot file."""
+    return (path or TODO_FILE) + JOURNAL_SUFFIX
+
+
+def _held_locks():
+    if not hasattr(_held, 'locks'):
+        _held.locks = {}
+    return _held.locks
+
+
+@contextlib.contextmanager
+def locked(path=None, shared=False):
+    """Hold the advisory lock of a task file: exclusive for writers, shared for readers.
+
+    Nested calls in the same process reuse the lock already held.
+    """
+    lock = (path or TODO_FILE) + LOCK_SUFFIX
+    held = _held_locks().get(lock)
+    if held:
+        if held[2] and not shared:
+            raise RuntimeError("cannot take the write lock while holding the read lock")
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+        return
+    fd = os.open(lock, os.O_RDWR | os.O_CREAT, 0o644)
+    pending = []
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # msvcrt has no shared locks, so readers lock exclusively too.
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        _held_locks()[lock] = [fd, 1, shared and fcntl is not None, pending]
+        try:
+            yield
+        finally:
+            del _held_locks()[lock]
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
+        for action in pending:
+            action()
+
+
+def _after_unlock(path, action):
+    """Run ``action`` once the outermost lock on a task file is released."""
+    _held_locks()[path + LOCK_SUFFIX][3].append(action)
+
+
+def snapshot_stamp(path):
+    """Identify the current snapshot, to tell whether it was rewritten since the journal was started."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class TaskIndex(dict):
+    """An ID-to-Task dict that also knows the lowest ID no task has ever had (``next_id``).
+
+    IDs of deleted and archived tasks are never given out again, so the
+    backends keep this high-water mark with the tasks.
+    """
+    next_id = 1
+
+    def copy(self):
+        index = TaskIndex(self)
+        index.next_id = self.next_id
+        return index
+
+
+def next_task_id(index):
+    """Return the ID the next new task should get."""
+    return max(max(index, default=0) + 1, getattr(index, 'next_id', 1))
+
+
+def version(path=None):
+    """Return a token that changes whenever the snapshot or the journal is written."""
+    path = path or TODO_FILE
+    try:
+        st = os.stat(journal_path(path))
+    except FileNotFoundError:
+        journal = None
+    else:
+        journal = [st.st_ino, st.st_size]
+    return [snapshot_stamp(path), journal]
+
+
+def _open_snapshot(path):
+    try:
+        return open(path, 'r')
+    except FileNotFoundError:
+        return None
+
+
+def _iter_snapshot(file, next_id=1):
+    """Yield the snapshot's tasks one at a time, giving lines without a usable ID a fresh one.
+
+    Fresh IDs start at ``next_id`` or after the highest ID in the file, whichever is higher.
+    """
+    if file is None:
+        return
+    lines = 0
+    with file:
+        # The file is read twice: once for the highest ID and once to parse it.
+        trace.count('bytes_read', 2 * os.fstat(file.fileno()).st_size)
+        try:
+            highest = max((int(match.group(1)) for match in map(ID_TAG.search, file) if match), default=0)
+            next_id = max(next_id, highest + 1)
+            file.seek(0)
+            seen = set()
+            parse = Task.parse
+            for lines, line in enumerate(file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                task = parse(line)
+                if task.id is None or task.id in seen:
+                    task.id = next_id
+                    next_id += 1
+                seen.add(task.id)
+                yield task
+        finally:
+            trace.count('lines_read', lines)
+
+
+def _read_snapshot(path, next_id=1):
+    return {task.id: task for task in _iter_snapshot(_open_snapshot(path), next_id)}
+
+
+def _parse_header(line):
+    """Return the journal header on ``line``, or None if it is not one."""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or 'op' in header:
+        return None
+    return header
+
+
+def _parse_records(lines):
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A torn record from an interrupted append.
+            continue
+    return records
+
+
+def read_journal(path):
+    """Return the header and records of the journal.
+
+    The header is None when there is no journal, and empty if it could not
+    be read; the records are returned either way.
+    """
+    journal = journal_path(path)
+    if not os.path.exists(journal):
+        return None, []
+    with open(journal, 'r') as file:
+        data = file.read()
+    lines = data.splitlines()
+    trace.count('lines_read', len(lines))
+    trace.count('bytes_read', len(data))
+    header = _parse_header(lines[0]) if lines else None
+    if header is None:
+        return {}, _parse_records(lines)
+    return header, _parse_records(lines[1:])
+
+
+def _fresh_ids_from(header, records):
+    """Return where IDs for snapshot lines without one start, so they never clash with the journal's."""
+    return max([(header or {}).get('next_id', 1), *(record['id'] + 1 for record in records)])
+
+
+def _high_water(path):
+    """Return the lowest ID the journal has not seen given out; the caller holds the lock."""
+    journal = journal_path(path)
+    if not os.path.exists(journal):
+        return 1
+    with open(journal, 'r') as file:
+        header = _parse_header(file.readline()) or {}
+        return max(header.get('next_id', 1), max(map(int, RECORD_ID.findall(file.read())), default=0) + 1)
+
+
+def _replay(index, records):
+    for record in records:
+        if record['op'] == 'put':
+            index[record['id']] = Task.parse(record['task'])
+        elif record['op'] == 'delete':
+            index.pop(record['id'], None)
+    return index
+
+
+def load_index(path=None):
+    """Load tasks as a TaskIndex (an ID-to-Task dict), in file order."""
+    path = path or TODO_FILE
+    with trace.phase('load'), locked(path, shared=True):
+        header, records = read_journal(path)
+        next_id = _fresh_ids_from(header, records)
+        index = TaskIndex(_replay(_read_snapshot(path, next_id), records))
+    index.next_id = next_id
+    return index
+
+
+def load_tasks(path=None):
+    """Load tasks from the snapshot file and replay the journal over it."""
+    return list(load_index(path).values())
+
+
+def iter_tasks(path=None):
+    """Yield tasks in file order without loading the whole list into memory.
+
+    Only the journal, which compaction keeps small, is held in memory; the
+    snapshot is streamed line by line.
+    """
+    return trace.timed('load', _iter_tasks(path or TODO_FILE))
+
+
+def _iter_tasks(path):
+    # Opening the snapshot is enough to keep reading the version that goes
+    # with the journal, even if it is compacted while we stream it.
+    with locked(path, shared=True):
+        header, records = read_journal(path)
+        snapshot = _open_snapshot(path)
+    # IDs below the journal's next_id belong to the snapshot, anything else was
+    # added since, so each record is either an in-place change or an append.
+    next_id = header.get('next_id', 0) if header else 0
+    # Both map an ID to (position of the record that added it, task).
+    changed, appended = {}, {}
+    removed = set()
+    for position, record in enumerate(records):
+        task_id = record['id']
+        if record['op'] == 'put':
+            if task_id in appended or task_id >= next_id or task_id in removed:
+                target = appended
+            else:
+                target = changed
+            previous = target.get(task_id)
+            target[task_id] = (previous[0] if previous else position, Task.parse(record['task']))
+        elif record['op'] == 'delete':
+            if appended.pop(task_id, None) is None:
+                removed.add(task_id)
+                changed.pop(task_id, None)
+    for task in _iter_snapshot(snapshot, _fresh_ids_from(header, records)):
+        if task.id not in removed:
+            # A snapshot edited by hand or compacted may already hold an "appended" task.
+            entry = changed.pop(task.id, None) or appended.pop(task.id, None)
+            yield entry[1] if entry else task
+    # Changes to IDs that turned out not to be in the snapshot were appends too.
+    for _, task in sorted([*changed.values(), *appended.values()], key=itemgetter(0)):
+        yield task
+
+
+def query_tasks(status=None, category=None, priority=None, path=None):
+    """Yield the tasks with the given status ('open' or 'done'), category and priority name."""
+    return filter(task_filter(status, category, priority), iter_tasks(path))
+
+
+def search_tasks(query, path=None):
+    """Return the tasks matching a query, ordered by ID (see todo.search)."""
+    from todo.search import search_tasks
+
+    with trace.phase('search'):
+        return search_tasks(query, path)
+
+
+def task_counts(path=None):
+    """Return (done, priority, category, count) for every combination that has tasks (see todo.search)."""
+    from todo.search import task_counts
+
+    return task_counts(path)
+
+
+def due_tasks(before=None, limit=None, path=None):
+    """Return the open tasks with a due date (before ``before`` if given), earliest first (see todo.search).
+
+    Tasks due on the same day come in priority order. ``limit`` returns only the first so many.
+    """
+    from todo.search import due_tasks
+
+    with trace.phase('search'):
+        return due_tasks(before, limit, path)
+
+
+def rebuild_counts(path=None):
+    """Recount the tasks from the task file."""
+    from todo.search import rebuild_index
+
+    rebuild_index(path)
+
+
+def save_tasks(tasks, path=None):
+    """Rewrite the snapshot file with the given tasks and start an empty journal.
+
+    Tasks without an ID (or with one already used) get IDs no task has had.
+    """
+    path = path or TODO_FILE
+    tmp_path = f"{path}.tmp"
+    seen = set()
+    lines = 0
+    with trace.phase('save'), locked(path):
+        next_id = high_water = _high_water(path)
+        try:
+            with open(tmp_path, 'w') as file:
+                # Tasks are written as they come, so ``tasks`` may be a generator,
+                # even one reading from this same file.
+                for task in tasks:
+                    if task.id is None or task.id in seen:
+                        task.id = next_id
+                    seen.add(task.id)
+                    next_id = max(next_id, task.id + 1)
+                    high_water = max(high_water, task.id + 1)
+                    file.write(f"{task}\n")
+                    lines += 1
+                trace.count('lines_written', lines)
+                trace.count('bytes_written', file.tell())
+                file.flush()
+                os.fsync(file.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        # The new journal carries the high-water mark on. Until it replaces the
+        # old one, the old records are replayed over the snapshot that holds them.
+        _start_journal(path, high_water)
+
+
+def append_tasks(tasks, path=None):
+    """Add many tasks in one rewrite of the task file and return how many were added.
+
+    Tasks keep their IDs unless a task has ever had them (they are below
+    the high-water mark) or they clash with one another.
+    """
+    path = path or TODO_FILE
+    count = 0
+
+    def existing():
+        nonlocal floor
+        for task in iter_tasks(path):
+            floor = max(floor, task.id + 1)
+            yield task
+
+    def counted():
+        nonlocal count
+        for count, task in enumerate(tasks, 1):
+            if task.id is not None and task.id < floor:
+                task.id = None
+            yield task
+
+    with trace.phase('save'), locked(path):
+        floor = _high_water(path)
+        save_tasks(itertools.chain(existing(), counted()), path)
+    return count
+
+
+def compact(path=None):
+    """Fold the journal into the snapshot file."""
+    from todo.search import rebase_index
+
+    path = path or TODO_FILE
+    with locked(path):
+        base = snapshot_stamp(path)
+        header, records = read_journal(path)
+        save_tasks(_replay(_read_snapshot(path, _fresh_ids_from(header, records)), records).values(), path)
+        # Let the search index follow the new snapshot instead of rebuilding it.
+        rebase_index(path, base, records)
+
+
+def _open_journal(path):
+    """Return the journal's header and the highest task ID in its records, starting one if needed.
+
+    A journal whose snapshot was changed behind its back (edited by hand,
+    copied, or rewritten by a compaction that crashed before replacing the
+    journal) is folded into the snapshot first.
+    """
+    journal = journal_path(path)
+    if os.path.exists(journal):
+        with open(journal, 'r') as file:
+            header = _parse_header(file.readline())
+            if header is not None and header.get('base') == snapshot_stamp(path):
+                # Only the IDs are needed, so skip decoding every record.
+                return header, max(map(int, RECORD_ID.findall(file.read())), default=0)
+        compact(path)
+    # A list from before journals, or one whose journal was just folded in.
+    if not os.path.exists(journal):
+        tasks = _read_snapshot(path)
+        if _snapshot_has_ids(path):
+            return _start_journal(path, next_task_id(tasks)), 0
+        # Lines without an ID would be numbered afresh on every read, after
+        # the journal's next_id, so write down the IDs they have now; this
+        # starts the journal too.
+        save_tasks(tasks.values(), path)
+    with open(journal, 'r') as file:
+        return _parse_header(file.readline()), 0
+
+
+def _snapshot_has_ids(path):
+    """Whether every line of the snapshot has an ID of its own."""
+    file = _open_snapshot(path)
+    if file is None:
+        return True
+    seen = set()
+    with file:
+        for line in file:
+            match = ID_TAG.search(line.rstrip())
+            if match is None:
+                if line.strip():
+                    return False
+                continue
+            if match.group(1) in seen:
+                return False
+            seen.add(match.group(1))
+    return True
+
+
+def _start_journal(path, next_id):
+    """Replace the journal with an empty one for the current snapshot and return its header."""
+    header = {'base': snapshot_stamp(path), 'next_id': next_id}
+    # A new file rather than a truncated one, so ``version`` tells them apart.
+    tmp_path = journal_path(path) + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(json.dumps(header) + "\n")
+    os.replace(tmp_path, journal_path(path))
+    return header
+
+
+def _append_records(records, path):
+    """Append records to the journal; the caller holds the write lock."""
+    if not JOURNAL_ENABLED:
+        save_tasks(_replay(load_index(path), records).values(), path)
+        return
+    _open_journal(path)
+    journal = journal_path(path)
+    with open(journal, 'rb') as file:
+        file.seek(-1, os.SEEK_END)
+        torn = file.read(1) != b"\n"
+    file = open(journal, 'a')
+    try:
+        if torn:
+            file.write("\n")
+        # One write for the whole batch.
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        file.write(data)
+        file.flush()
+        trace.count('lines_written', len(records))
+        trace.count('bytes_written', len(data))
+    except BaseException:
+        file.close()
+        raise
+    if file.tell() > COMPACT_THRESHOLD:
+        file.close()
+        compact(path)
+        return
+
+    def sync():
+        # Group commit: the fsync runs after the lock is released, so writers
+        # queued behind this one append meanwhile and one flush to disk
+        # covers all of them.
+        with file:
+            os.fsync(file.fileno())
+    _after_unlock(path, sync)
+
+
+def _records_since(path, expected):
+    """Return the journal records written since ``version`` returned ``expected``.
+
+    Returns None if the snapshot was rewritten or the journal replaced since then.
+    """
+    base, journal = expected
+    current = version(path)
+    if current[0] != base or current[1] is None:
+        return None
+    if journal is not None and (journal[0] != current[1][0] or journal[1] > current[1][1]):
+        return None
+    with open(journal_path(path), 'rb') as file:
+        file.seek(journal[1] if journal else 0)
+        lines = file.read().splitlines()
+    if journal is None:
+        # Skip the header of a journal started since.
+        lines = lines[1:]
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def append_task(task, path=None):
+    """Append a single task without rewriting the task file.
+
+    The task is given a new ID, which is also returned.
+    """
+    path = path or TODO_FILE
+    with trace.phase('save'), locked(path):
+        if JOURNAL_ENABLED:
+            header, last_id = _open_journal(path)
+            task.id = max(header.get('next_id', 1), last_id + 1)
+        else:
+            task.id = next_task_id(load_index(path))
+        _append_records([{'op': 'put', 'id': task.id, 'task': str(task)}], path)
+    return task.id
+
+
+def replace_task(task, path=None):
+    """Store a changed task in place of the one with the same ID."""
+    commit(changed=[task], path=path)
+
+
+def remove_task(task_id, path=None):
+    """Remove the task with the given ID."""
+    commit(removed=[task_id], path=path)
+
+
+def commit(changed=(), removed=(), path=None, expected=None):
+    """Store many changed tasks and remove many task IDs in a single write.
+
+    If ``expected`` is a ``version`` taken when the tasks were loaded,
+    ConflictError is raised if any of them were written since. Returns the
+    ``version`` after the write, or None if other changes were written
+    since ``expected`` as well.
+    """
+    path = path or TODO_FILE
+    records = [{'op': 'put', 'id': task.id, 'task': str(task)} for task in changed]
+    records += [{'op': 'delete', 'id': task_id} for task_id in removed]
+    with trace.phase('save'), locked(path):
+        clean = expected is None or version(path) == expected
+        if not clean and records:
+            since = _records_since(path, expected)
+            task_ids = {record['id'] for record in records}
+            if since is None or any(record['id'] in task_ids for record in since):
+                raise ConflictError(f"{path} was changed by another process")
+        if records:
+            _append_records(records, path)
+        return version(path) if clean else None
+
+
+def update(change, path=None, attempts=UPDATE_ATTEMPTS):
+    """Apply a read-modify-write change, retrying if another process gets in the way.
+
+    ``change(index)`` is called with a freshly loaded ID-to-Task dict and
+    returns ``(changed, removed, result)``, or None to write nothing. Returns
+    ``result`` (or None), and raises ConflictError if every attempt conflicted.
+    """
+    path = path or TODO_FILE
+    for attempt in range(attempts):
+        with locked(path, shared=True):
+            expected = version(path)
+            index = load_index(path)
+        outcome = change(index)
+        if outcome is None:
+            return None
+        changed, removed, result = outcome
+        try:
+            commit(changed, removed, path, expected=expected)
+        except ConflictError:
+            # Back off a little longer each time so retries spread out.
+            time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+            continue
+        return result
+    raise ConflictError(f"{path} kept changing; gave up after {attempts} attempts")
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""Parsed task records.
+
+A task is stored as one line of text, e.g.::
+
+    [x] 🔥 Buy groceries [Category: home] [Due: 2024-05-17] [Every: week] [ID: 3]
+
+Lines are parsed once when they are loaded and only turned back into text
+when they are written.
+"""
+import datetime
+import enum
+import re
+
+
+class Priority(enum.IntEnum):
+    """Task priority; lower values sort first."""
+    HIGH = 1
+    MEDIUM = 2
+    LOW = 3
+
+    @property
+    def emoji(self):
+        return _PRIORITY_EMOJI[self]
+
+    @classmethod
+    def from_emoji(cls, emoji):
+        return _EMOJI_PRIORITY.get(emoji)
+
+
+_PRIORITY_EMOJI = {
+    Priority.HIGH: "🔥",
+    Priority.MEDIUM: "🔶",
+    Priority.LOW: "🔷",
+}
+_EMOJI_PRIORITY = {emoji: priority for priority, emoji in _PRIORITY_EMOJI.items()}
+
+# Rank used when sorting tasks that have no priority.
+NO_PRIORITY_RANK = 4
+
+# A rank is the priority rank times this plus the due date's ordinal, so
+# that one integer orders tasks by priority and then by due date.
+DUE_RANK_SPAN = 10_000_000
+
+TASK_PATTERN = re.compile(
+    r'^\[(?P<status>.)\] '
+    r'(?:(?P<priority>🔥|🔶|🔷) ?)?'
+    r'(?P<description>.*?)'
+    r'(?: \[Category: (?P<category>[^\]]*)\])?'
+    r'(?: \[Due: (?P<due>\d{4}-\d\d-\d\d)\])?'
+    r'(?: \[Every: (?P<every>[^\]]*)\])?'
+    r'(?: \[ID: (?P<id>\d+)\])?$'
+)
+
+# Most lines have neither tag, and this shorter pattern matches them much faster.
+PLAIN_TASK_PATTERN = re.compile(
+    r'^\[(?P<status>.)\] '
+    r'(?:(?P<priority>🔥|🔶|🔷) ?)?'
+    r'(?P<description>.*?)'
+    r'(?: \[Category: (?P<category>[^\]]*)\])?'
+    r'(?: \[ID: (?P<id>\d+)\])?$'
+)
+
+EVERY_PATTERN = re.compile(
+    r'^(?:(?P<count>\d+) *)?(?P<unit>d|days?|daily|w|weeks?|weekly|m|months?|monthly|y|years?|yearly)$'
+)
+EVERY_UNITS = {'d': 'day', 'w': 'week', 'm': 'month', 'y': 'year'}
+
+
+def parse_date(text):
+    """Parse a due date given as YYYY-MM-DD, 'today' or 'tomorrow'.
+
+    Raises ValueError if the text is none of these.
+    """
+    text = text.strip().lower()
+    today = datetime.date.today()
+    if text == 'today':
+        return today
+    if text == 'tomorrow':
+        return today + datetime.timedelta(days=1)
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid date: {text!r} (use YYYY-MM-DD, today or tomorrow)") from None
+
+
+def single_line(text):
+    """Return ``text`` with its line breaks turned into spaces.
+
+    Each task is one line of the task file, so descriptions and categories
+    from outside (imports, the APIs) must not break a line.
+    """
+    return " ".join(part.strip() for part in text.splitlines() if part.strip())
+
+
+def parse_every(text):
+    """Return a recurrence such as 'weekly', '2w' or '3 days' in its stored form ('week', '3 days').
+
+    Raises ValueError if it is not a recurrence.
+    """
+    match = EVERY_PATTERN.match(text.strip().lower())
+    count = int(match.group('count') or 1) if match else 0
+    if count < 1:
+        raise ValueError(f"Invalid recurrence: {text!r} (use e.g. daily, weekly, monthly, 2w or 3 days)")
+    unit = EVERY_UNITS[match.group('unit')[0]]
+    return unit if count == 1 else f"{count} {unit}s"
+
+
+def _add_months(date, months):
+    import calendar
+
+    month = date.month - 1 + months
+    year, month = date.year + month // 12, month % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def next_due(due, every, today=None):
+    """Return the first date after ``today`` that is a whole number of ``every`` periods after ``due``.
+
+    Returns None if ``every`` is not a recurrence.
+    """
+    match = EVERY_PATTERN.match(every)
+    if match is None:
+        return None
+    count, unit = int(match.group('count') or 1), match.group('unit')[0]
+    today = today or datetime.date.today()
+    step = 1
+    while True:
+        if unit in 'dw':
+            following = due + datetime.timedelta(days=count * step * (7 if unit == 'w' else 1))
+        else:
+            following = _add_months(due, count * step * (12 if unit == 'y' else 1))
+        if following > today:
+            return following
+        step += 1
+
+
+class Task:
+    """A single to-do item."""
+    __slots__ = ('id', 'done', 'priority', 'description', 'category', 'due', 'every')
+
+    def __init__(self, description, priority=None, category=None, done=False, id=None, due=None, every=None):
+        self.id = id
+        self.done = done
+        self.priority = priority
+        self.description = description
+        self.category = category or None
+        self.due = due
+        self.every = every or None
+
+    @classmethod
+    def parse(cls, line):
+        """Build a task from a line of the task file."""
+        dated = '[Due: ' in line or '[Every: ' in line
+        match = (TASK_PATTERN if dated else PLAIN_TASK_PATTERN).match(line)
+        if not match:
+            return cls(line)
+        due = every = None
+        if dated:
+            due, every = match.group('due', 'every')
+            try:
+                due = datetime.date.fromisoformat(due) if due else None
+            except ValueError:
+                # Not a real date, e.g. 2024-02-30: keep the tags as part of the description.
+                match = PLAIN_TASK_PATTERN.match(line)
+                due = every = None
+        task_id = match.group('id')
+        return cls(
+            match.group('description'),
+            priority=Priority.from_emoji(match.group('priority')),
+            category=match.group('category'),
+            done=match.group('status') == 'x',
+            id=int(task_id) if task_id else None,
+            due=due,
+            every=every,
+        )
+
+    @property
+    def status(self):
+        return "[x]" if self.done else "[ ]"
+
+    @property
+    def rank(self):
+        """Sort rank by priority, then due date (lower comes first; no due date comes last)."""
+        rank = (int(self.priority) if self.priority else NO_PRIORITY_RANK) * DUE_RANK_SPAN
+        return rank + (self.due.toordinal() if self.due else DUE_RANK_SPAN - 1)
+
+    def next_occurrence(self):
+        """Return the open task that replaces this one once it is completed, if it recurs; otherwise None."""
+        due = next_due(self.due, self.every) if self.due and self.every else None
+        if due is None:
+            return None
+        return Task(self.description, self.priority, self.category, due=due, every=self.every)
+
+    def __str__(self):
+        parts = [self.status]
+        if self.priority:
+            parts.append(self.priority.emoji)
+        parts.append(self.description)
+        if self.category:
+            parts.append(f"[Category: {self.category}]")
+        if self.due:
+            parts.append(f"[Due: {self.due.isoformat()}]")
+        if self.every:
+            parts.append(f"[Every: {self.every}]")
+        if self.id is not None:
+            parts.append(f"[ID: {self.id}]")
+        return " ".join(parts)
+
+    def __repr__(self):
+        return f"Task({str(self)!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Task):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+def task_filter(status=None, category=None, priority=None):
+    """Return a predicate selecting tasks by status ('open' or 'done'), category and priority name."""
+    done = {'open': False, 'done': True}[status] if status else None
+    category = category.lower() if category else None
+    priority = Priority[priority.upper()] if priority else None
+
+    def matches(task):
+        return ((done is None or task.done == done)
+                and (category is None or (task.category or '').lower() == category)
+                and (priority is None or task.priority == priority))
+    return matches
@@ -0,0 +1,164 @@
+"""Timings and I/O counts for `todo --profile`.
+
+Code on the hot path wraps its work in ``phase(name)`` and reports what it
+read and wrote with ``count(name, n)``. Both do nothing until ``start`` is
+called, so they cost next to nothing on normal runs. ``finish`` prints the
+report, and can also save a cProfile dump and append the metrics as one
+JSON line to a log for comparing many runs.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+# When todo.cli started importing; it imports this module first.
+IMPORTED = time.perf_counter()
+
+PHASES = ('import', 'load', 'sort', 'search', 'render', 'save', 'export')
+COUNTERS = ('lines_read', 'bytes_read', 'lines_written', 'bytes_written', 'rows_read', 'rows_written')
+
+_active = False
+# Only the thread running the command is timed, not e.g. the daemon's writer.
+_thread = None
+_count_import = True
+_started = None
+_phases = {}
+_stack = []
+_mark = None
+_counters = {}
+_profiler = None
+
+
+class _Phase:
+    """Time spent in a phase, not counting phases nested inside it."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _switch()
+        _stack.append(self.name)
+
+    def __exit__(self, *exc_info):
+        _switch()
+        _stack.pop()
+
+
+def _switch():
+    """Charge the time since the last switch to the innermost running phase."""
+    global _mark
+    now = time.perf_counter()
+    if _stack:
+        _phases[_stack[-1]] = _phases.get(_stack[-1], 0) + now - _mark
+    _mark = now
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name):
+    """Return a context manager that adds the time spent in it to phase ``name``."""
+    return _Phase(name) if _active and threading.get_ident() == _thread else _NO_PHASE
+
+
+def timed(name, iterable):
+    """Yield from ``iterable``, adding the time spent producing each item to phase ``name``."""
+    if not _active or threading.get_ident() != _thread:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count(name, n=1):
+    """Add ``n`` to counter ``name``."""
+    if _active and threading.get_ident() == _thread:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def skip_import():
+    """Leave the import out of the timings, for a long-running process such as the daemon."""
+    global _count_import
+    _count_import = False
+
+
+def start(profile_output=None):
+    """Start collecting timings, and a cProfile profile if ``profile_output`` is given."""
+    global _active, _thread, _count_import, _started, _profiler
+    _active = True
+    _thread = threading.get_ident()
+    _phases.clear()
+    _stack.clear()
+    _counters.clear()
+    _started = time.perf_counter()
+    if _count_import:
+        _phases['import'] = _started - IMPORTED
+        _count_import = False
+    if profile_output:
+        import cProfile
+
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def finish(command, show=True, profile_output=None, metrics_log=None):
+    """Stop collecting and report the timings of ``command``.
+
+    Prints the report to stderr if ``show`` is true, saves the cProfile data
+    to ``profile_output`` and appends a JSON line to ``metrics_log``.
+    """
+    global _active, _profiler
+    if not _active:
+        return
+    total = time.perf_counter() - _started + _phases.get('import', 0)
+    _active = False
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(profile_output)
+        _profiler = None
+    phases = {name: _phases[name] for name in PHASES if name in _phases}
+    phases.update((name, seconds) for name, seconds in _phases.items() if name not in phases)
+    phases['other'] = max(total - sum(phases.values()), 0)
+    counters = {name: _counters.get(name, 0) for name in COUNTERS}
+    counters.update(_counters)
+
+    if show:
+        lines = [f"todo {command}: {total * 1000:.1f} ms"]
+        lines += [f"  {name:<8} {seconds * 1000:>9.1f} ms" for name, seconds in phases.items()]
+        lines.append(f"  read {counters['lines_read']} lines, {counters['bytes_read']} bytes, "
+                     f"{counters['rows_read']} rows; wrote {counters['lines_written']} lines, "
+                     f"{counters['bytes_written']} bytes, {counters['rows_written']} rows")
+        if profile_output:
+            lines.append(f"  cProfile data saved to {profile_output}")
+        print("\n".join(lines), file=sys.stderr)
+    if metrics_log:
+        import datetime
+
+        entry = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'command': command,
+            'pid': os.getpid(),
+            'total_ms': round(total * 1000, 3),
+            'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+            'counters': counters,
+        }
+        with open(metrics_log, 'a') as file:
+            file.write(json.dumps(entry) + "\n")